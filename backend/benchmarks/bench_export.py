@@ -0,0 +1,106 @@
+"""
+Taxer statement export throughput.
+
+Exports synthetic deposits, withdrawals and transfers with settings using
+every export field type, and prints rows per second of the CSV export.
+
+Usage: python benchmarks/bench_export.py [ROWS] [REPEAT]
+"""
+
+import random
+import sys
+from datetime import datetime, timedelta
+from decimal import Decimal
+from itertools import cycle, islice
+from time import perf_counter
+
+from firemerge.model.account_settings import ExportSettings
+from firemerge.model.firefly import Transaction, TransactionType
+from firemerge.statement.export import iter_statement
+
+# Distinct transactions generated; the exported rows repeat them.
+DISTINCT = 1000
+
+SETTINGS = ExportSettings.model_validate(
+    {
+        "deposit": [
+            {"label": "Tax Code", "type": "constant", "value": "10100"},
+            {"label": "Date", "type": "date", "format": "%d.%m.%Y"},
+            {"label": "Amount", "type": "amount"},
+            {"label": "Comment", "type": "empty"},
+            {"label": "Counterparty", "type": "source_account_name"},
+            {"label": "Currency Code", "type": "currency_code"},
+        ],
+        "withdrawal": [
+            {"label": "Date", "type": "date", "format": "%Y-%m-%d %H:%M"},
+            {"label": "Amount", "type": "amount"},
+            {"label": "Currency Code", "type": "currency_code"},
+            {"label": "Counterparty", "type": "destination_account_name"},
+        ],
+        "transfer": [
+            {"label": "Tax Code", "type": "constant", "value": "10100"},
+            {"label": "Date", "type": "date", "format": "%d.%m.%Y"},
+            {"label": "Amount", "type": "amount"},
+            {"label": "Op Class", "type": "constant", "value": "Currency Exchange"},
+            {"label": "Source Account", "type": "source_account_name"},
+            {"label": "Currency Code", "type": "currency_code"},
+            {"label": "Destination Account", "type": "destination_account_name"},
+            {"label": "Foreign Amount", "type": "foreign_amount"},
+            {"label": "Foreign Currency Code", "type": "foreign_currency_code"},
+            {"label": "Exchange Rate", "type": "exchange_rate"},
+        ],
+    }
+)
+ACCOUNTS = {idx: f"Account {idx}" for idx in range(1, 101)}
+CURRENCIES = {1: "UAH", 2: "USD", 3: "EUR"}
+
+
+def generate_transactions(count: int, seed: int = 0) -> list[Transaction]:
+    rnd = random.Random(seed)
+    ts = datetime(2025, 1, 1)
+    transactions = []
+    for idx in range(count):
+        ts += timedelta(minutes=rnd.randint(1, 600))
+        tr_type = rnd.choice(list(TransactionType))
+        amount = Decimal(rnd.randint(100, 1_000_000)).scaleb(-2)
+        transfer = tr_type == TransactionType.Transfer
+        transactions.append(
+            Transaction(
+                id=idx,
+                type=tr_type,
+                date=ts,
+                description=f"Transaction {idx}",
+                amount=amount,
+                currency_id=1,
+                foreign_amount=amount / 40 if transfer else None,
+                foreign_currency_id=rnd.choice([2, 3]) if transfer else None,
+                source_id=rnd.choice(list(ACCOUNTS)),
+                destination_id=rnd.choice(list(ACCOUNTS)),
+            )
+        )
+    return transactions
+
+
+def main() -> None:
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 500_000
+    repeat = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    transactions = generate_transactions(DISTINCT)
+
+    seconds = float("inf")
+    for _ in range(repeat):
+        started_at = perf_counter()
+        size = sum(
+            len(chunk)
+            for chunk in iter_statement(
+                islice(cycle(transactions), rows), ACCOUNTS, CURRENCIES, SETTINGS
+            )
+        )
+        seconds = min(seconds, perf_counter() - started_at)
+    print(
+        f"{rows} transactions, {size} characters in {seconds:.2f}s: "
+        f"{rows / seconds:.0f} rows/s"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Statement parser throughput on a synthetic CSV statement.
+
+Usage: python benchmarks/bench_parser.py [ROWS]
+"""
+
+import random
+import sys
+from datetime import datetime, timedelta
+from io import BytesIO
+from time import perf_counter
+from zoneinfo import ZoneInfo
+
+from firemerge.model.account_settings import AccountSettings, StatementParserSettings
+from firemerge.model.common import Account, AccountType, Currency
+from firemerge.statement.parser import StatementParser
+
+SETTINGS = StatementParserSettings.model_validate(
+    {
+        "format": {"format": "csv", "separator": ";", "encoding": "utf-8"},
+        "date_format": "%d.%m.%Y %H:%M:%S",
+        "decimal_separator": ",",
+        "columns": [
+            {"name": "Date", "role": "date"},
+            {"name": "Category", "notes_label": "Category"},
+            {"name": "Description", "role": "name", "notes_label": "Description"},
+            {"name": "Amount", "role": "amount"},
+            {"name": "Currency"},
+            {"name": "Balance", "role": "remaining_balance"},
+        ],
+    }
+)
+ACCOUNT = Account(id=1, type=AccountType.Asset, currency_id=1, name="Benchmark")
+CURRENCY = Currency(id=1, code="UAH", name="Hryvnia", symbol="₴")
+
+
+def generate_csv(rows: int, seed: int = 0) -> bytes:
+    rnd = random.Random(seed)
+    lines = [";".join(c.name for c in SETTINGS.columns)]
+    ts = datetime(2025, 1, 1)
+    balance = 1_000_000.0
+    for i in range(rows):
+        # a few operations per minute, rows in reverse chronological order
+        ts -= timedelta(seconds=rnd.randint(1, 120))
+        amount = round(rnd.uniform(-500, 500), 2)
+        lines.append(
+            ";".join(
+                [
+                    ts.strftime("%d.%m.%Y %H:%M:%S"),
+                    rnd.choice(["Food", "Transport", "Utilities", "Transfers"]),
+                    f"Merchant {rnd.randint(1, 500)}",
+                    f"{amount:.2f}".replace(".", ","),
+                    "UAH",
+                    f"{balance:.2f}".replace(".", ","),
+                ]
+            )
+        )
+        balance -= amount
+    return ("\n".join(lines) + "\n").encode()
+
+
+def main() -> None:
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    data = generate_csv(rows)
+    settings = AccountSettings(parser_settings=SETTINGS)
+    parser = StatementParser(
+        BytesIO(data), ACCOUNT, ZoneInfo("Europe/Kyiv"), settings, CURRENCY
+    )
+    started_at = perf_counter()
+    parsed = sum(1 for _ in parser.parse())
+    elapsed = perf_counter() - started_at
+    print(f"{parsed} rows in {elapsed:.2f}s: {parsed / elapsed:,.0f} rows/s")
+
+
+if __name__ == "__main__":
+    main()
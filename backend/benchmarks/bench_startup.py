@@ -0,0 +1,93 @@
+"""
+App startup cost.
+
+Imports firemerge.main in fresh interpreters and prints the import time
+and the process RSS after it, then the modules taking the longest to
+import as reported by `python -X importtime` (cumulative, with their own
+time), and which of the lazily imported dependencies got loaded anyway.
+
+Usage: python benchmarks/bench_startup.py [TOP] [REPEAT]
+"""
+
+import subprocess
+import sys
+from typing import NamedTuple
+
+# Dependencies only the statement readers, matchers or Redis backends need.
+LAZY_MODULES = (
+    "hidateinfer",
+    "openpyxl",
+    "pdfminer",
+    "pdfplumber",
+    "rapidfuzz",
+    "redis",
+    "thefuzz",
+    "uvicorn",
+)
+
+PROBE = """
+import sys
+from time import perf_counter
+started_at = perf_counter()
+import firemerge.main
+seconds = perf_counter() - started_at
+from firemerge.util import current_rss
+print(seconds, current_rss(), *sorted(m for m in sys.modules if "." not in m))
+"""
+
+
+class ModuleTime(NamedTuple):
+    name: str
+    depth: int
+    own: float
+    cumulative: float
+
+
+def probe() -> tuple[float, int, set[str]]:
+    out = subprocess.run(
+        [sys.executable, "-c", PROBE], check=True, capture_output=True, text=True
+    ).stdout.split()
+    return float(out[0]), int(out[1]), set(out[2:])
+
+
+def import_times() -> list[ModuleTime]:
+    err = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import firemerge.main"],
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stderr
+    times = []
+    for line in err.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        own, cumulative, name = line.removeprefix("import time:").split("|")
+        depth = (len(name) - len(name.lstrip())) // 2
+        times.append(
+            ModuleTime(name.strip(), depth, int(own) / 1e6, int(cumulative) / 1e6)
+        )
+    return times
+
+
+def main() -> None:
+    top = int(sys.argv[1]) if len(sys.argv) > 1 else 25
+    repeat = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+
+    runs = [probe() for _ in range(repeat)]
+    seconds = min(run[0] for run in runs)
+    rss = min(run[1] for run in runs)
+    print(f"import firemerge.main: {seconds:.3f}s, RSS {rss / 2**20:.1f} MiB")
+
+    times = import_times()
+    print(f"\n{'cumulative':>10} {'own':>8}  module")
+    for item in sorted(times, key=lambda t: t.cumulative, reverse=True)[:top]:
+        print(
+            f"{item.cumulative:10.3f} {item.own:8.3f}  {'  ' * item.depth}{item.name}"
+        )
+
+    loaded = sorted(set(LAZY_MODULES) & runs[0][2])
+    print(f"\nLazy dependencies loaded at startup: {', '.join(loaded) or 'none'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""
+Reader, parser and guesser throughput per statement format.
+
+Generates synthetic statements in the layouts of the bundled parser configs
+and measures reading rows (`iter_pages`), parsing (`StatementParser.parse`)
+and guessing settings (`guess_parser_settings`) separately. Results, with
+rows per second and peak traced memory of each stage, are printed as JSON.
+
+PDF table extraction is two orders of magnitude slower than the other
+readers, so PDF statements are generated with fewer rows.
+
+Usage: python benchmarks/bench_statement.py [--rows N] [--pdf-rows N]
+    [--config LABEL ...] [--all-formats] [--repeat N]
+"""
+
+import argparse
+import json
+import platform
+import sys
+import tracemalloc
+from collections.abc import Callable
+from io import BytesIO
+from time import perf_counter
+from typing import Any
+from zoneinfo import ZoneInfo
+
+from synthetic import ACCOUNT, CURRENCY, generate_rows, write_statement
+
+from firemerge.model.account_settings import (
+    AccountSettings,
+    StatementFormat,
+    StatementFormatSettings,
+    StatementFormatSettingsCSV,
+    StatementFormatSettingsPDF,
+    StatementFormatSettingsXLSX,
+    StatementParserSettings,
+)
+from firemerge.statement.config_repo import load_configs
+from firemerge.statement.parser import StatementParser, guess_parser_settings
+from firemerge.statement.reader import BaseStatementReader
+
+TZ = ZoneInfo("Europe/Kyiv")
+
+
+def format_settings(
+    settings: StatementParserSettings, fmt: StatementFormat
+) -> StatementFormatSettings:
+    if fmt is settings.format.format:
+        return settings.format
+    if fmt is StatementFormat.CSV:
+        return StatementFormatSettingsCSV(separator=",", encoding="utf-8")
+    if fmt is StatementFormat.XLSX:
+        return StatementFormatSettingsXLSX()
+    return StatementFormatSettingsPDF()
+
+
+def measure(run: Callable[[], int], repeat: int) -> dict[str, Any]:
+    """Best time of `repeat` runs, and peak memory of a separate traced run."""
+    seconds = float("inf")
+    for _ in range(repeat):
+        started_at = perf_counter()
+        rows = run()
+        seconds = min(seconds, perf_counter() - started_at)
+    tracemalloc.start()
+    try:
+        run()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {
+        "rows": rows,
+        "seconds": round(seconds, 4),
+        "rows_per_second": round(rows / seconds) if seconds else None,
+        "peak_memory_bytes": peak,
+    }
+
+
+def bench(
+    settings: StatementParserSettings, fmt: StatementFormat, rows: int, repeat: int
+) -> dict[str, Any]:
+    settings = settings.model_copy(update={"format": format_settings(settings, fmt)})
+    data = write_statement(settings, generate_rows(settings, rows), fmt)
+    account_settings = AccountSettings(parser_settings=settings)
+
+    def read() -> int:
+        reader = BaseStatementReader.create(BytesIO(data), settings.format)
+        return sum(len(list(page)) for page in reader.iter_pages())
+
+    def parse() -> int:
+        parser = StatementParser(BytesIO(data), ACCOUNT, TZ, account_settings, CURRENCY)
+        return sum(1 for _ in parser.parse())
+
+    def guess() -> int:
+        guess_parser_settings(BytesIO(data), settings.format)
+        return rows
+
+    return {
+        "size_bytes": len(data),
+        "iter_pages": measure(read, repeat),
+        "parse": measure(parse, repeat),
+        "guess": measure(guess, repeat),
+    }
+
+
+def main() -> None:
+    args = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    args.add_argument("--rows", type=int, default=10_000)
+    args.add_argument("--pdf-rows", type=int, default=1_000)
+    args.add_argument("--repeat", type=int, default=3)
+    args.add_argument(
+        "--config", action="append", help="Config label, all bundled by default"
+    )
+    args.add_argument(
+        "--all-formats",
+        action="store_true",
+        help="Also write each layout as CSV, XLSX and PDF",
+    )
+    opts = args.parse_args()
+
+    results = []
+    for config in load_configs():
+        if opts.config and config.label not in opts.config:
+            continue
+        formats = list(StatementFormat) if opts.all_formats else [config.format.format]
+        for fmt in formats:
+            rows = opts.pdf_rows if fmt is StatementFormat.PDF else opts.rows
+            print(f"{config.label} ({fmt.value}, {rows} rows)...", file=sys.stderr)
+            results.append(
+                {
+                    "config": config.label,
+                    "format": fmt.value,
+                    **bench(config, fmt, rows, opts.repeat),
+                }
+            )
+    json.dump(
+        {
+            "python": platform.python_version(),
+            "results": results,
+        },
+        sys.stdout,
+        indent=2,
+    )
+    print()
+
+
+if __name__ == "__main__":
+    main()
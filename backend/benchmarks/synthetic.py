@@ -0,0 +1,250 @@
+"""Synthetic statements in the layouts of the bundled parser configs."""
+
+import csv
+import random
+import zlib
+from datetime import datetime, timedelta
+from io import BytesIO, StringIO
+
+import openpyxl
+
+from firemerge.model.account_settings import (
+    ColumnRole,
+    StatementFormat,
+    StatementFormatSettingsCSV,
+    StatementParserSettings,
+)
+from firemerge.model.common import Account, AccountType, Currency
+from firemerge.statement.reader import ValueType
+
+IBAN = "UA213223130000026007233566001"
+COUNTERPART_IBAN = "UA213223130000026007233566002"
+ACCOUNT = Account(
+    id=1, type=AccountType.Asset, currency_id=1, name="Benchmark", iban=IBAN
+)
+CURRENCY = Currency(id=1, code="UAH", name="Hryvnia", symbol="₴")
+
+MERCHANTS = ["Сільпо", "АТБ", "Нова Пошта", "Netflix", "Bolt", "WOG", "Rozetka"]
+
+
+def generate_rows(
+    settings: StatementParserSettings, count: int, seed: int = 0
+) -> list[list[ValueType]]:
+    """
+    Generate statement rows, newest first, filling columns by their role.
+
+    Amounts are strings with the configured decimal separator, except in
+    XLSX where they are numbers, as banks export them. Layouts joined by doc
+    number get a counterpart row for every tenth operation.
+    """
+    rnd = random.Random(seed)
+    roles = {c.index: c.role for c in settings.columns}
+    numeric = settings.format.format is StatementFormat.XLSX
+    separator = settings.decimal_separator or "."
+
+    def money(value: float) -> ValueType:
+        return round(value, 2) if numeric else f"{value:.2f}".replace(".", separator)
+
+    rows = []
+    ts = datetime(2025, 1, 1)
+    balance = 1_000_000.0
+    while len(rows) < count:
+        ts -= timedelta(minutes=rnd.randint(1, 180))
+        amount = round(rnd.uniform(-2000, 2000), 2) or 1.0
+        merchant = f"{rnd.choice(MERCHANTS)} #{rnd.randint(1, 999)}"
+        doc_number = f"DOC{len(rows)}"
+        values: dict[ColumnRole | None, ValueType] = {
+            ColumnRole.DATE: ts.strftime(settings.date_format),
+            ColumnRole.NAME: merchant,
+            ColumnRole.IBAN: IBAN,
+            ColumnRole.CURRENCY_CODE: "UAH",
+            ColumnRole.AMOUNT: money(amount),
+            ColumnRole.COMMISION: money(0),
+            ColumnRole.AMOUNT_DEBIT: money(-amount) if amount < 0 else "",
+            ColumnRole.AMOUNT_CREDIT: money(amount) if amount > 0 else "",
+            ColumnRole.FOREIGN_CURRENCY_CODE: "UAH",
+            ColumnRole.FOREIGN_AMOUNT: money(amount),
+            ColumnRole.DOC_NUMBER: doc_number,
+            ColumnRole.REMAINING_BALANCE: money(balance),
+        }
+        rows.append([values.get(roles[i], "--") for i in range(len(roles))])
+        balance -= amount
+        if ColumnRole.DOC_NUMBER in roles.values() and len(rows) % 10 == 0:
+            counterpart = {
+                **values,
+                ColumnRole.IBAN: COUNTERPART_IBAN,
+                ColumnRole.CURRENCY_CODE: "USD",
+                ColumnRole.AMOUNT_DEBIT: values[ColumnRole.AMOUNT_CREDIT],
+                ColumnRole.AMOUNT_CREDIT: values[ColumnRole.AMOUNT_DEBIT],
+            }
+            rows.append([counterpart.get(roles[i], "--") for i in range(len(roles))])
+    return rows[:count]
+
+
+def write_statement(
+    settings: StatementParserSettings,
+    rows: list[list[ValueType]],
+    fmt: StatementFormat | None = None,
+) -> bytes:
+    """Write the header and rows in the given format, by default the config's."""
+    header = [c.name for c in settings.columns]
+    fmt = fmt or settings.format.format
+    if fmt is StatementFormat.CSV:
+        if isinstance(settings.format, StatementFormatSettingsCSV):
+            return write_csv(
+                header, rows, settings.format.separator, settings.format.encoding
+            )
+        return write_csv(header, rows)
+    if fmt is StatementFormat.XLSX:
+        return write_xlsx(header, rows)
+    return write_pdf(header, rows)
+
+
+def write_csv(
+    header: list[str],
+    rows: list[list[ValueType]],
+    delimiter: str = ",",
+    encoding: str = "utf-8",
+) -> bytes:
+    output = StringIO()
+    writer = csv.writer(output, delimiter=delimiter)
+    writer.writerow(["Statement for", "Benchmark"])
+    writer.writerow(header)
+    writer.writerows(rows)
+    return output.getvalue().encode(encoding)
+
+
+def write_xlsx(header: list[str], rows: list[list[ValueType]]) -> bytes:
+    wb = openpyxl.Workbook(write_only=True)
+    sheet = wb.create_sheet()
+    sheet.append(["Statement for", "Benchmark"])
+    sheet.append(header)
+    for row in rows:
+        sheet.append(row)
+    output = BytesIO()
+    wb.save(output)
+    return output.getvalue()
+
+
+# Adobe glyph names for Cyrillic letters, which pdfminer maps back to Unicode
+_CYRILLIC_GLYPHS = {
+    **{
+        chr(0x410 + i): f"afii{10017 + i + (i >= 6)}" for i in range(32)
+    },  # А-Я, Ё (afii10023) sits after Е
+    **{chr(0x430 + i): f"afii{10065 + i + (i >= 6)}" for i in range(32)},  # а-я
+    "Ё": "afii10023",
+    "ё": "afii10071",
+    "Є": "afii10053",
+    "є": "afii10101",
+    "І": "afii10055",
+    "і": "afii10103",
+    "Ї": "afii10056",
+    "ї": "afii10104",
+    "Ґ": "afii10050",
+    "ґ": "afii10098",
+}
+_GLYPH_CODES = {char: 128 + i for i, char in enumerate(_CYRILLIC_GLYPHS)}
+_FONT_SIZE = 6
+# pdfminer measures Latin glyphs of the built-in font by its own metrics, so
+# leave room for the widest of them to keep text inside its cell
+_CHAR_WIDTH = _FONT_SIZE
+_ROW_HEIGHT = 10
+
+
+def write_pdf(
+    header: list[str], rows: list[list[ValueType]], rows_per_page: int = 50
+) -> bytes:
+    """
+    Write a minimal PDF with one ruled table per page.
+
+    Uses the built-in Helvetica font with a custom encoding, so no font has
+    to be embedded; Cyrillic text extracts correctly even though it is not
+    rendered.
+    """
+    widths = [
+        max(len(str(cell or "")) for cell in column) * _CHAR_WIDTH + 6
+        for column in zip(header, *rows)
+    ]
+    lefts = [20 + sum(widths[:i]) for i in range(len(widths) + 1)]
+    page_width = lefts[-1] + 20
+    page_height = _ROW_HEIGHT * (rows_per_page + 1) + 40
+    pages = [rows[i : i + rows_per_page] for i in range(0, len(rows), rows_per_page)]
+
+    objects: list[bytes] = []
+
+    def add(data: bytes) -> int:
+        objects.append(data)
+        return len(objects)
+
+    glyphs = " ".join(f"/{name}" for name in _CYRILLIC_GLYPHS.values())
+    font_id = add(
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica "
+        b"/Encoding << /Type /Encoding /BaseEncoding /WinAnsiEncoding "
+        + f"/Differences [128 {glyphs}] >> ".encode()
+        + f"/FirstChar 32 /LastChar 255 /Widths [{' 500' * 224}] >>".encode()
+    )
+    pages_id = len(objects) + 2 * len(pages) + 1
+    page_ids = []
+    for page_rows in pages or [[]]:
+        table = [header, *page_rows]
+        top = page_height - 20
+        bottom = top - _ROW_HEIGHT * len(table)
+        ops = [b"0.5 w"]
+        for r in range(len(table) + 1):
+            y = top - r * _ROW_HEIGHT
+            ops.append(f"{lefts[0]} {y} m {lefts[-1]} {y} l S".encode())
+        for x in lefts:
+            ops.append(f"{x} {top} m {x} {bottom} l S".encode())
+        for r, row in enumerate(table):
+            y = top - (r + 1) * _ROW_HEIGHT + 3
+            for c, cell in enumerate(row):
+                if cell not in (None, ""):
+                    text = _pdf_string(str(cell))
+                    ops.append(
+                        f"BT /F1 {_FONT_SIZE} Tf {lefts[c] + 3} {y} Td (".encode()
+                        + text
+                        + b") Tj ET"
+                    )
+        stream = zlib.compress(b"\n".join(ops))
+        content_id = add(
+            f"<< /Length {len(stream)} /Filter /FlateDecode >>\nstream\n".encode()
+            + stream
+            + b"\nendstream"
+        )
+        page_ids.append(
+            add(
+                f"<< /Type /Page /Parent {pages_id} 0 R "
+                f"/MediaBox [0 0 {page_width} {page_height}] "
+                f"/Resources << /Font << /F1 {font_id} 0 R >> >> "
+                f"/Contents {content_id} 0 R >>".encode()
+            )
+        )
+    kids = " ".join(f"{i} 0 R" for i in page_ids)
+    add(f"<< /Type /Pages /Kids [{kids}] /Count {len(page_ids)} >>".encode())
+    catalog_id = add(f"<< /Type /Catalog /Pages {pages_id} 0 R >>".encode())
+
+    output = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for i, data in enumerate(objects, 1):
+        offsets.append(len(output))
+        output += f"{i} 0 obj\n".encode() + data + b"\nendobj\n"
+    xref = len(output)
+    output += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    output += b"".join(f"{offset:010d} 00000 n \n".encode() for offset in offsets)
+    output += (
+        f"trailer\n<< /Size {len(objects) + 1} /Root {catalog_id} 0 R >>\n"
+        f"startxref\n{xref}\n%%EOF\n"
+    ).encode()
+    return bytes(output)
+
+
+def _pdf_string(text: str) -> bytes:
+    result = bytearray()
+    for char in text:
+        if char in _GLYPH_CODES:
+            result.append(_GLYPH_CODES[char])
+        elif char in "()\\":
+            result += b"\\" + char.encode()
+        else:
+            result += char.encode("latin-1", "replace")
+    return bytes(result)
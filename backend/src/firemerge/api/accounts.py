@@ -1,12 +1,23 @@
+import asyncio
 from datetime import date, datetime, timedelta
 from typing import Annotated, List, Optional
 
-from fastapi import APIRouter, Body, HTTPException, Query, Response
+from fastapi import APIRouter, Body, HTTPException, Query
+from fastapi.responses import StreamingResponse
 
-from firemerge.api.deps import FireflyClientDep
-from firemerge.model.account_settings import AccountSettings
+from firemerge.api.deps import (
+    AccountSettingsFuture,
+    AccountsFuture,
+    CurrenciesFuture,
+    FireflyClientDep,
+)
+from firemerge.model.account_settings import AccountSettings, ExportSettings
 from firemerge.model.common import Account
-from firemerge.statement.export import export_statement
+from firemerge.statement.export import (
+    StatementExport,
+    stream_statement,
+    stream_statement_bundle,
+)
 
 router = APIRouter(prefix="/accounts")
 
@@ -16,6 +27,50 @@ async def get_accounts(firefly_client: FireflyClientDep) -> List[Account]:
     return await firefly_client.get_accounts()
 
 
+# Defined before /{account_id}, which would match the path otherwise
+@router.get("/taxer-statements")
+async def get_taxer_statements(
+    account_ids: Annotated[list[int], Query(..., alias="account_id")],
+    start_date: Annotated[date, Query(..., description="Start date (YYYY-MM-DD)")],
+    firefly_client: FireflyClientDep,
+    accounts_future: AccountsFuture,
+    currencies_future: CurrenciesFuture,
+    end_date: Annotated[
+        Optional[date], Query(description="End date (YYYY-MM-DD), today by default")
+    ] = None,
+):
+    """Generate ZIP archive of taxer statement CSVs for selected accounts"""
+    end = end_date or date.today() + timedelta(days=1)
+    settings = await asyncio.gather(
+        *(firefly_client.get_account_settings(acc_id) for acc_id in account_ids)
+    )
+    account_map = {acc.id: acc.name for acc in await accounts_future}
+    currency_map = {curr.id: curr.code for curr in await currencies_future}
+
+    statements = []
+    for account_id, account_settings in zip(account_ids, settings):
+        if account_settings is None or account_settings.export_settings is None:
+            raise HTTPException(
+                status_code=404,
+                detail=f"Export settings not found for account {account_id}",
+            )
+        statements.append(
+            StatementExport(
+                taxer_statement_filename(account_id, start_date),
+                firefly_client.iter_transactions(account_id, start_date, end),
+                account_settings.export_settings,
+            )
+        )
+
+    fname = f"firemerge_statements_{start_date}.zip"
+    headers = {"Content-Disposition": f'attachment; filename="{fname}"'}
+    return StreamingResponse(
+        stream_statement_bundle(statements, account_map, currency_map),
+        media_type="application/zip",
+        headers=headers,
+    )
+
+
 @router.get("/{account_id}")
 async def get_account(account_id: int, firefly_client: FireflyClientDep) -> Account:
     return await firefly_client.get_account(account_id)
@@ -45,6 +100,9 @@ async def get_taxer_statement(
         str, Query(..., description="Start date in ISO format (YYYY-MM-DD)")
     ],
     firefly_client: FireflyClientDep,
+    accounts_future: AccountsFuture,
+    currencies_future: CurrenciesFuture,
+    settings_future: AccountSettingsFuture,
 ):
     """Generate taxer statement CSV for selected account"""
     try:
@@ -55,31 +113,39 @@ async def get_taxer_statement(
             detail="Invalid start_date format. Use ISO format (YYYY-MM-DD)",
         )
 
-    account_map = {acc.id: acc.name for acc in await firefly_client.get_accounts()}
-    currency_map = {
-        curr.id: curr.code for curr in await firefly_client.get_currencies()
-    }
+    account_map = {acc.id: acc.name for acc in await accounts_future}
+    currency_map = {curr.id: curr.code for curr in await currencies_future}
+
+    export_settings = require_export_settings(await settings_future)
 
-    transactions = await firefly_client.get_transactions(
+    # Transactions are fetched page by page while the CSV is being sent
+    transactions = firefly_client.iter_transactions(
         account_id, start_date_dt.date(), date.today() + timedelta(days=1)
     )
-    account_settings = await firefly_client.get_account_settings(account_id)
+    csv_content = stream_statement(
+        transactions, account_map, currency_map, export_settings
+    )
+
+    fname = taxer_statement_filename(account_id, start_date_dt.date())
+    headers = {"Content-Disposition": f'attachment; filename="{fname}"'}
+    return StreamingResponse(csv_content, media_type="text/csv", headers=headers)
+
+
+def require_export_settings(
+    account_settings: Optional[AccountSettings],
+) -> ExportSettings:
     if account_settings is None:
         raise HTTPException(
             status_code=404,
             detail="Account settings not found",
         )
-    export_settings = account_settings.export_settings
-    if export_settings is None:
+    if account_settings.export_settings is None:
         raise HTTPException(
             status_code=404,
             detail="Export settings not found",
         )
+    return account_settings.export_settings
 
-    csv_content = export_statement(
-        transactions, account_map, currency_map, export_settings
-    )
 
-    fname = f"firemerge_statement_{account_id}_{start_date_dt.date()}.csv"
-    headers = {"Content-Disposition": f'attachment; filename="{fname}"'}
-    return Response(content=csv_content, media_type="text/csv", headers=headers)
+def taxer_statement_filename(account_id: int, start_date: date) -> str:
+    return f"firemerge_statement_{account_id}_{start_date}.csv"
@@ -1,6 +1,6 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, HTTPException
 
-from firemerge.api.deps import FireflyClientDep
+from firemerge.api.deps import FireflyClientDep, ReadyDep
 from firemerge.model.common import Category, Currency
 
 router = APIRouter()
@@ -14,3 +14,17 @@ async def get_categories(firefly_client: FireflyClientDep) -> list[Category]:
 @router.get("/currencies")
 async def get_currencies(firefly_client: FireflyClientDep) -> list[Currency]:
     return await firefly_client.get_currencies()
+
+
+@router.get("/health")
+async def health() -> dict[str, str]:
+    """Liveness probe, answered without calling Firefly III"""
+    return {"status": "ok"}
+
+
+@router.get("/ready")
+async def ready(ready: ReadyDep) -> dict[str, str]:
+    """Readiness probe, failing until the cache is warmed up"""
+    if not ready.is_set():
+        raise HTTPException(status_code=503, detail="Warming up")
+    return {"status": "ok"}
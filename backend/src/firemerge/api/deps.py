@@ -1,19 +1,92 @@
+import asyncio
 import logging
+import os
+import random
+from collections.abc import Awaitable, Callable
+from concurrent.futures import ProcessPoolExecutor
 from contextlib import asynccontextmanager
-from typing import Annotated, AsyncIterator, TypedDict
+from multiprocessing import get_context
+from time import monotonic
+from typing import Annotated, AsyncIterator, Optional, TypedDict, TypeVar
 
 from fastapi import Depends, FastAPI, Request
 from httpx import AsyncClient
 from starlette.routing import Route
 
+from firemerge.cache import CACHE_TTL, create_cache
 from firemerge.firefly_client import FireflyClient
+from firemerge.jobs.runner import JobManager
+from firemerge.jobs.store import create_job_store
+from firemerge.model.account_settings import AccountSettings
+from firemerge.model.api import StatementWatermark
+from firemerge.model.common import Account, Currency
+from firemerge.statement.config_repo import get_registry
+from firemerge.statement.executor import BoundedExecutor
+from firemerge.statement.sessions import StatementSessions, create_statement_sessions
 
 logger = logging.getLogger("uvicorn.error")
 
+T = TypeVar("T")
+
+# Web server processes, each with its own event loop and parse workers.
+WEB_WORKERS = int(os.getenv("WEB_WORKERS", "1"))
+# Worker processes for CPU-bound statement parsing, per web worker.
+PARSE_WORKERS = int(os.getenv("PARSE_WORKERS", "0")) or max(
+    1, (os.cpu_count() or 1) // WEB_WORKERS
+)
+# Redis server for the cache and jobs shared by all web workers.
+REDIS_URL = os.getenv("REDIS_URL")
+# Statements being parsed or waiting for a worker before new ones get a 503.
+PARSE_QUEUE_DEPTH = int(os.getenv("PARSE_QUEUE_DEPTH", "0")) or 4 * PARSE_WORKERS
+# Fill the cache before reporting readiness, unless set to 0.
+CACHE_WARMUP = os.getenv("CACHE_WARMUP", "1") != "0" and CACHE_TTL > 0
+# Seconds between cache refreshes, shorter than CACHE_TTL so entries never
+# expire; 0 disables.
+CACHE_REFRESH_INTERVAL = (
+    float(os.getenv("CACHE_REFRESH_INTERVAL") or 0.8 * CACHE_TTL)
+    if CACHE_TTL > 0
+    else 0
+)
+# Share of the interval refreshes are randomly moved by, so web workers
+# don't all call Firefly III at once.
+CACHE_REFRESH_JITTER = 0.1
+
 
 class State(TypedDict):
     http_client: AsyncClient
     firefly_client: FireflyClient
+    parse_executor: BoundedExecutor
+    statement_sessions: StatementSessions
+    job_manager: JobManager
+    ready: asyncio.Event
+
+
+async def keep_cache_warm(firefly_client: FireflyClient, ready: asyncio.Event) -> None:
+    """
+    Fill the cache, then refresh it every `CACHE_REFRESH_INTERVAL` seconds.
+
+    `ready` is set once the first fill is done, whether it succeeded or not:
+    a Firefly III outage shouldn't keep the server from answering requests
+    that don't need it.
+    """
+    if CACHE_WARMUP:
+        started = monotonic()
+        try:
+            await firefly_client.refresh_cache()
+        except Exception:
+            logger.warning("Cache warm-up failed", exc_info=True)
+        else:
+            logger.info("Cache warmed up in %.2fs", monotonic() - started)
+    ready.set()
+    if CACHE_REFRESH_INTERVAL <= 0:
+        return
+    while True:
+        jitter = random.uniform(-CACHE_REFRESH_JITTER, CACHE_REFRESH_JITTER)
+        await asyncio.sleep(CACHE_REFRESH_INTERVAL * (1 + jitter))
+        try:
+            await firefly_client.refresh_cache()
+        except Exception:
+            logger.warning("Cache refresh failed", exc_info=True)
 
 
 @asynccontextmanager
@@ -26,9 +99,50 @@ async def lifespan(app: FastAPI) -> AsyncIterator[State]:
                 f"-> {route.endpoint.__qualname__}"
             )
 
-    async with AsyncClient() as client:
-        firefly_client = FireflyClient.from_env(client)
-        yield {"http_client": client, "firefly_client": firefly_client}
+    # Load and validate the repo parser configs before serving requests
+    get_registry()
+
+    redis = None
+    if REDIS_URL:
+        from redis.asyncio import Redis
+
+        redis = Redis.from_url(REDIS_URL)
+    elif WEB_WORKERS > 1:
+        logger.warning(
+            "REDIS_URL is not set, each of %d web workers caches Firefly III "
+            "data and keeps background jobs on its own; statement sessions "
+            "are disabled",
+            WEB_WORKERS,
+        )
+
+    # Workers are spawned rather than forked from the running event loop
+    with ProcessPoolExecutor(
+        max_workers=PARSE_WORKERS, mp_context=get_context("spawn")
+    ) as parse_executor:
+        async with AsyncClient() as client:
+            firefly_client = FireflyClient.from_env(client, create_cache(redis))
+            statement_sessions = create_statement_sessions(redis)
+            job_manager = JobManager(create_job_store(redis))
+            ready = asyncio.Event()
+            cache_task = asyncio.create_task(keep_cache_warm(firefly_client, ready))
+            try:
+                yield {
+                    "http_client": client,
+                    "firefly_client": firefly_client,
+                    "parse_executor": BoundedExecutor(
+                        parse_executor, PARSE_WORKERS, PARSE_QUEUE_DEPTH
+                    ),
+                    "statement_sessions": statement_sessions,
+                    "job_manager": job_manager,
+                    "ready": ready,
+                }
+            finally:
+                cache_task.cancel()
+                # Jobs use the other resources until they are cancelled
+                await job_manager.close()
+                await statement_sessions.close()
+                if redis is not None:
+                    await redis.aclose()
 
 
 def state_dependency(prop_name: str):
@@ -40,3 +154,74 @@ def state_dependency(prop_name: str):
 
 HttpClientDep = Annotated[AsyncClient, Depends(state_dependency("http_client"))]
 FireflyClientDep = Annotated[FireflyClient, Depends(state_dependency("firefly_client"))]
+ParseExecutorDep = Annotated[
+    BoundedExecutor, Depends(state_dependency("parse_executor"))
+]
+StatementSessionsDep = Annotated[
+    StatementSessions, Depends(state_dependency("statement_sessions"))
+]
+JobManagerDep = Annotated[JobManager, Depends(state_dependency("job_manager"))]
+ReadyDep = Annotated[asyncio.Event, Depends(state_dependency("ready"))]
+
+
+@asynccontextmanager
+async def _started(fetch: Awaitable[T]) -> AsyncIterator[asyncio.Future[T]]:
+    future = asyncio.ensure_future(fetch)
+    try:
+        yield future
+    finally:
+        if not future.done():
+            future.cancel()
+        elif not future.cancelled():
+            # Retrieve the error of a fetch the route never awaited
+            future.exception()
+
+
+def prefetch(fetch: Callable[[FireflyClient], Awaitable[T]]):
+    """
+    Dependency starting a Firefly III request before the route runs.
+
+    The route gets the request as a future, so requests of all its prefetch
+    dependencies run concurrently. Requests the route doesn't await are
+    cancelled once it returns.
+    """
+
+    async def dependency(request: Request) -> AsyncIterator[asyncio.Future[T]]:
+        async with _started(fetch(request.state.firefly_client)) as future:
+            yield future
+
+    return dependency
+
+
+def prefetch_account(fetch: Callable[[FireflyClient, int], Awaitable[T]]):
+    """Same as `prefetch`, for requests about the `account_id` of the route"""
+
+    async def dependency(
+        account_id: int, request: Request
+    ) -> AsyncIterator[asyncio.Future[T]]:
+        async with _started(fetch(request.state.firefly_client, account_id)) as future:
+            yield future
+
+    return dependency
+
+
+AccountsFuture = Annotated[
+    asyncio.Future[list[Account]],
+    Depends(prefetch(lambda client: client.get_accounts())),
+]
+CurrenciesFuture = Annotated[
+    asyncio.Future[list[Currency]],
+    Depends(prefetch(lambda client: client.get_currencies())),
+]
+AccountFuture = Annotated[
+    asyncio.Future[Account],
+    Depends(prefetch_account(lambda client, id: client.get_account(id))),
+]
+AccountSettingsFuture = Annotated[
+    asyncio.Future[Optional[AccountSettings]],
+    Depends(prefetch_account(lambda client, id: client.get_account_settings(id))),
+]
+WatermarkFuture = Annotated[
+    asyncio.Future[Optional[StatementWatermark]],
+    Depends(prefetch_account(lambda client, id: client.get_account_watermark(id))),
+]
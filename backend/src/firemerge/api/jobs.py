@@ -0,0 +1,236 @@
+import asyncio
+from datetime import date, timedelta
+from typing import Annotated, AsyncIterator, Optional
+
+from fastapi import APIRouter, HTTPException, Query, Response, UploadFile
+from fastapi.responses import StreamingResponse
+
+from firemerge.api.accounts import require_export_settings, taxer_statement_filename
+from firemerge.api.deps import FireflyClientDep, JobManagerDep, ParseExecutorDep
+from firemerge.api.statement import (
+    MergePrefetch,
+    get_timezone,
+    parse_account_statement,
+)
+from firemerge.api.transactions import update_watermark
+from firemerge.jobs.runner import JobFunction, JobManager, JobQueueFullError, JobResult
+from firemerge.merge import merge_transactions, skip_processed
+from firemerge.model.api import DISPLAY_TRANSACTIONS, JobInfo, JobStatus
+from firemerge.statement.export import stream_statement
+from firemerge.util import ProgressCallback
+
+router = APIRouter(prefix="/jobs")
+
+
+@router.post("/statement-parse", status_code=202)
+async def submit_statement_parse(
+    file: UploadFile,
+    account_id: Annotated[int, Query(...)],
+    timezone: Annotated[str, Query(description="Client timezone")],
+    firefly_client: FireflyClientDep,
+    parse_executor: ParseExecutorDep,
+    job_manager: JobManagerDep,
+    full: Annotated[
+        bool, Query(description="Include rows merged by previous imports")
+    ] = False,
+) -> JobInfo:
+    """Parse a bank statement in the background, same as /statement/parse"""
+    content = await file.read()
+    tz = get_timezone(timezone)
+
+    async def run(progress: ProgressCallback) -> JobResult:
+        account, settings, currencies, watermark = await asyncio.gather(
+            firefly_client.get_account(account_id),
+            firefly_client.get_account_settings(account_id),
+            firefly_client.get_currencies(),
+            firefly_client.get_account_watermark(account_id),
+        )
+        async with job_manager.process_progress.forward(progress) as remote:
+            statement = await parse_account_statement(
+                parse_executor,
+                None,
+                content,
+                account,
+                settings,
+                currencies,
+                tz,
+                remote,
+                background=True,
+            )
+        if not full:
+            statement = skip_processed(statement, watermark)
+        return JobResult(statement.dump_json(), "application/json")
+
+    return await _submit(job_manager, "statement-parse", run)
+
+
+@router.post("/statement-merge", status_code=202)
+async def submit_statement_merge(
+    file: UploadFile,
+    account_id: Annotated[int, Query(...)],
+    timezone: Annotated[str, Query(description="Client timezone")],
+    firefly_client: FireflyClientDep,
+    parse_executor: ParseExecutorDep,
+    job_manager: JobManagerDep,
+    full: Annotated[
+        bool, Query(description="Include rows merged by previous imports")
+    ] = False,
+) -> JobInfo:
+    """Parse and merge a bank statement in the background, same as /statement/merge"""
+    content = await file.read()
+    tz = get_timezone(timezone)
+
+    async def run(progress: ProgressCallback) -> JobResult:
+        prefetch = MergePrefetch.start(firefly_client, account_id, progress)
+        watermark = asyncio.ensure_future(
+            firefly_client.get_account_watermark(account_id)
+        )
+        try:
+            account, settings, currencies = await asyncio.gather(
+                firefly_client.get_account(account_id),
+                firefly_client.get_account_settings(account_id),
+                firefly_client.get_currencies(),
+            )
+            async with job_manager.process_progress.forward(progress) as remote:
+                statement = await parse_account_statement(
+                    parse_executor,
+                    None,
+                    content,
+                    account,
+                    settings,
+                    currencies,
+                    tz,
+                    remote,
+                    background=True,
+                )
+            if not full:
+                statement = skip_processed(statement, await watermark)
+            transactions = await prefetch.complete(
+                firefly_client, account_id, statement, progress
+            )
+        except BaseException:
+            prefetch.transactions.cancel()
+            watermark.cancel()
+            raise
+
+        # Scoring candidates takes a while, status requests are served meanwhile
+        result, states = await asyncio.to_thread(
+            merge_transactions,
+            transactions,
+            statement,
+            currencies,
+            account_id,
+            progress,
+        )
+        await update_watermark(firefly_client, account_id, statement, states, watermark)
+        return JobResult(DISPLAY_TRANSACTIONS.dump_json(result), "application/json")
+
+    return await _submit(job_manager, "statement-merge", run)
+
+
+@router.post("/taxer-statement", status_code=202)
+async def submit_taxer_statement(
+    account_id: Annotated[int, Query(...)],
+    start_date: Annotated[date, Query(..., description="Start date (YYYY-MM-DD)")],
+    firefly_client: FireflyClientDep,
+    job_manager: JobManagerDep,
+) -> JobInfo:
+    """Generate taxer statement CSV in the background"""
+
+    async def run(progress: ProgressCallback) -> JobResult:
+        accounts, currencies, account_settings = await asyncio.gather(
+            firefly_client.get_accounts(),
+            firefly_client.get_currencies(),
+            firefly_client.get_account_settings(account_id),
+        )
+        export_settings = require_export_settings(account_settings)
+        transactions = firefly_client.iter_transactions(
+            account_id, start_date, date.today() + timedelta(days=1), progress
+        )
+        chunks = [
+            chunk
+            async for chunk in stream_statement(
+                transactions,
+                {acc.id: acc.name for acc in accounts},
+                {curr.id: curr.code for curr in currencies},
+                export_settings,
+            )
+        ]
+        return JobResult(
+            "".join(chunks).encode(),
+            "text/csv",
+            taxer_statement_filename(account_id, start_date),
+        )
+
+    return await _submit(job_manager, "taxer-statement", run)
+
+
+@router.get("/{job_id}")
+async def get_job(job_id: str, job_manager: JobManagerDep) -> JobInfo:
+    return await _get_job(job_manager, job_id)
+
+
+@router.get("/{job_id}/events")
+async def get_job_events(job_id: str, job_manager: JobManagerDep) -> StreamingResponse:
+    """
+    Server-Sent Events with the job state, until the job is finished.
+
+    Each event is named after the job status and carries the job as JSON.
+    """
+    await _get_job(job_manager, job_id)
+
+    async def events() -> AsyncIterator[str]:
+        async for job in job_manager.store.watch(job_id):
+            if job is None:
+                yield ": keep-alive\n\n"
+            else:
+                yield f"event: {job.status.value}\ndata: {job.model_dump_json()}\n\n"
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        # Proxies must not buffer the events
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.get("/{job_id}/result")
+async def get_job_result(job_id: str, job_manager: JobManagerDep) -> Response:
+    job = await _get_job(job_manager, job_id)
+    if job.status is not JobStatus.Done:
+        raise HTTPException(status_code=409, detail=f"Job is {job.status.value}")
+    content = await job_manager.store.get_result(job_id)
+    if content is None:
+        raise HTTPException(status_code=404, detail="Job result not found")
+    headers = {}
+    if job.filename:
+        headers["Content-Disposition"] = f'attachment; filename="{job.filename}"'
+    return Response(content=content, media_type=job.media_type, headers=headers)
+
+
+@router.delete("/{job_id}", status_code=204)
+async def delete_job(job_id: str, job_manager: JobManagerDep) -> None:
+    """Cancel an unfinished job, or delete a finished one with its result"""
+    job = await _get_job(job_manager, job_id)
+    if job.status.finished:
+        await job_manager.store.delete(job_id)
+    elif not await job_manager.cancel(job_id):
+        raise HTTPException(
+            status_code=409, detail="Job runs in another worker and can't be cancelled"
+        )
+
+
+async def _submit(job_manager: JobManager, kind: str, fn: JobFunction) -> JobInfo:
+    try:
+        return await job_manager.submit(kind, fn)
+    except JobQueueFullError as e:
+        raise HTTPException(
+            status_code=503, detail=str(e), headers={"Retry-After": "10"}
+        ) from e
+
+
+async def _get_job(job_manager: JobManager, job_id: str) -> JobInfo:
+    job: Optional[JobInfo] = await job_manager.store.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
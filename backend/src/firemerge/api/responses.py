@@ -0,0 +1,187 @@
+"""Serialization and compression of API responses."""
+
+import asyncio
+import os
+import zlib
+from collections.abc import Callable
+from typing import Optional, TypeVar
+
+from fastapi import Response
+from pydantic import TypeAdapter
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover
+    # Optional; responses are compressed with gzip only without it
+    brotli = None
+
+T = TypeVar("T")
+
+# Responses smaller than this many bytes are sent uncompressed.
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+# Response chunks larger than this many bytes are compressed in a thread.
+COMPRESSION_THREAD_MIN_SIZE = 256 * 1024
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+# Content types which are compressed already, or must reach the client unbuffered.
+UNCOMPRESSED_CONTENT_TYPES = (
+    "application/gzip",
+    "application/zip",
+    "text/event-stream",
+    "image/",
+    "font/woff",
+)
+
+
+def json_response(
+    adapter: TypeAdapter[T], value: T, headers: Optional[dict[str, str]] = None
+) -> Response:
+    """
+    JSON response serialized by pydantic in one go.
+
+    Routes returning large lists of models use it to skip FastAPI revalidating
+    the result and serializing it item by item.
+    """
+    return Response(
+        content=adapter.dump_json(value),
+        media_type="application/json",
+        headers=headers,
+    )
+
+
+Compressor = tuple[Callable[[bytes], bytes], Callable[[], bytes], Callable[[], bytes]]
+
+
+def _gzip() -> Compressor:
+    compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    return (
+        compressor.compress,
+        lambda: compressor.flush(zlib.Z_SYNC_FLUSH),
+        compressor.flush,
+    )
+
+
+def _brotli() -> Compressor:
+    compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+    return compressor.process, compressor.flush, compressor.finish
+
+
+def accepted_encodings(accept_encoding: str) -> set[str]:
+    """Encodings of an Accept-Encoding header, except the refused ones"""
+    accepted = set()
+    for item in accept_encoding.lower().split(","):
+        coding, _, params = item.partition(";")
+        quality = params.strip().removeprefix("q=")
+        try:
+            if quality and float(quality) <= 0:
+                continue
+        except ValueError:
+            continue
+        accepted.add(coding.strip())
+    return accepted
+
+
+def negotiate_encoding(accept_encoding: str) -> Optional[str]:
+    """The best encoding the client accepts, if any"""
+    accepted = accepted_encodings(accept_encoding)
+    if brotli is not None and "br" in accepted:
+        return "br"
+    if "gzip" in accepted:
+        return "gzip"
+    return None
+
+
+class CompressionMiddleware:
+    """
+    Compresses responses with brotli or gzip, as negotiated with the client.
+
+    Streaming responses are compressed chunk by chunk, each flushed to the
+    client as soon as it is produced.
+    """
+
+    def __init__(self, app: ASGIApp, minimum_size: int = COMPRESSION_MIN_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        encoding = None
+        if scope["type"] == "http":
+            headers = Headers(scope=scope)
+            encoding = negotiate_encoding(headers.get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+        responder = _CompressingResponder(encoding, self.minimum_size, send)
+        await self.app(scope, receive, responder.send)
+
+
+class _CompressingResponder:
+    def __init__(self, encoding: str, minimum_size: int, send: Send):
+        self.encoding = encoding
+        self.minimum_size = minimum_size
+        self._send = send
+        self._start: Optional[Message] = None
+        self._compressor: Optional[Compressor] = None
+        # whether the response passes through as is
+        self._identity = False
+
+    async def send(self, message: Message) -> None:
+        if message["type"] == "http.response.start":
+            headers = Headers(raw=message["headers"])
+            self._identity = (
+                "content-encoding" in headers
+                or message["status"] in (204, 206, 304)
+                or headers.get("content-type", "").startswith(
+                    UNCOMPRESSED_CONTENT_TYPES
+                )
+            )
+            if self._identity:
+                await self._send(message)
+            else:
+                # Headers depend on the first body chunk
+                self._start = message
+            return
+        if message["type"] != "http.response.body" or self._identity:
+            if self._start is not None:
+                # e.g. http.response.pathsend, passed through as is
+                self._identity = True
+                await self._send(self._start)
+                self._start = None
+            await self._send(message)
+            return
+
+        body: bytes = message.get("body", b"")
+        more_body: bool = message.get("more_body", False)
+        if self._start is not None:
+            start, self._start = self._start, None
+            headers = MutableHeaders(raw=start["headers"])
+            headers.add_vary_header("Accept-Encoding")
+            if not more_body and len(body) < self.minimum_size:
+                self._identity = True
+                await self._send(start)
+                await self._send(message)
+                return
+            self._compressor = _brotli() if self.encoding == "br" else _gzip()
+            body = await self._compress(body, more_body)
+            headers["Content-Encoding"] = self.encoding
+            if more_body:
+                del headers["Content-Length"]
+            else:
+                headers["Content-Length"] = str(len(body))
+            await self._send(start)
+        else:
+            body = await self._compress(body, more_body)
+        await self._send({**message, "body": body})
+
+    async def _compress(self, body: bytes, more_body: bool) -> bytes:
+        if len(body) < COMPRESSION_THREAD_MIN_SIZE:
+            return self._compress_sync(body, more_body)
+        # Large responses would block the event loop for too long
+        return await asyncio.to_thread(self._compress_sync, body, more_body)
+
+    def _compress_sync(self, body: bytes, more_body: bool) -> bytes:
+        assert self._compressor is not None
+        compress, flush, finish = self._compressor
+        return compress(body) + (flush() if more_body else finish())
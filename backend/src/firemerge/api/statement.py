@@ -1,61 +1,145 @@
+import asyncio
 import logging
+import os
+from collections.abc import Callable
+from datetime import date, timedelta
 from io import BytesIO
-from typing import Annotated
+from itertools import chain
+from typing import Annotated, Any, NamedTuple, Optional, TypeVar
 from zoneinfo import ZoneInfo
 
-from fastapi import APIRouter, Form, HTTPException, UploadFile
+from fastapi import (
+    APIRouter,
+    Form,
+    Header,
+    HTTPException,
+    Request,
+    Response,
+    UploadFile,
+)
 from fastapi.param_functions import Query
 from pydantic import TypeAdapter, ValidationError
 
-from firemerge.api.deps import FireflyClientDep
+from firemerge.api.deps import (
+    WEB_WORKERS,
+    AccountFuture,
+    AccountSettingsFuture,
+    AccountsFuture,
+    CurrenciesFuture,
+    FireflyClientDep,
+    ParseExecutorDep,
+    StatementSessionsDep,
+    WatermarkFuture,
+)
+from firemerge.api.responses import json_response
+from firemerge.api.transactions import (
+    get_account_transactions,
+    statement_date_range,
+    update_watermark,
+)
+from firemerge.firefly_client import FireflyClient
+from firemerge.merge import merge_transactions, skip_processed
 from firemerge.model.account_settings import (
+    AccountSettings,
     GuessedStatementParserSettings,
     RepoStatementParserSettings,
     StatementFormatSettings,
+    StatementParserSettingsMatch,
+)
+from firemerge.model.api import (
+    DISPLAY_TRANSACTIONS,
+    STATEMENT_PARSE_RESULTS,
+    DisplayTransaction,
+    StatementParseResult,
+    StatementTransaction,
+)
+from firemerge.model.common import Account, AccountType, Currency
+from firemerge.model.firefly import Transaction
+from firemerge.statement.batch import StatementBatch
+from firemerge.statement.config_index import ConfigCandidate, ConfigIndex
+from firemerge.statement.config_repo import get_registry, load_configs
+from firemerge.statement.executor import (
+    BoundedExecutor,
+    ClientDisconnectedError,
+    ExecutorBusyError,
 )
-from firemerge.model.api import StatementTransaction
-from firemerge.statement.config_repo import load_configs
-from firemerge.statement.parser import StatementParser, guess_parser_settings
+from firemerge.statement.parser import (
+    guess_parser_settings,
+    parse_statement_content,
+)
+from firemerge.statement.sessions import StatementTooLargeForSessionError
+from firemerge.util import ProgressCallback
 
 logger = logging.getLogger("uvicorn.error")
 router = APIRouter(prefix="/statement")
 
+T = TypeVar("T")
+
+# Seconds a single statement may take to parse or guess settings for, once
+# a worker picks it up.
+PARSE_TIMEOUT = float(os.getenv("PARSE_TIMEOUT", "120"))
+
+# Response header with the id of the statement session.
+SESSION_HEADER = "X-Statement-Session"
+
+# Days before today a statement is assumed to start at, when Firefly III
+# transactions are fetched for merging while the statement is being parsed.
+MERGE_PREFETCH_DAYS = int(os.getenv("MERGE_PREFETCH_DAYS", "90"))
+
 
-@router.post("/parse")
+@router.post("/parse", response_model=list[StatementTransaction])
 async def parse_statement(
     file: UploadFile,
     account_id: Annotated[int, Query(...)],
     timezone: Annotated[str, Query(description="Client timezone")],
-    firefly_client: FireflyClientDep,
-) -> list[StatementTransaction]:
+    request: Request,
+    parse_executor: ParseExecutorDep,
+    statement_sessions: StatementSessionsDep,
+    account_future: AccountFuture,
+    settings_future: AccountSettingsFuture,
+    currencies_future: CurrenciesFuture,
+    watermark_future: WatermarkFuture,
+    full: Annotated[
+        bool, Query(description="Include rows merged by previous imports")
+    ] = False,
+    session: Annotated[
+        bool,
+        Query(
+            description="Keep the parsed statement server-side, "
+            f"its session id is returned in the {SESSION_HEADER} header"
+        ),
+    ] = False,
+) -> Response:
     """Handle file upload for bank statement"""
     try:
-        content = BytesIO(await file.read())
-        account = await firefly_client.get_account(account_id)
-        settings = await firefly_client.get_account_settings(account_id)
-        primary_currency = next(
-            c
-            for c in await firefly_client.get_currencies()
-            if c.id == account.currency_id
+        transactions = await parse_account_statement(
+            parse_executor,
+            request,
+            await file.read(),
+            await account_future,
+            await settings_future,
+            await currencies_future,
+            get_timezone(timezone),
+        )
+        if not full:
+            transactions = skip_processed(transactions, await watermark_future)
+        headers = {}
+        # The client falls back to sending the statement itself without one
+        if session and not statement_sessions.shared and WEB_WORKERS > 1:
+            # The merge request may reach a worker that doesn't have it
+            logger.warning("Statement sessions need REDIS_URL with several workers")
+        elif session:
+            try:
+                headers[SESSION_HEADER] = await statement_sessions.put(
+                    account_id, transactions
+                )
+            except StatementTooLargeForSessionError:
+                logger.warning("Statement session not created", exc_info=True)
+        return Response(
+            content=transactions.dump_json(),
+            media_type="application/json",
+            headers=headers,
         )
-
-        if settings is None or settings.parser_settings is None:
-            raise HTTPException(status_code=400, detail="Account settings not found")
-
-        # Validate timezone
-        try:
-            tz = ZoneInfo(timezone)
-        except Exception:
-            logger.warning("Invalid timezone %s, using UTC", timezone, exc_info=True)
-            tz = ZoneInfo("UTC")
-
-        # Parse the statement
-        try:
-            parser = StatementParser(content, account, tz, settings, primary_currency)
-            return list(parser.parse())
-        except Exception as e:
-            logger.exception("Parse failed")
-            raise HTTPException(status_code=400, detail=str(e)) from e
 
     except HTTPException:
         raise
@@ -64,12 +148,190 @@ async def parse_statement(
         raise HTTPException(status_code=500, detail=f"Upload failed: {str(e)}")
 
 
+@router.post("/merge", response_model=list[DisplayTransaction])
+async def parse_and_merge_statement(
+    file: UploadFile,
+    account_id: Annotated[int, Query(...)],
+    timezone: Annotated[str, Query(description="Client timezone")],
+    request: Request,
+    firefly_client: FireflyClientDep,
+    parse_executor: ParseExecutorDep,
+    account_future: AccountFuture,
+    settings_future: AccountSettingsFuture,
+    currencies_future: CurrenciesFuture,
+    watermark_future: WatermarkFuture,
+    full: Annotated[
+        bool, Query(description="Include rows merged by previous imports")
+    ] = False,
+) -> Response:
+    """Parse a bank statement and merge it with Firefly III transactions"""
+    prefetch = MergePrefetch.start(firefly_client, account_id)
+    try:
+        currencies = await currencies_future
+        statement = await parse_account_statement(
+            parse_executor,
+            request,
+            await file.read(),
+            await account_future,
+            await settings_future,
+            currencies,
+            get_timezone(timezone),
+        )
+        if not full:
+            statement = skip_processed(statement, await watermark_future)
+        transactions = await prefetch.complete(firefly_client, account_id, statement)
+    except BaseException:
+        prefetch.transactions.cancel()
+        raise
+
+    result, states = merge_transactions(transactions, statement, currencies, account_id)
+    await update_watermark(
+        firefly_client, account_id, statement, states, watermark_future
+    )
+    return json_response(DISPLAY_TRANSACTIONS, result)
+
+
+@router.post("/parse-batch", response_model=list[StatementParseResult])
+async def parse_statements(
+    files: list[UploadFile],
+    account_ids: Annotated[list[int], Form(description="Account of each file")],
+    timezone: Annotated[str, Query(description="Client timezone")],
+    request: Request,
+    firefly_client: FireflyClientDep,
+    parse_executor: ParseExecutorDep,
+    full: Annotated[
+        bool, Query(description="Include rows merged by previous imports")
+    ] = False,
+) -> Response:
+    """Parse several bank statements, possibly for different accounts"""
+    if len(files) != len(account_ids):
+        raise HTTPException(
+            status_code=400, detail="Each file must have exactly one account id"
+        )
+    # The batch is admitted as a whole, its files then wait for each other
+    if parse_executor.busy:
+        raise HTTPException(
+            status_code=503,
+            detail="Too many statements are being processed",
+            headers={"Retry-After": "10"},
+        )
+    tz = get_timezone(timezone)
+    unique_ids = list(dict.fromkeys(account_ids))
+
+    # Prefetch everything the parsers need at once
+    (
+        contents,
+        currencies,
+        accounts,
+        accounts_settings,
+        watermarks,
+    ) = await asyncio.gather(
+        asyncio.gather(*(file.read() for file in files)),
+        firefly_client.get_currencies(),
+        asyncio.gather(
+            *(firefly_client.get_account(id) for id in unique_ids),
+            return_exceptions=True,
+        ),
+        asyncio.gather(
+            *(firefly_client.get_account_settings(id) for id in unique_ids),
+            return_exceptions=True,
+        ),
+        asyncio.gather(
+            *(
+                _no_watermark() if full else firefly_client.get_account_watermark(id)
+                for id in unique_ids
+            ),
+            return_exceptions=True,
+        ),
+    )
+    account_map = dict(zip(unique_ids, accounts))
+    settings_map = dict(zip(unique_ids, accounts_settings))
+    watermark_map = dict(zip(unique_ids, watermarks))
+
+    async def parse(content: bytes, account_id: int) -> StatementBatch:
+        account = account_map[account_id]
+        settings = settings_map[account_id]
+        if isinstance(account, BaseException):
+            raise account
+        if isinstance(settings, BaseException):
+            raise settings
+        if settings is None or settings.parser_settings is None:
+            raise ValueError("Account settings not found")
+        primary_currency = next(c for c in currencies if c.id == account.currency_id)
+        transactions = await _run_parse(
+            parse_executor,
+            request,
+            parse_statement_content,
+            content,
+            account,
+            tz,
+            settings,
+            primary_currency,
+            wait=True,
+        )
+        watermark = watermark_map[account_id]
+        if isinstance(watermark, BaseException):
+            raise watermark
+        return skip_processed(transactions, watermark)
+
+    results = await asyncio.gather(
+        *(
+            parse(content, account_id)
+            for content, account_id in zip(contents, account_ids)
+        ),
+        return_exceptions=True,
+    )
+
+    response = []
+    for file, account_id, result in zip(files, account_ids, results):
+        if isinstance(result, BaseException):
+            logger.error("Parse of %s failed", file.filename, exc_info=result)
+            response.append(
+                StatementParseResult(
+                    filename=file.filename, account_id=account_id, error=str(result)
+                )
+            )
+        else:
+            response.append(
+                StatementParseResult(
+                    filename=file.filename,
+                    account_id=account_id,
+                    transactions=result.to_models(),
+                )
+            )
+    return json_response(STATEMENT_PARSE_RESULTS, response)
+
+
+@router.get("/sessions/{session_id}", response_model=list[StatementTransaction])
+async def get_statement_session(
+    session_id: str,
+    statement_sessions: StatementSessionsDep,
+) -> Response:
+    """Parsed statement kept by /parse"""
+    if (session := await statement_sessions.get(session_id)) is None:
+        raise HTTPException(status_code=404, detail="Statement session not found")
+    return Response(
+        content=session.statement.dump_json(), media_type="application/json"
+    )
+
+
+@router.delete("/sessions/{session_id}", status_code=204)
+async def delete_statement_session(
+    session_id: str,
+    statement_sessions: StatementSessionsDep,
+) -> None:
+    if not await statement_sessions.delete(session_id):
+        raise HTTPException(status_code=404, detail="Statement session not found")
+
+
 @router.post("/guess-parser-settings")
 async def guess_parser_settings_endpoint(
     file: Annotated[UploadFile, Form(...)],
     format_settings_str: Annotated[
         str, Form(description="JSON format settings", alias="format_settings")
     ],
+    request: Request,
+    parse_executor: ParseExecutorDep,
 ) -> GuessedStatementParserSettings:
     content = BytesIO(await file.read())
     try:
@@ -79,12 +341,216 @@ async def guess_parser_settings_endpoint(
     except ValidationError as e:
         raise HTTPException(status_code=400, detail=e.errors()) from e
     try:
-        return guess_parser_settings(content, format_settings)
+        return await _run_parse(
+            parse_executor, request, guess_parser_settings, content, format_settings
+        )
+    except HTTPException:
+        raise
     except Exception as e:
         logger.exception("Guess config failed", exc_info=True)
         raise HTTPException(status_code=400, detail=str(e)) from e
 
 
-@router.get("/configs")
-async def get_configs() -> list[RepoStatementParserSettings]:
-    return load_configs()
+@router.post("/match-configs")
+async def match_configs(
+    file: UploadFile,
+    request: Request,
+    firefly_client: FireflyClientDep,
+    parse_executor: ParseExecutorDep,
+    accounts_future: AccountsFuture,
+) -> list[StatementParserSettingsMatch]:
+    """Rank repo and account parser settings by how well they fit the file"""
+    content = await file.read()
+    accounts = [acc for acc in await accounts_future if acc.type is AccountType.Asset]
+    accounts_settings = await asyncio.gather(
+        *(firefly_client.get_account_settings(acc.id) for acc in accounts)
+    )
+    index = ConfigIndex(
+        chain(
+            (
+                ConfigCandidate(
+                    label=config.label, account_id=None, parser_settings=config
+                )
+                for config in load_configs()
+            ),
+            (
+                ConfigCandidate(
+                    label=acc.name,
+                    account_id=acc.id,
+                    parser_settings=settings.parser_settings,
+                )
+                for acc, settings in zip(accounts, accounts_settings)
+                if settings is not None and settings.parser_settings is not None
+            ),
+        )
+    )
+    # Reading the head of PDF and XLSX files blocks like parsing does
+    try:
+        return await _run_parse(parse_executor, request, index.match, content)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.exception("Config match failed")
+        raise HTTPException(status_code=400, detail=str(e)) from e
+
+
+@router.get("/configs", response_model=list[RepoStatementParserSettings])
+async def get_configs(
+    if_none_match: Annotated[str | None, Header()] = None,
+) -> Response:
+    registry = get_registry()
+    headers = {"ETag": registry.etag, "Cache-Control": "no-cache"}
+    if if_none_match == registry.etag:
+        return Response(status_code=304, headers=headers)
+    return Response(
+        content=registry.json, media_type="application/json", headers=headers
+    )
+
+
+class MergePrefetch(NamedTuple):
+    """
+    Firefly III transactions fetched while a statement is being parsed.
+
+    Only the range a recent statement needs is prefetched; the rest is
+    fetched once the statement dates are known.
+    """
+
+    start_date: date
+    end_date: date
+    transactions: "asyncio.Task[list[Transaction]]"
+
+    @classmethod
+    def start(
+        cls,
+        firefly_client: FireflyClient,
+        account_id: int,
+        progress: Optional[ProgressCallback] = None,
+    ) -> "MergePrefetch":
+        today = date.today()
+        start_date = today - timedelta(days=365 + MERGE_PREFETCH_DAYS)
+        end_date = today + timedelta(days=1)
+        return cls(
+            start_date,
+            end_date,
+            asyncio.create_task(
+                get_account_transactions(
+                    account_id, firefly_client, start_date, end_date, progress
+                )
+            ),
+        )
+
+    async def complete(
+        self,
+        firefly_client: FireflyClient,
+        account_id: int,
+        statement: StatementBatch,
+        progress: Optional[ProgressCallback] = None,
+    ) -> list[Transaction]:
+        """Transactions to merge the statement with"""
+        transactions = await self.transactions
+        start_date, end_date = statement_date_range(statement)
+        missing = []
+        if start_date < self.start_date:
+            missing.append((start_date, self.start_date - timedelta(days=1)))
+        if end_date > self.end_date:
+            missing.append((self.end_date + timedelta(days=1), end_date))
+        for chunk in await asyncio.gather(
+            *(
+                get_account_transactions(
+                    account_id, firefly_client, start, end, progress
+                )
+                for start, end in missing
+            )
+        ):
+            transactions.extend(chunk)
+        # Same transactions as /transactions/ would merge the statement with
+        return [tr for tr in transactions if start_date <= tr.date.date() <= end_date]
+
+
+async def parse_account_statement(
+    executor: BoundedExecutor,
+    request: Optional[Request],
+    content: bytes,
+    account: Account,
+    settings: Optional[AccountSettings],
+    currencies: list[Currency],
+    tz: ZoneInfo,
+    progress: Optional[ProgressCallback] = None,
+    background: bool = False,
+) -> StatementBatch:
+    """
+    Parse a statement of the account in the parse executor.
+
+    `progress` is called in a worker process, so it must be picklable.
+    `background` parses, like those of jobs, have no deadline and wait for
+    a free worker rather than failing when the executor is busy.
+    """
+    if settings is None or settings.parser_settings is None:
+        raise HTTPException(status_code=400, detail="Account settings not found")
+    primary_currency = next(c for c in currencies if c.id == account.currency_id)
+    try:
+        return await _run_parse(
+            executor,
+            request,
+            parse_statement_content,
+            content,
+            account,
+            tz,
+            settings,
+            primary_currency,
+            progress,
+            timeout=None if background else PARSE_TIMEOUT,
+            wait=background,
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.exception("Parse failed")
+        raise HTTPException(status_code=400, detail=str(e)) from e
+
+
+async def _run_parse(
+    executor: BoundedExecutor,
+    request: Optional[Request],
+    fn: Callable[..., T],
+    *args: Any,
+    timeout: Optional[float] = PARSE_TIMEOUT,
+    wait: bool = False,
+) -> T:
+    """
+    Run statement work in the parse executor, mapping its limits to HTTP errors.
+
+    Work of a `request` is abandoned once its client disconnects. With `wait`,
+    the work waits for a free slot rather than failing with a 503.
+    """
+    try:
+        return await executor.run(
+            fn,
+            *args,
+            timeout=timeout,
+            is_disconnected=request.is_disconnected if request else None,
+            wait=wait,
+        )
+    except ExecutorBusyError as e:
+        raise HTTPException(
+            status_code=503, detail=str(e), headers={"Retry-After": "10"}
+        ) from e
+    except TimeoutError as e:
+        raise HTTPException(
+            status_code=504, detail="Statement processing timed out"
+        ) from e
+    except ClientDisconnectedError as e:
+        # Nobody reads the response, the status only shows up in the logs
+        raise HTTPException(status_code=499, detail=str(e)) from e
+
+
+def get_timezone(timezone: str) -> ZoneInfo:
+    try:
+        return ZoneInfo(timezone)
+    except Exception:
+        logger.warning("Invalid timezone %s, using UTC", timezone, exc_info=True)
+        return ZoneInfo("UTC")
+
+
+async def _no_watermark() -> None:
+    return None
@@ -0,0 +1,151 @@
+"""Frontend assets with precompressed variants and cache headers."""
+
+import hashlib
+import os
+from email.utils import formatdate
+from mimetypes import guess_type
+from typing import NamedTuple, Optional
+
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, PlainTextResponse, Response
+from starlette.types import Receive, Scope, Send
+
+from firemerge.api.responses import accepted_encodings
+
+# Vite puts bundles with content hashes in their names here.
+FINGERPRINTED_PREFIX = "assets/"
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE_CONTROL = "no-cache"
+# Precompressed variants by encoding, in order of preference.
+ENCODING_SUFFIXES = {"br": ".br", "gzip": ".gz"}
+
+
+class AssetFile(NamedTuple):
+    path: str
+    stat: os.stat_result
+    etag: str
+
+
+class Asset(NamedTuple):
+    media_type: str
+    immutable: bool
+    # The file itself under None, precompressed variants by encoding
+    files: dict[Optional[str], AssetFile]
+
+
+class StaticAssets:
+    """
+    Serves the built frontend like StaticFiles with html=True.
+
+    Files are indexed once, so requests for bundles don't touch the file
+    system before sending. Precompressed `.br`/`.gz` files next to an asset are sent to
+    clients accepting them. Fingerprinted bundles are cached by browsers for
+    good, other files like index.html are revalidated on each use, which is
+    why they are stat-ed again per request rather than trusted from the
+    index. The index is rebuilt if the directory changes, e.g. when the
+    frontend is rebuilt while the server runs.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self._mtime: Optional[int] = None
+        self._assets: dict[str, Asset] = {}
+        self._reindex()
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        assert scope["type"] == "http"
+        if scope["method"] not in ("GET", "HEAD"):
+            response: Response = PlainTextResponse(
+                "Method Not Allowed", status_code=405, headers={"Allow": "GET, HEAD"}
+            )
+        else:
+            path = scope["path"].removeprefix(scope.get("root_path", ""))
+            response = self._respond(path.lstrip("/"), Headers(scope=scope))
+        await response(scope, receive, send)
+
+    def _respond(self, path: str, headers: Headers) -> Response:
+        if (name := self._lookup(path)) is None:
+            if (name := self._lookup("404.html")) is None:
+                return PlainTextResponse("Not Found", status_code=404)
+            status_code = 404
+        else:
+            status_code = 200
+        asset = self._assets[name]
+
+        accepted = accepted_encodings(headers.get("accept-encoding", ""))
+        encoding = next(
+            (e for e in ENCODING_SUFFIXES if e in accepted and e in asset.files), None
+        )
+        file = asset.files[encoding]
+        if not asset.immutable:
+            file = _asset_file(file.path)
+
+        response_headers = {
+            "Cache-Control": IMMUTABLE_CACHE_CONTROL
+            if asset.immutable
+            else REVALIDATE_CACHE_CONTROL,
+            "ETag": file.etag,
+            "Last-Modified": formatdate(file.stat.st_mtime, usegmt=True),
+        }
+        if len(asset.files) > 1:
+            response_headers["Vary"] = "Accept-Encoding"
+        if encoding is not None:
+            response_headers["Content-Encoding"] = encoding
+        if status_code == 200 and file.etag in _etags(headers.get("if-none-match")):
+            return Response(status_code=304, headers=response_headers)
+        return FileResponse(
+            file.path,
+            status_code=status_code,
+            headers=response_headers,
+            media_type=asset.media_type,
+            stat_result=file.stat,
+        )
+
+    def _lookup(self, path: str) -> Optional[str]:
+        for _ in range(2):
+            for name in (path, f"{path.rstrip('/')}/index.html".lstrip("/")):
+                if name in self._assets:
+                    return name
+            if not self._reindex():
+                break
+        return None
+
+    def _reindex(self) -> bool:
+        """Index the directory again if it changed, returns whether it did"""
+        mtime = os.stat(self.directory).st_mtime_ns
+        if mtime == self._mtime:
+            return False
+        self._mtime = mtime
+        suffixes = tuple(ENCODING_SUFFIXES.values())
+        assets = {}
+        for root, _, filenames in os.walk(self.directory):
+            for filename in filenames:
+                path = os.path.join(root, filename)
+                if filename.endswith(suffixes) and os.path.isfile(
+                    os.path.splitext(path)[0]
+                ):
+                    continue
+                files: dict[Optional[str], AssetFile] = {None: _asset_file(path)}
+                for encoding, suffix in ENCODING_SUFFIXES.items():
+                    if os.path.isfile(path + suffix):
+                        files[encoding] = _asset_file(path + suffix)
+                name = os.path.relpath(path, self.directory).replace(os.sep, "/")
+                assets[name] = Asset(
+                    media_type=guess_type(filename)[0] or "application/octet-stream",
+                    immutable=name.startswith(FINGERPRINTED_PREFIX),
+                    files=files,
+                )
+        self._assets = assets
+        return True
+
+
+def _asset_file(path: str) -> AssetFile:
+    stat = os.stat(path)
+    etag = hashlib.md5(f"{stat.st_mtime_ns}-{stat.st_size}".encode()).hexdigest()
+    return AssetFile(path, stat, f'"{etag}"')
+
+
+def _etags(if_none_match: Optional[str]) -> list[str]:
+    if not if_none_match:
+        return []
+    return [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
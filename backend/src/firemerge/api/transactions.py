@@ -1,43 +1,80 @@
+import logging
 from datetime import date, timedelta
-from typing import Annotated, AsyncIterable, List, Optional
+from typing import Annotated, AsyncIterable, Awaitable, List, Optional
 
-from fastapi import APIRouter, Body, HTTPException, Query
+from fastapi import APIRouter, Body, HTTPException, Query, Response
 
-from firemerge.api.deps import FireflyClientDep
+from firemerge.api.deps import (
+    AccountFuture,
+    CurrenciesFuture,
+    FireflyClientDep,
+    StatementSessionsDep,
+    WatermarkFuture,
+)
+from firemerge.api.responses import json_response
 from firemerge.firefly_client import FireflyClient
-from firemerge.merge import best_candidates, deduplicate_candidates, merge_transactions
+from firemerge.merge import (
+    advance_watermark,
+    best_candidates,
+    deduplicate_candidates,
+    merge_transactions,
+)
 from firemerge.model.api import (
+    DISPLAY_TRANSACTIONS,
     DisplayTransaction,
     DisplayTransactionType,
     StatementTransaction,
+    StatementWatermark,
     TransactionCandidate,
     TransactionUpdateResponse,
 )
 from firemerge.model.firefly import Transaction, TransactionState, TransactionType
-from firemerge.util import async_collect
+from firemerge.statement.batch import StatementBatch
+from firemerge.util import ProgressCallback, async_collect
 
+logger = logging.getLogger("uvicorn.error")
 router = APIRouter(prefix="/transactions")
 
 
-@router.post("/")
+@router.post("/", response_model=List[DisplayTransaction])
 async def get_transactions(
     account_id: Annotated[int, Query(...)],
-    statement: Annotated[list[StatementTransaction], Body(...)],
     firefly_client: FireflyClientDep,
-) -> List[DisplayTransaction]:
+    statement_sessions: StatementSessionsDep,
+    currencies_future: CurrenciesFuture,
+    watermark_future: WatermarkFuture,
+    statement: Annotated[Optional[list[StatementTransaction]], Body()] = None,
+    session_id: Annotated[
+        Optional[str],
+        Query(description="Statement kept by /statement/parse, instead of the body"),
+    ] = None,
+) -> Response:
     """Get merged transactions for an account"""
-    start_date = min(
-        (tr.date.date() for tr in statement), default=date.today()
-    ) - timedelta(days=365)
-    end_date = max(
-        (tr.date.date() for tr in statement), default=date.today()
-    ) + timedelta(days=1)
-    return merge_transactions(
-        await _get_transactions(account_id, firefly_client, start_date, end_date),
-        statement,
-        await firefly_client.get_currencies(),
+    if session_id is not None:
+        if (session := await statement_sessions.get(session_id)) is None:
+            raise HTTPException(status_code=404, detail="Statement session not found")
+        if session.account_id != account_id:
+            raise HTTPException(
+                status_code=400, detail="Statement session is for another account"
+            )
+        batch = session.statement
+    elif statement is not None:
+        batch = StatementBatch.from_models(statement)
+    else:
+        raise HTTPException(
+            status_code=400, detail="Either statement or session_id is required"
+        )
+    start_date, end_date = statement_date_range(batch)
+    result, states = merge_transactions(
+        await get_account_transactions(
+            account_id, firefly_client, start_date, end_date
+        ),
+        batch,
+        await currencies_future,
         account_id,
     )
+    await update_watermark(firefly_client, account_id, batch, states, watermark_future)
+    return json_response(DISPLAY_TRANSACTIONS, result)
 
 
 @router.put("/")
@@ -45,9 +82,10 @@ async def store_transaction(
     account_id: Annotated[int, Query(...)],
     transaction: Annotated[DisplayTransaction, Body(...)],
     firefly_client: FireflyClientDep,
+    account_future: AccountFuture,
 ) -> TransactionUpdateResponse:
     """Store a transaction"""
-    account = await firefly_client.get_account(account_id)
+    account = await account_future
     assert account.currency_id is not None
 
     # Determine transaction type and IDs
@@ -126,14 +164,14 @@ async def store_transaction(
         account=None,
     )
 
+    # Firefly III creates accounts given by name only
     new_acc_id = None
-    if new_transaction.source_id is None:
+    if source_id is None:
         new_acc_id = new_transaction.source_id
-    if new_transaction.destination_id is None:
+    if destination_id is None:
         new_acc_id = new_transaction.destination_id
     if new_acc_id is not None:
         response.account = await firefly_client.get_account(new_acc_id)
-        firefly_client.clear_accounts_cache()
 
     return response
 
@@ -145,7 +183,7 @@ async def search_descriptions(
     firefly_client: FireflyClientDep,
 ) -> list[TransactionCandidate]:
     """Search for transaction descriptions"""
-    app_transactions = await _get_transactions(account_id, firefly_client)
+    app_transactions = await get_account_transactions(account_id, firefly_client)
     candidates = deduplicate_candidates(
         (tr.as_candidate(account_id) for tr in app_transactions), ignore_notes=True
     )
@@ -153,19 +191,54 @@ async def search_descriptions(
     return best_candidates(candidates, query, lambda tr: tr.description, score_cutoff=0)
 
 
+def statement_date_range(statement: StatementBatch) -> tuple[date, date]:
+    """Dates of the Firefly III transactions to merge the statement with"""
+    dates = [statement.date(idx).date() for idx in range(len(statement))]
+    return (
+        min(dates, default=date.today()) - timedelta(days=365),
+        max(dates, default=date.today()) + timedelta(days=1),
+    )
+
+
+async def update_watermark(
+    firefly_client: FireflyClient,
+    account_id: int,
+    statement: StatementBatch,
+    states: list[TransactionState],
+    watermark: Optional[Awaitable[Optional[StatementWatermark]]] = None,
+) -> None:
+    """
+    Advance the account watermark past the matched statement rows.
+
+    `watermark` is the pending fetch of the current watermark, if already
+    started.
+    """
+    try:
+        if watermark is None:
+            watermark = firefly_client.get_account_watermark(account_id)
+        if new_watermark := advance_watermark(await watermark, statement, states):
+            await firefly_client.update_account_watermark(account_id, new_watermark)
+    except Exception:
+        # The watermark only saves work on the next import
+        logger.warning("Failed to update statement watermark", exc_info=True)
+
+
 @async_collect
-async def _get_transactions(
+async def get_account_transactions(
     account_id: int,
     firefly_client: FireflyClient,
     start_date: Optional[date] = None,
     end_date: Optional[date] = None,
+    progress: Optional[ProgressCallback] = None,
 ) -> AsyncIterable[Transaction]:
     """Get transactions from Firefly III for the given account and date range"""
     if start_date is None:
         start_date = date.today() - timedelta(days=365)
     if end_date is None:
         end_date = date.today() + timedelta(days=1)
-    for tr in await firefly_client.get_transactions(account_id, start_date, end_date):
+    for tr in await firefly_client.get_transactions(
+        account_id, start_date, end_date, progress
+    ):
         if (
             tr.type is TransactionType.Transfer
             and tr.destination_id == account_id
@@ -0,0 +1,113 @@
+"""Cache of Firefly III data, per process or shared by web workers."""
+
+import logging
+import os
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from collections.abc import Iterator
+from contextlib import contextmanager
+from math import ceil
+from time import monotonic
+from typing import TYPE_CHECKING, NamedTuple, Optional
+
+if TYPE_CHECKING:
+    # Imported only where REDIS_URL is set
+    from redis.asyncio import Redis
+
+logger = logging.getLogger("uvicorn.error")
+
+# Seconds Firefly III accounts, currencies and settings are cached for; 0 disables.
+CACHE_TTL = float(os.getenv("CACHE_TTL", "300"))
+# Entries kept by the in-memory cache.
+MEMORY_CACHE_SIZE = 1024
+REDIS_KEY_PREFIX = "firemerge:cache:"
+
+
+class Cache(ABC):
+    """Serialized values by key, each expiring after its own TTL"""
+
+    @abstractmethod
+    async def get(self, key: str) -> Optional[bytes]: ...
+
+    @abstractmethod
+    async def set(self, key: str, value: bytes, ttl: float) -> None: ...
+
+    @abstractmethod
+    async def delete(self, *keys: str) -> None: ...
+
+
+class _MemoryEntry(NamedTuple):
+    expires_at: float
+    value: bytes
+
+
+class MemoryCache(Cache):
+    """Cache of this process only, least recently used entries are evicted"""
+
+    def __init__(self, max_size: int = MEMORY_CACHE_SIZE):
+        self.max_size = max_size
+        self._entries: OrderedDict[str, _MemoryEntry] = OrderedDict()
+
+    async def get(self, key: str) -> Optional[bytes]:
+        if (entry := self._entries.get(key)) is None:
+            return None
+        if entry.expires_at <= monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry.value
+
+    async def set(self, key: str, value: bytes, ttl: float) -> None:
+        if ttl <= 0:
+            return
+        self._entries[key] = _MemoryEntry(monotonic() + ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    async def delete(self, *keys: str) -> None:
+        for key in keys:
+            self._entries.pop(key, None)
+
+
+class RedisCache(Cache):
+    """
+    Cache shared by all web workers using the same Redis server.
+
+    Redis errors are logged and treated as cache misses, so requests still
+    go to Firefly III while Redis is unavailable.
+    """
+
+    def __init__(self, redis: "Redis"):
+        self._redis = redis
+
+    async def get(self, key: str) -> Optional[bytes]:
+        with _logged_errors("get", key):
+            return await self._redis.get(REDIS_KEY_PREFIX + key)
+        return None
+
+    async def set(self, key: str, value: bytes, ttl: float) -> None:
+        if ttl <= 0:
+            return
+        with _logged_errors("set", key):
+            await self._redis.set(REDIS_KEY_PREFIX + key, value, ex=ceil(ttl))
+
+    async def delete(self, *keys: str) -> None:
+        # Not ignoring errors here, stale data must not outlive an update
+        await self._redis.delete(*(REDIS_KEY_PREFIX + key for key in keys))
+
+
+@contextmanager
+def _logged_errors(operation: str, key: str) -> Iterator[None]:
+    from redis.exceptions import RedisError
+
+    try:
+        yield
+    except RedisError:
+        logger.warning("Cache %s of %s failed", operation, key, exc_info=True)
+
+
+def create_cache(redis: Optional["Redis"]) -> Cache:
+    if redis is not None:
+        return RedisCache(redis)
+    return MemoryCache()
@@ -1,24 +1,40 @@
+import asyncio
 import logging
 import os
+from collections.abc import Awaitable, Callable
 from datetime import date
+from hashlib import sha256
 from itertools import count
 from time import monotonic
-from typing import AsyncIterable, Optional, Self
+from typing import AsyncIterable, Optional, Self, TypeVar
 from uuid import uuid4
 
 from httpx import AsyncClient, HTTPStatusError, Response
-from pydantic import BaseModel, ValidationError
+from pydantic import BaseModel, TypeAdapter, ValidationError
 
+from firemerge.cache import CACHE_TTL, Cache, MemoryCache
 from firemerge.model.account_settings import AccountSettings
-from firemerge.model.common import Account, Category, Currency
+from firemerge.model.api import StatementWatermark
+from firemerge.model.common import Account, AccountType, Category, Currency
 from firemerge.model.firefly import Transaction, TransactionState
-from firemerge.util import async_collect
+from firemerge.util import ProgressCallback, async_collect
 
 logger = logging.getLogger("uvicorn.error")
 
 TIMEOUT = 300
 MAX_ACCOUNTS = 10000
 SETTINGS_ATTACHMENT_NAME = "firemerge-settings.json"
+WATERMARK_ATTACHMENT_NAME = "firemerge-watermark.json"
+# Account settings downloaded at once when the cache is refreshed.
+REFRESH_CONCURRENCY = 8
+
+T = TypeVar("T")
+
+_ACCOUNT = TypeAdapter(Account)
+_ACCOUNTS = TypeAdapter(list[Account])
+_ACCOUNT_SETTINGS = TypeAdapter(Optional[AccountSettings])
+_CATEGORIES = TypeAdapter(list[Category])
+_CURRENCIES = TypeAdapter(list[Currency])
 
 
 class Attachment(BaseModel):
@@ -28,14 +44,33 @@ class Attachment(BaseModel):
 
 
 class FireflyClient:
-    def __init__(self, http_client: AsyncClient, base_url: str, token: str):
+    """
+    Firefly III API client.
+
+    Accounts, currencies, categories and account settings are kept in
+    `cache` for `CACHE_TTL` seconds; updates made through the client
+    invalidate them.
+    """
+
+    def __init__(
+        self,
+        http_client: AsyncClient,
+        base_url: str,
+        token: str,
+        cache: Optional[Cache] = None,
+    ):
         self.base_url = base_url.rstrip("/")
         self.token = token
         self._client = http_client
+        self._cache = cache or MemoryCache()
+        # Entries of other instances or tokens may be in the same cache
+        self._cache_prefix = (
+            sha256(f"{self.base_url} {token}".encode()).hexdigest()[:16] + ":"
+        )
         self.account_type_map: dict[str, Optional[str]] = {}
 
     @classmethod
-    def from_env(cls, http_client: AsyncClient) -> Self:
+    def from_env(cls, http_client: AsyncClient, cache: Optional[Cache] = None) -> Self:
         base_url = os.getenv("FIREFLY_BASE_URL")
         token = os.getenv("FIREFLY_TOKEN")
         if not base_url or not token:
@@ -43,7 +78,65 @@ class FireflyClient:
                 "FIREFLY_BASE_URL and FIREFLY_TOKEN must "
                 "be set in environment or .env file"
             )
-        return cls(http_client, base_url, token)
+        return cls(http_client, base_url, token, cache)
+
+    async def _cached(
+        self, key: str, adapter: TypeAdapter[T], fetch: Callable[[], Awaitable[T]]
+    ) -> T:
+        if (data := await self._cache.get(self._cache_prefix + key)) is not None:
+            return adapter.validate_json(data)
+        return await self._refresh(key, adapter, fetch)
+
+    async def _refresh(
+        self, key: str, adapter: TypeAdapter[T], fetch: Callable[[], Awaitable[T]]
+    ) -> T:
+        value = await fetch()
+        await self._cache.set(
+            self._cache_prefix + key, adapter.dump_json(value), CACHE_TTL
+        )
+        return value
+
+    async def _invalidate(self, *keys: str) -> None:
+        await self._cache.delete(*(self._cache_prefix + key for key in keys))
+
+    async def refresh_cache(self) -> None:
+        """
+        Fetch everything cached again, whether expired or not.
+
+        Accounts, currencies and categories are fetched concurrently, then
+        the settings of all asset accounts. The accounts of the list are
+        cached one by one as well.
+        """
+        accounts, _, _ = await asyncio.gather(
+            self._refresh("accounts", _ACCOUNTS, self._fetch_accounts),
+            self._refresh("currencies", _CURRENCIES, self._fetch_currencies),
+            self._refresh("categories", _CATEGORIES, self._fetch_categories),
+        )
+        slots = asyncio.Semaphore(REFRESH_CONCURRENCY)
+
+        async def refresh_settings(account_id: int) -> None:
+            async with slots:
+                await self._refresh(
+                    f"settings:{account_id}",
+                    _ACCOUNT_SETTINGS,
+                    lambda: self._fetch_account_settings(account_id),
+                )
+
+        await asyncio.gather(
+            *(
+                self._cache.set(
+                    f"{self._cache_prefix}account:{acc.id}",
+                    _ACCOUNT.dump_json(acc),
+                    CACHE_TTL,
+                )
+                for acc in accounts
+            ),
+            *(
+                refresh_settings(acc.id)
+                for acc in accounts
+                if acc.type is AccountType.Asset
+            ),
+        )
 
     async def _request(
         self,
@@ -92,12 +185,17 @@ class FireflyClient:
         return data
 
     async def _paging_get(
-        self, path: str, params: Optional[dict] = None
+        self,
+        path: str,
+        params: Optional[dict] = None,
+        progress: Optional[ProgressCallback] = None,
     ) -> AsyncIterable[dict]:
         params = params or {}
         page = 1
         for page in count(1):
             resp = await self._json_request(path, {**params, "page": page})
+            if progress is not None:
+                progress("firefly_pages", page)
             for row in resp["data"]:
                 yield row
             if resp["meta"]["pagination"]["total_pages"] <= page:
@@ -105,8 +203,25 @@ class FireflyClient:
 
     @async_collect
     async def get_transactions(
-        self, account_id: int, start: date, end: date
+        self,
+        account_id: int,
+        start: date,
+        end: date,
+        progress: Optional[ProgressCallback] = None,
     ) -> AsyncIterable[Transaction]:
+        async for transaction in self.iter_transactions(
+            account_id, start, end, progress
+        ):
+            yield transaction
+
+    async def iter_transactions(
+        self,
+        account_id: int,
+        start: date,
+        end: date,
+        progress: Optional[ProgressCallback] = None,
+    ) -> AsyncIterable[Transaction]:
+        """Transactions of the account, fetched page by page as consumed"""
         async for row in self._paging_get(
             f"v1/accounts/{account_id}/transactions",
             {
@@ -114,6 +229,7 @@ class FireflyClient:
                 "end": end.strftime("%Y-%m-%d"),
                 "limit": 2000,
             },
+            progress,
         ):
             for trans in row["attributes"]["transactions"]:
                 yield Transaction.model_validate(
@@ -141,16 +257,30 @@ class FireflyClient:
         resp_transactions = resp["data"]["attributes"]["transactions"]
         if len(resp_transactions) != 1:
             raise RuntimeError(f"{len(resp_transactions)} transactions returned")
-        return Transaction.model_validate(
+        stored = Transaction.model_validate(
             {
                 **resp_transactions[0],
                 "id": resp["data"]["id"],
                 "state": TransactionState.Matched.value,
             }
         )
+        # Balances of both accounts changed, and Firefly III may have created
+        # the counterpart account
+        await self._invalidate(
+            "accounts",
+            *(
+                f"account:{acc_id}"
+                for acc_id in (stored.source_id, stored.destination_id)
+                if acc_id is not None
+            ),
+        )
+        return stored
+
+    async def get_accounts(self) -> list[Account]:
+        return await self._cached("accounts", _ACCOUNTS, self._fetch_accounts)
 
     @async_collect
-    async def get_accounts(self) -> AsyncIterable[Account]:
+    async def _fetch_accounts(self) -> AsyncIterable[Account]:
         response = await self._json_request("v1/accounts", {"limit": MAX_ACCOUNTS})
         accounts = response["data"]
         for account_info in accounts:
@@ -176,6 +306,13 @@ class FireflyClient:
             )
 
     async def get_account(self, account_id: int) -> Account:
+        return await self._cached(
+            f"account:{account_id}",
+            _ACCOUNT,
+            lambda: self._fetch_account(account_id),
+        )
+
+    async def _fetch_account(self, account_id: int) -> Account:
         resp = await self._json_request(f"v1/accounts/{account_id}")
         return Account.model_validate(
             {**resp["data"]["attributes"], "id": resp["data"]["id"]}
@@ -215,39 +352,97 @@ class FireflyClient:
         data = resp["data"]
         return Attachment.model_validate({**data["attributes"], "id": data["id"]})
 
-    async def get_account_settings_attachment(
-        self, account_id: int
+    async def get_account_attachment(
+        self, account_id: int, filename: str
     ) -> Optional[Attachment]:
         async for att in self.get_account_attachments(account_id):
-            if att.filename == SETTINGS_ATTACHMENT_NAME:
+            if att.filename == filename:
                 return att
         return None
 
+    async def get_account_settings_attachment(
+        self, account_id: int
+    ) -> Optional[Attachment]:
+        return await self.get_account_attachment(account_id, SETTINGS_ATTACHMENT_NAME)
+
     async def get_account_settings(self, account_id: int) -> Optional[AccountSettings]:
-        settings_attachment = await self.get_account_settings_attachment(account_id)
-        if settings_attachment is None:
+        return await self._cached(
+            f"settings:{account_id}",
+            _ACCOUNT_SETTINGS,
+            lambda: self._fetch_account_settings(account_id),
+        )
+
+    async def _fetch_account_settings(
+        self, account_id: int
+    ) -> Optional[AccountSettings]:
+        content = await self._download_account_file(
+            account_id, SETTINGS_ATTACHMENT_NAME
+        )
+        if content is None:
             return None
-        content = await self.download_attachment(settings_attachment.id)
         return AccountSettings.model_validate_json(content)
 
     async def update_account_settings(
         self, account_id: int, settings: AccountSettings
     ) -> None:
-        settings_attachment = await self.get_account_settings_attachment(account_id)
-        if settings_attachment is None:
-            settings_attachment = await self.create_account_attachment(
-                account_id, SETTINGS_ATTACHMENT_NAME, "Firemerge settings"
-            )
-        await self.upload_attachment(
-            settings_attachment.id, settings.model_dump_json().encode("utf-8")
+        await self._upload_account_file(
+            account_id,
+            SETTINGS_ATTACHMENT_NAME,
+            "Firemerge settings",
+            settings.model_dump_json().encode("utf-8"),
         )
+        await self._invalidate(f"settings:{account_id}")
+
+    async def get_account_watermark(
+        self, account_id: int
+    ) -> Optional[StatementWatermark]:
+        content = await self._download_account_file(
+            account_id, WATERMARK_ATTACHMENT_NAME
+        )
+        if content is None:
+            return None
+        return StatementWatermark.model_validate_json(content)
+
+    async def update_account_watermark(
+        self, account_id: int, watermark: StatementWatermark
+    ) -> None:
+        await self._upload_account_file(
+            account_id,
+            WATERMARK_ATTACHMENT_NAME,
+            "Firemerge statement watermark",
+            watermark.model_dump_json().encode("utf-8"),
+        )
+
+    async def _download_account_file(
+        self, account_id: int, filename: str
+    ) -> Optional[bytes]:
+        attachment = await self.get_account_attachment(account_id, filename)
+        if attachment is None:
+            return None
+        return await self.download_attachment(attachment.id)
+
+    async def _upload_account_file(
+        self, account_id: int, filename: str, title: str, content: bytes
+    ) -> None:
+        attachment = await self.get_account_attachment(account_id, filename)
+        if attachment is None:
+            attachment = await self.create_account_attachment(
+                account_id, filename, title
+            )
+        await self.upload_attachment(attachment.id, content)
+
+    async def get_categories(self) -> list[Category]:
+        return await self._cached("categories", _CATEGORIES, self._fetch_categories)
 
     @async_collect
-    async def get_categories(self) -> AsyncIterable[Category]:
+    async def _fetch_categories(self) -> AsyncIterable[Category]:
         async for row in self._paging_get("v1/categories"):
             yield Category(id=row["id"], name=row["attributes"]["name"])
 
+    async def get_currencies(self) -> list[Currency]:
+        return await self._cached("currencies", _CURRENCIES, self._fetch_currencies)
+
     @async_collect
-    async def get_currencies(self) -> AsyncIterable[Currency]:
+    async def _fetch_currencies(self) -> AsyncIterable[Currency]:
         async for row in self._paging_get("v1/currencies"):
             yield Currency.model_validate({**row["attributes"], "id": row["id"]})
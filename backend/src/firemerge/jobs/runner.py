@@ -0,0 +1,211 @@
+"""Background jobs for operations too slow for a single request."""
+
+import asyncio
+import logging
+import os
+import secrets
+import threading
+from collections.abc import Awaitable, Callable
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from itertools import count
+from multiprocessing import get_context
+from multiprocessing.managers import SyncManager
+from queue import Queue
+from typing import Any, AsyncIterator, NamedTuple, Optional
+
+from fastapi import HTTPException
+
+from firemerge.jobs.store import JobStore
+from firemerge.model.api import JobInfo, JobStatus
+from firemerge.util import ProgressCallback
+
+logger = logging.getLogger("uvicorn.error")
+
+# Jobs running at once; the rest wait for a free slot.
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+# Jobs running or waiting before new ones are refused.
+JOB_QUEUE_DEPTH = int(os.getenv("JOB_QUEUE_DEPTH", "32"))
+# Seconds between saves of the progress of a running job.
+PROGRESS_INTERVAL = 0.5
+
+
+class JobQueueFullError(RuntimeError):
+    pass
+
+
+class JobResult(NamedTuple):
+    content: bytes
+    media_type: str
+    filename: Optional[str] = None
+
+
+# Job body, called with the callback to report its progress to.
+JobFunction = Callable[[ProgressCallback], Awaitable[JobResult]]
+
+
+class _QueueProgress:
+    """Progress callback which can be passed to worker processes"""
+
+    def __init__(self, queue: "Queue[Optional[tuple[int, str, int]]]", key: int):
+        self.queue = queue
+        self.key = key
+
+    def __call__(self, name: str, value: int) -> None:
+        self.queue.put((self.key, name, value))
+
+
+class ProcessProgress:
+    """
+    Relays progress reported in worker processes to callbacks of this one.
+
+    Worker processes report to a queue of a multiprocessing manager, which
+    is started with the first job needing it.
+    """
+
+    def __init__(self) -> None:
+        self._manager: Optional[SyncManager] = None
+        self._queue: Optional[Queue[Optional[tuple[int, str, int]]]] = None
+        self._thread: Optional[threading.Thread] = None
+        self._lock = asyncio.Lock()
+        self._keys = count()
+        self._callbacks: dict[int, ProgressCallback] = {}
+
+    @asynccontextmanager
+    async def forward(
+        self, progress: ProgressCallback
+    ) -> AsyncIterator[ProgressCallback]:
+        """Callback for worker processes reporting to `progress`"""
+        async with self._lock:
+            if self._queue is None:
+                await asyncio.to_thread(self._start)
+        assert self._queue is not None
+        key = next(self._keys)
+        self._callbacks[key] = progress
+        try:
+            yield _QueueProgress(self._queue, key)
+        finally:
+            del self._callbacks[key]
+
+    def close(self) -> None:
+        if self._manager is None:
+            return
+        assert self._queue is not None and self._thread is not None
+        self._queue.put(None)
+        self._thread.join()
+        self._manager.shutdown()
+        self._manager = self._queue = self._thread = None
+
+    def _start(self) -> None:
+        self._manager = get_context("spawn").Manager()
+        self._queue = self._manager.Queue()
+        self._thread = threading.Thread(
+            target=self._relay, args=(self._queue,), daemon=True
+        )
+        self._thread.start()
+
+    def _relay(self, queue: "Queue[Optional[tuple[int, str, int]]]") -> None:
+        while (item := queue.get()) is not None:
+            key, name, value = item
+            if (callback := self._callbacks.get(key)) is not None:
+                callback(name, value)
+
+
+class JobManager:
+    """
+    Runs jobs in the background, at most `workers` of them at once.
+
+    Job state is kept in `store`, which may be shared by several web
+    workers. Jobs run in the worker they were submitted to, so only that
+    worker can cancel them.
+    """
+
+    def __init__(
+        self,
+        store: JobStore,
+        workers: int = JOB_WORKERS,
+        max_pending: int = JOB_QUEUE_DEPTH,
+    ):
+        self.store = store
+        self.process_progress = ProcessProgress()
+        self._slots = asyncio.Semaphore(workers)
+        self._max_pending = max_pending
+        self._tasks: dict[str, asyncio.Task[None]] = {}
+
+    async def submit(self, kind: str, fn: JobFunction) -> JobInfo:
+        if len(self._tasks) >= self._max_pending:
+            raise JobQueueFullError("Too many jobs are queued")
+        job = JobInfo(
+            id=secrets.token_urlsafe(16),
+            kind=kind,
+            status=JobStatus.Pending,
+            created_at=datetime.now(timezone.utc),
+        )
+        await self.store.save(job)
+        task = asyncio.create_task(self._run(job, fn))
+        self._tasks[job.id] = task
+        task.add_done_callback(lambda _: self._tasks.pop(job.id, None))
+        return job
+
+    async def cancel(self, job_id: str) -> bool:
+        """Cancel a job of this worker, returns False if there is none"""
+        if (task := self._tasks.get(job_id)) is None:
+            return False
+        task.cancel()
+        # The cancelled state is saved by the job itself
+        await asyncio.wait({task})
+        return True
+
+    async def close(self) -> None:
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await asyncio.to_thread(self.process_progress.close)
+
+    async def _run(self, job: JobInfo, fn: JobFunction) -> None:
+        # Assigned from any thread, saved periodically by the reporter
+        counters: dict[str, int] = {}
+        reporter: Optional[asyncio.Task[None]] = None
+        update: dict[str, Any]
+        try:
+            async with self._slots:
+                job = job.model_copy(update={"status": JobStatus.Running})
+                await self.store.save(job)
+                reporter = asyncio.create_task(self._report(job, counters))
+                result = await fn(counters.__setitem__)
+                await self.store.set_result(job.id, result.content)
+            update = {
+                "status": JobStatus.Done,
+                "media_type": result.media_type,
+                "filename": result.filename,
+            }
+        except asyncio.CancelledError:
+            update = {"status": JobStatus.Cancelled}
+        except Exception as e:
+            logger.warning("Job %s failed", job.id, exc_info=True)
+            update = {
+                "status": JobStatus.Failed,
+                "error": str(e.detail) if isinstance(e, HTTPException) else str(e),
+            }
+        finally:
+            if reporter is not None:
+                reporter.cancel()
+                await asyncio.gather(reporter, return_exceptions=True)
+        await self.store.save(
+            job.model_copy(
+                update={
+                    **update,
+                    "progress": dict(counters),
+                    "finished_at": datetime.now(timezone.utc),
+                }
+            )
+        )
+
+    async def _report(self, job: JobInfo, counters: dict[str, int]) -> None:
+        reported: dict[str, int] = {}
+        while True:
+            await asyncio.sleep(PROGRESS_INTERVAL)
+            if counters != reported:
+                reported = dict(counters)
+                await self.store.save(job.model_copy(update={"progress": reported}))
@@ -0,0 +1,205 @@
+"""Storage of background job state and results."""
+
+import asyncio
+import os
+from abc import ABC, abstractmethod
+from collections.abc import Awaitable, Callable
+from contextlib import AbstractAsyncContextManager, asynccontextmanager
+from math import ceil
+from time import monotonic
+from typing import TYPE_CHECKING, AsyncIterator, NamedTuple, Optional
+
+from firemerge.model.api import JobInfo
+
+if TYPE_CHECKING:
+    # Imported only where REDIS_URL is set
+    from redis.asyncio import Redis
+
+# Seconds a finished job and its result are kept.
+JOB_TTL = float(os.getenv("JOB_TTL", "3600"))
+# Seconds an unfinished job is kept, so jobs of a crashed worker expire too.
+JOB_RUNNING_TTL = 24 * 3600.0
+# Seconds without updates before watchers get a heartbeat.
+HEARTBEAT_INTERVAL = 15.0
+REDIS_KEY_PREFIX = "firemerge:job:"
+
+# Waits for the next update of a job for at most the given seconds.
+NextUpdate = Callable[[float], Awaitable[Optional[JobInfo]]]
+
+
+class JobStore(ABC):
+    """
+    Job state and results by job id.
+
+    Finished jobs expire after `ttl` seconds together with their results.
+    """
+
+    def __init__(self, ttl: float = JOB_TTL):
+        self.ttl = ttl
+
+    def _expiry(self, job: JobInfo) -> float:
+        return self.ttl if job.status.finished else JOB_RUNNING_TTL
+
+    @abstractmethod
+    async def save(self, job: JobInfo) -> None:
+        """Store the job and notify its watchers"""
+
+    @abstractmethod
+    async def get(self, job_id: str) -> Optional[JobInfo]: ...
+
+    @abstractmethod
+    async def delete(self, job_id: str) -> bool: ...
+
+    @abstractmethod
+    async def set_result(self, job_id: str, content: bytes) -> None: ...
+
+    @abstractmethod
+    async def get_result(self, job_id: str) -> Optional[bytes]: ...
+
+    @abstractmethod
+    def _listen(self, job_id: str) -> AbstractAsyncContextManager[NextUpdate]: ...
+
+    async def watch(
+        self, job_id: str, heartbeat: float = HEARTBEAT_INTERVAL
+    ) -> AsyncIterator[Optional[JobInfo]]:
+        """
+        The job, then each of its updates until it is finished.
+
+        None is yielded whenever the job doesn't change for `heartbeat`
+        seconds. Ends early if the job is deleted or expires.
+        """
+        async with self._listen(job_id) as next_update:
+            job = await self.get(job_id)
+            while job is not None:
+                yield job
+                if job.status.finished:
+                    return
+                while (update := await next_update(heartbeat)) is None:
+                    if await self.get(job_id) is None:
+                        return
+                    yield None
+                job = update
+
+
+class _MemoryEntry(NamedTuple):
+    expires_at: float
+    job: JobInfo
+    result: Optional[bytes]
+
+
+class MemoryJobStore(JobStore):
+    """Jobs of this process only"""
+
+    def __init__(self, ttl: float = JOB_TTL):
+        super().__init__(ttl)
+        self._entries: dict[str, _MemoryEntry] = {}
+        self._watchers: dict[str, set[asyncio.Queue[JobInfo]]] = {}
+
+    async def save(self, job: JobInfo) -> None:
+        self._expire()
+        entry = self._entries.get(job.id)
+        self._entries[job.id] = _MemoryEntry(
+            monotonic() + self._expiry(job), job, entry.result if entry else None
+        )
+        for queue in self._watchers.get(job.id, ()):
+            queue.put_nowait(job)
+
+    async def get(self, job_id: str) -> Optional[JobInfo]:
+        self._expire()
+        entry = self._entries.get(job_id)
+        return entry.job if entry else None
+
+    async def delete(self, job_id: str) -> bool:
+        return self._entries.pop(job_id, None) is not None
+
+    async def set_result(self, job_id: str, content: bytes) -> None:
+        if (entry := self._entries.get(job_id)) is not None:
+            self._entries[job_id] = entry._replace(result=content)
+
+    async def get_result(self, job_id: str) -> Optional[bytes]:
+        self._expire()
+        entry = self._entries.get(job_id)
+        return entry.result if entry else None
+
+    @asynccontextmanager
+    async def _listen(self, job_id: str) -> AsyncIterator[NextUpdate]:
+        queue: asyncio.Queue[JobInfo] = asyncio.Queue()
+        watchers = self._watchers.setdefault(job_id, set())
+        watchers.add(queue)
+
+        async def next_update(timeout: float) -> Optional[JobInfo]:
+            try:
+                return await asyncio.wait_for(queue.get(), timeout)
+            except TimeoutError:
+                return None
+
+        try:
+            yield next_update
+        finally:
+            watchers.discard(queue)
+            if not watchers and self._watchers.get(job_id) is watchers:
+                del self._watchers[job_id]
+
+    def _expire(self) -> None:
+        now = monotonic()
+        expired = [jid for jid, e in self._entries.items() if e.expires_at <= now]
+        for job_id in expired:
+            del self._entries[job_id]
+
+
+class RedisJobStore(JobStore):
+    """
+    Jobs shared by all web workers using the same Redis server.
+
+    Updates are published to a channel per job, which watchers subscribe to.
+    """
+
+    def __init__(self, redis: "Redis", ttl: float = JOB_TTL):
+        super().__init__(ttl)
+        self._redis = redis
+
+    async def save(self, job: JobInfo) -> None:
+        data = job.model_dump_json()
+        key = REDIS_KEY_PREFIX + job.id
+        ttl = ceil(self._expiry(job))
+        async with self._redis.pipeline(transaction=True) as pipe:
+            pipe.set(key, data, ex=ttl)
+            pipe.expire(key + ":result", ttl)
+            pipe.publish(key + ":events", data)
+            await pipe.execute()
+
+    async def get(self, job_id: str) -> Optional[JobInfo]:
+        data = await self._redis.get(REDIS_KEY_PREFIX + job_id)
+        return None if data is None else JobInfo.model_validate_json(data)
+
+    async def delete(self, job_id: str) -> bool:
+        key = REDIS_KEY_PREFIX + job_id
+        return await self._redis.delete(key, key + ":result") > 0
+
+    async def set_result(self, job_id: str, content: bytes) -> None:
+        key = REDIS_KEY_PREFIX + job_id + ":result"
+        await self._redis.set(key, content, ex=ceil(JOB_RUNNING_TTL))
+
+    async def get_result(self, job_id: str) -> Optional[bytes]:
+        return await self._redis.get(REDIS_KEY_PREFIX + job_id + ":result")
+
+    @asynccontextmanager
+    async def _listen(self, job_id: str) -> AsyncIterator[NextUpdate]:
+        async with self._redis.pubsub() as pubsub:
+            await pubsub.subscribe(REDIS_KEY_PREFIX + job_id + ":events")
+
+            async def next_update(timeout: float) -> Optional[JobInfo]:
+                message = await pubsub.get_message(
+                    ignore_subscribe_messages=True, timeout=timeout
+                )
+                if message is None:
+                    return None
+                return JobInfo.model_validate_json(message["data"])
+
+            yield next_update
+
+
+def create_job_store(redis: Optional["Redis"]) -> JobStore:
+    if redis is not None:
+        return RedisJobStore(redis)
+    return MemoryJobStore()
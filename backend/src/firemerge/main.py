@@ -1,15 +1,16 @@
-import logging
 import os
 import urllib.parse
+from copy import deepcopy
 
-import uvicorn
 from fastapi import APIRouter, FastAPI
-from fastapi.staticfiles import StaticFiles
 
 from firemerge.api.accounts import router as accounts_router
 from firemerge.api.common import router as common_router
-from firemerge.api.deps import lifespan
+from firemerge.api.deps import WEB_WORKERS, lifespan
+from firemerge.api.jobs import router as jobs_router
+from firemerge.api.responses import CompressionMiddleware
 from firemerge.api.statement import router as statement_router
+from firemerge.api.static import StaticAssets
 from firemerge.api.transactions import router as transactions_router
 
 PROJECT_ROOT = os.path.realpath(
@@ -23,21 +24,39 @@ api_router.include_router(accounts_router)
 api_router.include_router(transactions_router)
 api_router.include_router(common_router)
 api_router.include_router(statement_router)
+api_router.include_router(jobs_router)
 
 
 app = FastAPI(title="FireMerge API", version="1.0.0", lifespan=lifespan)
+app.add_middleware(CompressionMiddleware)
 app.include_router(api_router)
-app.mount("/", StaticFiles(directory=FRONTEND_ROOT, html=True), name="frontend")
+app.mount("/", StaticAssets(FRONTEND_ROOT), name="frontend")
 
 
 def serve_web():
-    """Start the web server for hosted FireMerge"""
-    logging.basicConfig()
-    logging.getLogger("firemerge").setLevel(logging.DEBUG)
-    logging.getLogger("pdfminer").setLevel(logging.ERROR)
+    """
+    Start the web server for hosted FireMerge.
+
+    With `WEB_WORKERS` above 1, each worker process imports the app and runs
+    its lifespan on its own, so logging is configured by uvicorn in each.
+    """
+    # Not needed by the app itself, e.g. when served by another ASGI server
+    import uvicorn
+    from uvicorn.config import LOGGING_CONFIG
+
     listen_url = urllib.parse.urlparse("//" + os.getenv("LISTEN_URL", "0.0.0.0:8080"))
     assert listen_url.hostname and listen_url.port
 
+    log_config = deepcopy(LOGGING_CONFIG)
+    log_config["root"] = {"handlers": ["default"], "level": "WARNING"}
+    log_config["loggers"]["firemerge"] = {"level": "DEBUG"}
+    log_config["loggers"]["pdfminer"] = {"level": "ERROR"}
+
     uvicorn.run(
-        app, host=listen_url.hostname, port=int(listen_url.port), log_level="info"
+        "firemerge.main:app",
+        host=listen_url.hostname,
+        port=int(listen_url.port),
+        workers=WEB_WORKERS,
+        log_level="info",
+        log_config=log_config,
     )
@@ -1,21 +1,23 @@
-from datetime import timedelta
-from hashlib import md5
+from datetime import datetime, timedelta
+from decimal import Decimal
 from typing import Callable, Iterable, Optional, Tuple, TypeVar
 
-from thefuzz.process import extractBests
-
 from .model.api import (
     DisplayTransaction,
     DisplayTransactionType,
-    StatementTransaction,
+    StatementWatermark,
     TransactionCandidate,
     TransactionState,
 )
 from .model.common import Currency
 from .model.firefly import Transaction
+from .statement.batch import StatementBatch
+from .util import ProgressCallback
 
 MAX_CANDIDATES = 10
 SCORE_CUTOFF = 93
+# Statement rows merged between progress reports.
+PROGRESS_ROWS = 100
 
 TMatch = TypeVar("TMatch", bound=Transaction | TransactionCandidate)
 
@@ -27,6 +29,9 @@ def best_matches(
     limit: int = MAX_CANDIDATES,
     score_cutoff: int = SCORE_CUTOFF,
 ) -> list[Tuple[TMatch, float]]:
+    # Imported on first use, it is only needed for unmatched statement rows
+    from thefuzz.process import extractBests
+
     if query is None:
         return []
     data = {
@@ -75,27 +80,37 @@ def best_candidates(
 
 
 def match_single_transaction(
-    tranactions: list[Transaction], st: StatementTransaction
+    tranactions: list[Transaction],
+    amount: Decimal,
+    date: datetime,
+    notes: Optional[str],
 ) -> Optional[Transaction]:
     candidates = [
         tr
         for tr in tranactions
-        if abs(tr.amount) == abs(st.amount)
-        and abs(tr.date - st.date) < timedelta(days=1)
+        if abs(tr.amount) == abs(amount) and abs(tr.date - date) < timedelta(days=1)
     ]
     if not candidates:
         return None
-    if res := best_matches(candidates, st.notes, lambda tr: tr.notes, limit=1):
+    if res := best_matches(candidates, notes, lambda tr: tr.notes, limit=1):
         return res[0][0]
     return candidates[0]
 
 
 def merge_transactions(
     transactions: list[Transaction],
-    statement: list[StatementTransaction],
+    statement: StatementBatch,
     currencies: list[Currency],
     current_account_id: int,
-) -> list[DisplayTransaction]:
+    progress: Optional[ProgressCallback] = None,
+) -> tuple[list[DisplayTransaction], list[TransactionState]]:
+    """
+    Merge statement rows with Firefly III transactions.
+
+    Returns the transactions to display and the state of each statement row.
+    Unmatched rows are scored against the candidates, which is reported to
+    `progress` as `candidates_scored`.
+    """
     candidates = deduplicate_candidates(
         tr.as_candidate(current_account_id) for tr in transactions
     )
@@ -103,50 +118,119 @@ def merge_transactions(
     transactions.sort(key=lambda tr: tr.date, reverse=True)
     transactions_to_match = transactions[:]
     result: list[DisplayTransaction] = []
-    for idx, st in enumerate(statement):
-        if (tr := match_single_transaction(transactions_to_match, st)) is not None:
+    for idx in range(len(statement)):
+        if progress is not None and idx % PROGRESS_ROWS == 0:
+            progress("candidates_scored", idx)
+        amount = statement.amount(idx)
+        date = statement.date(idx)
+        notes = statement.notes[idx]
+        if (
+            tr := match_single_transaction(transactions_to_match, amount, date, notes)
+        ) is not None:
             transactions_to_match.remove(tr)
             result.append(
                 tr.as_display_transaction(current_account_id).model_copy(
                     update={
                         "state": TransactionState.Matched
-                        if tr.notes == st.notes
+                        if tr.notes == notes
                         else TransactionState.Annotated,
-                        "notes": st.notes,
+                        "notes": notes,
                     }
                 )
             )
         else:
-            fake_id = f"fake:{idx}:{md5(st.model_dump_json().encode()).hexdigest()}"
+            fake_id = f"fake:{idx}:{statement.row_hash(idx)}"
+            foreign_amount = statement.foreign_amount(idx)
+            foreign_currency_code = statement.foreign_currency_codes[idx]
             result.append(
                 DisplayTransaction.model_validate(
                     {
                         "id": fake_id,
                         "type": DisplayTransactionType.Withdrawal
-                        if st.amount < 0
+                        if amount < 0
                         else DisplayTransactionType.Deposit,
                         "state": TransactionState.New,
-                        "description": st.name,
-                        "date": st.date,
-                        "amount": abs(st.amount),
-                        "foreign_amount": abs(st.foreign_amount)
-                        if st.foreign_amount
+                        "description": statement.names[idx],
+                        "date": date,
+                        "amount": abs(amount),
+                        "foreign_amount": abs(foreign_amount)
+                        if foreign_amount
                         else None,
-                        "foreign_currency_id": currency_map[st.foreign_currency_code].id
-                        if st.foreign_currency_code
+                        "foreign_currency_id": currency_map[foreign_currency_code].id
+                        if foreign_currency_code
                         else None,
-                        "notes": st.notes,
+                        "notes": notes,
                         "candidates": best_candidates(
-                            candidates, st.notes, lambda tr: tr.notes
+                            candidates, notes, lambda tr: tr.notes
                         ),
                     }
                 )
             )
-
-    min_date = min(st.date for st in statement) - timedelta(days=1)
-    for tr in transactions_to_match:
-        if tr.date >= min_date:
-            result.append(tr.as_display_transaction(current_account_id))
+    if progress is not None:
+        progress("candidates_scored", len(statement))
+    states = [tr.state for tr in result]
+
+    if statement:
+        min_date = statement.date(
+            min(range(len(statement)), key=statement.dates.__getitem__)
+        ) - timedelta(days=1)
+        for tr in transactions_to_match:
+            if tr.date >= min_date:
+                result.append(tr.as_display_transaction(current_account_id))
 
     result.sort(key=lambda tr: tr.date, reverse=True)
-    return result
+    return result, states
+
+
+def advance_watermark(
+    watermark: Optional[StatementWatermark],
+    statement: StatementBatch,
+    states: list[TransactionState],
+) -> Optional[StatementWatermark]:
+    """
+    Move the watermark past the statement rows that are fully matched.
+
+    Returns None if the watermark doesn't move.
+    """
+    rows = sorted(
+        ((statement.date(idx), idx, state) for idx, state in enumerate(states)),
+        key=lambda x: x[0],
+    )
+    first_unmatched = next(
+        (date for date, _, state in rows if state is not TransactionState.Matched),
+        None,
+    )
+    # rows sharing a date with an unmatched one are not processed either
+    matched_date = max(
+        (
+            date
+            for date, _, _ in rows
+            if first_unmatched is None or date < first_unmatched
+        ),
+        default=None,
+    )
+    if matched_date is None or (watermark and matched_date <= watermark.date):
+        return None
+
+    new_watermark = StatementWatermark(date=matched_date)
+    new_watermark.row_hashes = [
+        statement.row_hash(idx)
+        for date, idx, _ in rows
+        if matched_date - new_watermark.overlap < date <= matched_date
+    ]
+    return new_watermark
+
+
+def skip_processed(
+    statement: StatementBatch, watermark: Optional[StatementWatermark]
+) -> StatementBatch:
+    """Drop the statement rows the watermark says were already merged."""
+    if watermark is None:
+        return statement
+    return statement.take(
+        idx
+        for idx in range(len(statement))
+        if not watermark.is_processed_row(
+            statement.date(idx), lambda: statement.row_hash(idx)
+        )
+    )
@@ -2,6 +2,7 @@
 
 from collections import Counter
 from enum import Enum
+from functools import cached_property
 from typing import Annotated, Any, Literal, Self
 
 from pydantic import BaseModel, Field, model_validator
@@ -83,6 +84,15 @@ class GuessedStatementParserSettings(BaseModel):
 
 
 class StatementParserSettings(GuessedStatementParserSettings):
+    @cached_property
+    def header(self) -> list[str]:
+        """Header row the statement is expected to have."""
+        return [column.name for column in self.columns]
+
+    @cached_property
+    def role_columns(self) -> dict[ColumnRole, ColumnInfo]:
+        return {column.role: column for column in self.columns if column.role}
+
     @model_validator(mode="after")
     def validate_columns(self) -> Self:
         role_counts = Counter(
@@ -182,3 +192,12 @@ class AccountSettings(BaseModel):
 
 class RepoStatementParserSettings(StatementParserSettings):
     label: str
+
+
+class StatementParserSettingsMatch(BaseModel):
+    """Parser settings ranked by how well they match an uploaded statement."""
+
+    label: str
+    account_id: int | None = None  # Set for settings stored on an account.
+    score: float  # 1.0 for an exact header match.
+    parser_settings: StatementParserSettings
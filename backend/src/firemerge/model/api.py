@@ -1,12 +1,13 @@
 """API models."""
 
-from datetime import datetime
+from datetime import datetime, timedelta
 from enum import Enum
-from typing import Optional
+from hashlib import md5
+from typing import Callable, Optional
 
-from pydantic import BaseModel, ConfigDict
+from pydantic import BaseModel, ConfigDict, TypeAdapter
 
-from .common import Account, Money
+from .common import Account, RoundedMoney
 
 
 class TransactionState(Enum):
@@ -40,8 +41,8 @@ class DisplayTransaction(BaseModel):
     state: TransactionState
     description: str
     date: datetime
-    amount: Money
-    foreign_amount: Optional[Money]
+    amount: RoundedMoney
+    foreign_amount: Optional[RoundedMoney]
     foreign_currency_id: Optional[int]
     account_id: Optional[int] = None
     account_name: Optional[str] = None  # for input only
@@ -55,15 +56,88 @@ class StatementTransaction(BaseModel):
 
     name: str
     date: datetime
-    amount: Money
-    foreign_amount: Optional[Money]
+    amount: RoundedMoney
+    foreign_amount: Optional[RoundedMoney]
     foreign_currency_code: Optional[str]
     notes: Optional[str] = None
     fee: Optional[str] = None
 
+    def row_hash(self) -> str:
+        return md5(self.model_dump_json().encode()).hexdigest()
+
+
+class StatementWatermark(BaseModel):
+    """
+    How far an account's statements have already been merged.
+
+    All statement rows up to `date` were matched to Firefly III transactions.
+    Rows in the `overlap` before it are only considered processed if their
+    hash is known, so transactions posted late by the bank are not lost.
+    """
+
+    date: datetime
+    overlap: timedelta = timedelta(days=3)
+    row_hashes: list[str] = []
+
+    def is_processed(self, transaction: StatementTransaction) -> bool:
+        return self.is_processed_row(transaction.date, transaction.row_hash)
+
+    def is_processed_row(self, date: datetime, row_hash: Callable[[], str]) -> bool:
+        """Same as `is_processed`, hashing the row only if needed."""
+        if date <= self.date - self.overlap:
+            return True
+        if date <= self.date:
+            return row_hash() in self.row_hashes
+        return False
+
+
+class StatementParseResult(BaseModel):
+    """Result of parsing one statement of a batch."""
+
+    filename: Optional[str]
+    account_id: int
+    transactions: list[StatementTransaction] = []
+    error: Optional[str] = None
+
 
 class TransactionUpdateResponse(BaseModel):
     """Response from Firefly III when updating a transaction."""
 
     transaction: DisplayTransaction
     account: Optional[Account]
+
+
+class JobStatus(Enum):
+    Pending = "pending"
+    Running = "running"
+    Done = "done"
+    Failed = "failed"
+    Cancelled = "cancelled"
+
+    @property
+    def finished(self) -> bool:
+        return self in (JobStatus.Done, JobStatus.Failed, JobStatus.Cancelled)
+
+
+class JobInfo(BaseModel):
+    """
+    State of a background job.
+
+    `progress` holds counters of the work done so far, e.g. `rows_parsed`.
+    The result of a finished job is served with `media_type` and `filename`.
+    """
+
+    id: str
+    kind: str
+    status: JobStatus
+    progress: dict[str, int] = {}
+    error: Optional[str] = None
+    created_at: datetime
+    finished_at: Optional[datetime] = None
+    media_type: Optional[str] = None
+    filename: Optional[str] = None
+
+
+# Whole lists of models are validated and serialized by these at once.
+DISPLAY_TRANSACTIONS = TypeAdapter(list[DisplayTransaction])
+STATEMENT_PARSE_RESULTS = TypeAdapter(list[StatementParseResult])
@@ -9,17 +9,25 @@ from decimal import Decimal
 from enum import Enum
 from typing import Annotated, Optional
 
-from pydantic import BaseModel, PlainSerializer
+from pydantic import AfterValidator, BaseModel, PlainSerializer
+
+CENT = Decimal("0.01")
 
 Money = Annotated[
     Decimal,
     PlainSerializer(
-        lambda x: str(x.quantize(Decimal("0.01"))),
+        lambda x: str(x.quantize(CENT)),
         return_type=str,
         when_used="unless-none",
     ),
 ]
 
+# Amounts of frontend API models are rounded to cents when validated rather
+# than when serialized, so pydantic dumps them natively (as "12.30") instead
+# of calling back into Python for every field. Firefly III amounts keep full
+# precision as `Money`.
+RoundedMoney = Annotated[Decimal, AfterValidator(lambda x: x.quantize(CENT))]
+
 
 class AccountType(Enum):
     Asset = "asset"
@@ -0,0 +1,210 @@
+"""Columnar storage of parsed statement rows."""
+
+from array import array
+from collections.abc import Iterable, Iterator
+from datetime import datetime, timedelta, timezone, tzinfo
+from decimal import Decimal
+from functools import lru_cache
+from hashlib import md5
+from json.encoder import encode_basestring
+from typing import Any
+
+from firemerge.model.api import StatementTransaction
+
+# Foreign amount of rows without one.
+_NO_AMOUNT = -(2**63)
+# UTC offset of naive dates.
+_NAIVE = -(2**31)
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+_NAIVE_EPOCH = datetime(1970, 1, 1)
+_MICROSECOND = timedelta(microseconds=1)
+
+
+class StatementBatch:
+    """
+    Statement transactions stored column by column.
+
+    Dates are kept as epoch microseconds with their UTC offset, amounts as
+    integer cents (rounded the same way `Money` is serialized), and strings
+    repeating across rows (currency codes, notes, fees) are stored once. A
+    parsed statement takes a fraction of the memory of a `StatementTransaction`
+    list, pickles cheaply between processes and is serialized without
+    building models; those are only created where the API needs them.
+    """
+
+    def __init__(self) -> None:
+        self.names: list[str] = []
+        self.dates = array("q")
+        self.offsets = array("l")
+        self.amounts = array("q")
+        self.foreign_amounts = array("q")
+        self.foreign_currency_codes: list[str | None] = []
+        self.notes: list[str | None] = []
+        self.fees: list[str | None] = []
+        self._strings: dict[str, str] = {}
+
+    def append(
+        self,
+        name: str,
+        date: datetime,
+        amount: Decimal | float,
+        foreign_amount: Decimal | float | None = None,
+        foreign_currency_code: str | None = None,
+        notes: str | None = None,
+        fee: str | None = None,
+    ) -> None:
+        if (offset := date.utcoffset()) is None:
+            self.dates.append(
+                (date.replace(tzinfo=timezone.utc) - _EPOCH) // _MICROSECOND
+            )
+            self.offsets.append(_NAIVE)
+        else:
+            self.dates.append((date - _EPOCH) // _MICROSECOND)
+            self.offsets.append(offset // timedelta(seconds=1))
+        self.names.append(name)
+        self.amounts.append(_to_cents(amount))
+        self.foreign_amounts.append(
+            _NO_AMOUNT if foreign_amount is None else _to_cents(foreign_amount)
+        )
+        self.foreign_currency_codes.append(self._intern(foreign_currency_code))
+        self.notes.append(self._intern(notes))
+        self.fees.append(self._intern(fee))
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def __getitem__(self, idx: int) -> StatementTransaction:
+        return StatementTransaction(
+            name=self.names[idx],
+            date=self.date(idx),
+            amount=self.amount(idx),
+            foreign_amount=self.foreign_amount(idx),
+            foreign_currency_code=self.foreign_currency_codes[idx],
+            notes=self.notes[idx],
+            fee=self.fees[idx],
+        )
+
+    def __iter__(self) -> Iterator[StatementTransaction]:
+        return (self[idx] for idx in range(len(self)))
+
+    def __getstate__(self) -> dict[str, Any]:
+        return {**self.__dict__, "_strings": {}}
+
+    def date(self, idx: int) -> datetime:
+        value = _EPOCH + self.dates[idx] * _MICROSECOND
+        if (offset := self.offsets[idx]) == _NAIVE:
+            return value.replace(tzinfo=None)
+        return value.astimezone(_fixed_timezone(offset))
+
+    def amount(self, idx: int) -> Decimal:
+        return Decimal(self.amounts[idx]).scaleb(-2)
+
+    def foreign_amount(self, idx: int) -> Decimal | None:
+        if (value := self.foreign_amounts[idx]) == _NO_AMOUNT:
+            return None
+        return Decimal(value).scaleb(-2)
+
+    def row_json(self, idx: int) -> str:
+        """The row as `StatementTransaction.model_dump_json` renders it."""
+        foreign_amount = self.foreign_amounts[idx]
+        return (
+            f'{{"name":{_json_str(self.names[idx])},'
+            f'"date":"{self._date_json(idx)}",'
+            f'"amount":"{_cents_json(self.amounts[idx])}",'
+            '"foreign_amount":'
+            + (
+                "null"
+                if foreign_amount == _NO_AMOUNT
+                else f'"{_cents_json(foreign_amount)}"'
+            )
+            + f',"foreign_currency_code":{_json_str(self.foreign_currency_codes[idx])}'
+            f',"notes":{_json_str(self.notes[idx])}'
+            f',"fee":{_json_str(self.fees[idx])}}}'
+        )
+
+    def row_hash(self, idx: int) -> str:
+        """Same as `StatementTransaction.row_hash` of the row."""
+        return md5(self.row_json(idx).encode()).hexdigest()
+
+    def dump_json(self) -> bytes:
+        """The batch as JSON list of `StatementTransaction`."""
+        return (
+            "[" + ",".join(self.row_json(idx) for idx in range(len(self))) + "]"
+        ).encode()
+
+    def take(self, indices: Iterable[int]) -> "StatementBatch":
+        """A new batch of the rows at the given indices."""
+        result = StatementBatch()
+        for idx in indices:
+            result.names.append(self.names[idx])
+            result.dates.append(self.dates[idx])
+            result.offsets.append(self.offsets[idx])
+            result.amounts.append(self.amounts[idx])
+            result.foreign_amounts.append(self.foreign_amounts[idx])
+            result.foreign_currency_codes.append(self.foreign_currency_codes[idx])
+            result.notes.append(self.notes[idx])
+            result.fees.append(self.fees[idx])
+        return result
+
+    @classmethod
+    def from_models(
+        cls, transactions: Iterable[StatementTransaction]
+    ) -> "StatementBatch":
+        result = cls()
+        for tr in transactions:
+            result.append(
+                tr.name,
+                tr.date,
+                tr.amount,
+                tr.foreign_amount,
+                tr.foreign_currency_code,
+                tr.notes,
+                tr.fee,
+            )
+        return result
+
+    def to_models(self) -> list[StatementTransaction]:
+        return list(self)
+
+    def _intern(self, value: str | None) -> str | None:
+        if value is None:
+            return None
+        return self._strings.setdefault(value, value)
+
+    def _date_json(self, idx: int) -> str:
+        offset = self.offsets[idx]
+        if offset == _NAIVE:
+            offset = 0
+        local = _NAIVE_EPOCH + (self.dates[idx] + offset * 1_000_000) * _MICROSECOND
+        return local.isoformat() + _offset_json(self.offsets[idx])
+
+
+def _to_cents(value: Decimal | float) -> int:
+    # floats via str, as pydantic converts them to Decimal
+    decimal = Decimal(str(value) if isinstance(value, float) else value)
+    return int(decimal.scaleb(2).to_integral_value())
+
+
+def _cents_json(value: int) -> str:
+    sign = "-" if value < 0 else ""
+    units, cents = divmod(abs(value), 100)
+    return f"{sign}{units}.{cents:02d}"
+
+
+def _json_str(value: str | None) -> str:
+    return "null" if value is None else encode_basestring(value)
+
+
+@lru_cache(maxsize=64)
+def _fixed_timezone(offset: int) -> tzinfo:
+    return timezone(timedelta(seconds=offset))
+
+
+@lru_cache(maxsize=64)
+def _offset_json(offset: int) -> str:
+    if offset == _NAIVE:
+        return ""
+    if offset == 0:
+        # pydantic renders UTC as "Z"
+        return "Z"
+    return datetime(2000, 1, 1, tzinfo=_fixed_timezone(offset)).isoformat()[19:]
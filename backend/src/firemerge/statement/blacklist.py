@@ -0,0 +1,75 @@
+"""Blacklist filtering of statement transactions."""
+
+from collections import deque
+from collections.abc import Iterable
+from functools import lru_cache
+
+
+class BlacklistMatcher:
+    """
+    Aho-Corasick automaton over lowercased blacklist entries.
+
+    `matches` tells whether any entry is a case-insensitive substring of the
+    text in a single pass over it, regardless of the number of entries.
+    """
+
+    def __init__(self, entries: Iterable[str]):
+        self._goto: list[dict[str, int]] = [{}]
+        self._fail: list[int] = [0]
+        self._accept: list[bool] = [False]
+        # An empty entry is a substring of any text
+        self._match_all = False
+
+        for entry in entries:
+            if not (entry := entry.lower()):
+                self._match_all = True
+                continue
+            state = 0
+            for char in entry:
+                if (next_state := self._goto[state].get(char)) is None:
+                    next_state = len(self._goto)
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._accept.append(False)
+                    self._goto[state][char] = next_state
+                state = next_state
+            self._accept[state] = True
+
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[next_state] = self._goto[fail].get(char, 0)
+                self._accept[next_state] |= self._accept[self._fail[next_state]]
+
+    def __bool__(self) -> bool:
+        return self._match_all or bool(self._goto[0])
+
+    def matches(self, text: str) -> bool:
+        if self._match_all:
+            return True
+        goto, fail, accept = self._goto, self._fail, self._accept
+        state = 0
+        for char in text.lower():
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if accept[state]:
+                return True
+        return False
+
+
+@lru_cache(maxsize=64)
+def compile_blacklist(entries: tuple[str, ...]) -> BlacklistMatcher:
+    """
+    Compile blacklist entries into a matcher.
+
+    Account settings are re-read from Firefly for every request, so the
+    matcher is cached by the entries themselves rather than by the settings
+    object.
+    """
+    return BlacklistMatcher(entries)
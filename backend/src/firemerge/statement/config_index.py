@@ -0,0 +1,112 @@
+"""Header fingerprint index for picking parser settings for a statement."""
+
+import logging
+from collections.abc import Iterable, Sequence
+from io import BytesIO
+
+from pydantic import BaseModel
+
+from firemerge.model.account_settings import (
+    StatementFormatSettings,
+    StatementFormatSettingsCSV,
+    StatementFormatSettingsPDF,
+    StatementFormatSettingsXLSX,
+    StatementParserSettings,
+    StatementParserSettingsMatch,
+)
+from firemerge.statement.reader import BaseStatementReader, ValueType
+
+logger = logging.getLogger("uvicorn.error")
+
+# Rows at the start of a statement to look for a known header in.
+MATCH_HEAD_ROWS = 50
+
+_PDF_MAGIC = b"%PDF"
+_ZIP_MAGIC = b"PK\x03\x04"
+
+
+class ConfigCandidate(BaseModel):
+    label: str
+    account_id: int | None
+    parser_settings: StatementParserSettings
+
+
+class ConfigIndex:
+    """
+    Parser settings indexed by header fingerprint.
+
+    Candidates are grouped by their format settings (format, delimiter and
+    encoding), so matching a statement reads its first rows once per distinct
+    reader configuration rather than once per candidate.
+    """
+
+    def __init__(self, candidates: Iterable[ConfigCandidate]):
+        self._by_format: dict[
+            str, tuple[StatementFormatSettings, list[ConfigCandidate]]
+        ] = {}
+        for candidate in candidates:
+            fmt = candidate.parser_settings.format
+            key = fmt.model_dump_json()
+            self._by_format.setdefault(key, (fmt, []))[1].append(candidate)
+
+    def match(self, content: bytes) -> list[StatementParserSettingsMatch]:
+        """Rank the candidates by how well their header matches the statement."""
+        result = []
+        for fmt, candidates in self._by_format.values():
+            if not _format_plausible(fmt, content):
+                continue
+            rows = _head_rows(content, fmt)
+            if not rows:
+                continue
+            for candidate in candidates:
+                header = [c.name for c in candidate.parser_settings.columns]
+                if score := _header_score(header, rows):
+                    result.append(
+                        StatementParserSettingsMatch(
+                            label=candidate.label,
+                            account_id=candidate.account_id,
+                            score=score,
+                            parser_settings=candidate.parser_settings,
+                        )
+                    )
+        result.sort(key=lambda m: m.score, reverse=True)
+        return result
+
+
+def _format_plausible(fmt: StatementFormatSettings, content: bytes) -> bool:
+    if isinstance(fmt, StatementFormatSettingsPDF):
+        return content.startswith(_PDF_MAGIC)
+    if isinstance(fmt, StatementFormatSettingsXLSX):
+        return content.startswith(_ZIP_MAGIC)
+    if isinstance(fmt, StatementFormatSettingsCSV):
+        return not content.startswith((_PDF_MAGIC, _ZIP_MAGIC))
+    return False
+
+
+def _head_rows(
+    content: bytes, fmt: StatementFormatSettings
+) -> list[Sequence[ValueType]]:
+    try:
+        return BaseStatementReader.create(BytesIO(content), fmt).head_rows(
+            MATCH_HEAD_ROWS
+        )
+    except Exception:
+        # Wrong encoding, broken file etc. simply means no match
+        logger.debug("Cannot read statement as %s", fmt, exc_info=True)
+        return []
+
+
+def _header_score(header: list[str], rows: list[Sequence[ValueType]]) -> float:
+    """1.0 if the header is found as is, otherwise the best column overlap."""
+    header_names = set(header)
+    best = 0.0
+    for row in rows:
+        if row == header:
+            return 1.0
+        names = {cell for cell in row if isinstance(cell, str) and cell}
+        if names & header_names:
+            # never let a partial match tie with an exact one
+            best = max(
+                best, 0.99 * len(names & header_names) / len(names | header_names)
+            )
+    return best
@@ -1,23 +1,85 @@
+from collections.abc import Mapping
+from hashlib import sha256
 from importlib import resources
-from importlib.resources.abc import Traversable
 from pathlib import Path
+from types import MappingProxyType
 
 import yaml
+from pydantic import TypeAdapter
 
 from firemerge.model.account_settings import RepoStatementParserSettings
 
+CONFIGS_PACKAGE = "firemerge.statement.configs"
+
+_configs_adapter = TypeAdapter(list[RepoStatementParserSettings])
+
+
+class ConfigRegistry:
+    """
+    Immutable snapshot of the repo parser configs.
+
+    Configs are validated once, their derived header and role maps are
+    computed up front, and the JSON served to the frontend is rendered once
+    together with its ETag.
+    """
+
+    def __init__(self, files: Mapping[str, bytes], signature: tuple = ()):
+        self.signature = signature
+        self.configs: Mapping[str, RepoStatementParserSettings] = MappingProxyType(
+            {
+                name: RepoStatementParserSettings.model_validate(
+                    yaml.safe_load(content)
+                )
+                for name, content in sorted(files.items())
+            }
+        )
+        for config in self.configs.values():
+            # warm up the derived structures used by StatementParser
+            _ = config.header, config.role_columns
+        self.json = _configs_adapter.dump_json(list(self.configs.values()))
+        self.etag = f'"{sha256(self.json).hexdigest()[:32]}"'
+
+    @classmethod
+    def load(cls) -> "ConfigRegistry":
+        root = resources.files(CONFIGS_PACKAGE)
+        return cls(
+            {
+                path.name: path.read_bytes()
+                for path in root.iterdir()
+                if path.name.endswith(".yaml")
+            },
+            _directory_signature(),
+        )
+
+
+_registry: ConfigRegistry | None = None
+
+
+def get_registry() -> ConfigRegistry:
+    """Return the config registry, reloading it if the config files changed."""
+    global _registry
+    if _registry is None or _registry.signature != _directory_signature():
+        _registry = ConfigRegistry.load()
+    return _registry
+
 
 def load_config(name: str) -> RepoStatementParserSettings:
-    return _load_config(resources.files("firemerge.statement.configs") / name)
+    return get_registry().configs[name]
 
 
 def load_configs() -> list[RepoStatementParserSettings]:
-    result = []
-    for config in resources.files("firemerge.statement.configs").iterdir():
-        result.append(_load_config(config))
-    return result
+    return list(get_registry().configs.values())
 
 
-def _load_config(path: Path | Traversable) -> RepoStatementParserSettings:
-    with path.open("r") as f:
-        return RepoStatementParserSettings.model_validate(yaml.safe_load(f))
+def _directory_signature() -> tuple:
+    """Names, sizes and modification times of the config files."""
+    return tuple(
+        sorted(
+            (path.name, stat.st_mtime_ns, stat.st_size)
+            for path in resources.files(CONFIGS_PACKAGE).iterdir()
+            # files in a zipped package are not paths, but can't change either
+            if isinstance(path, Path)
+            and path.name.endswith(".yaml")
+            and (stat := path.stat())
+        )
+    )
@@ -0,0 +1,225 @@
+"""Statement parser settings compiled into a row decoder."""
+
+import re
+from collections.abc import Callable, Sequence
+from datetime import date, datetime, time
+from decimal import Decimal, InvalidOperation
+from functools import lru_cache
+from zoneinfo import ZoneInfo
+
+from firemerge.model.account_settings import ColumnRole, StatementParserSettings
+from firemerge.model.common import Money
+from firemerge.statement.reader import ValueType
+
+DateParser = Callable[[ValueType], datetime]
+AmountParser = Callable[[ValueType], Money]
+
+DATE_CACHE_SIZE = 4096
+
+_DIRECTIVE_RE = re.compile(r"([^%]+)|(%.)")
+_DIRECTIVES = {
+    "%d": r"(\d\d?)",
+    "%m": r"(\d\d?)",
+    "%Y": r"(\d{4})",
+    "%y": r"(\d\d)",
+    "%H": r"(\d\d?)",
+    "%M": r"(\d\d?)",
+    "%S": r"(\d\d?)",
+}
+
+
+class RowDecoder:
+    """
+    Statement parser settings compiled for decoding rows.
+
+    Column roles are resolved to fixed indices and the date and amount
+    parsers are picked once, so decoding a row does no settings lookups.
+    """
+
+    def __init__(self, settings: StatementParserSettings, tz: ZoneInfo):
+        roles = {role: c.index for role, c in settings.role_columns.items()}
+
+        self.date_idx = roles[ColumnRole.DATE]
+        self.name_idx = roles[ColumnRole.NAME]
+        self.iban_idx = roles.get(ColumnRole.IBAN)
+        self.doc_number_idx = roles.get(ColumnRole.DOC_NUMBER)
+        self.currency_idx = roles.get(ColumnRole.CURRENCY_CODE)
+        self.foreign_currency_idx = roles.get(ColumnRole.FOREIGN_CURRENCY_CODE)
+        self.foreign_amount_idx = roles.get(ColumnRole.FOREIGN_AMOUNT)
+        self.balance_idx = roles.get(ColumnRole.REMAINING_BALANCE)
+        self.notes_cols = tuple(
+            (c.index, c.notes_label) for c in settings.columns if c.notes_label
+        )
+
+        self.parse_date = compile_date_parser(settings.date_format, tz)
+        self.parse_amount = compile_amount_parser(settings.decimal_separator)
+
+        self._amount_idx = roles.get(ColumnRole.AMOUNT)
+        self._debit_idx = roles.get(ColumnRole.AMOUNT_DEBIT)
+        self._credit_idx = roles.get(ColumnRole.AMOUNT_CREDIT)
+        self._commission_idx = roles.get(ColumnRole.COMMISION)
+        self._base_amount = (
+            self._single_amount
+            if self._amount_idx is not None
+            else self._debit_credit_amount
+        )
+
+    def amount(self, row: Sequence[ValueType]) -> Money:
+        result = self._base_amount(row)
+        if self._commission_idx is not None:
+            # Probably not correct for debit/credit rows
+            try:
+                commission = self.parse_amount(row[self._commission_idx])
+            except ValueError:
+                pass
+            else:
+                result += commission * (1 if result > 0 else -1)
+        return result
+
+    def balance(self, row: Sequence[ValueType]) -> Money:
+        assert self.balance_idx is not None
+        return self.parse_amount(row[self.balance_idx])
+
+    def notes(self, row: Sequence[ValueType], suffix: str = "") -> list[str]:
+        return [
+            f"{label}{suffix}: {value}"
+            for idx, label in self.notes_cols
+            if (value := row[idx])
+        ]
+
+    def _single_amount(self, row: Sequence[ValueType]) -> Money:
+        assert self._amount_idx is not None
+        return self.parse_amount(row[self._amount_idx])
+
+    def _debit_credit_amount(self, row: Sequence[ValueType]) -> Money:
+        assert self._debit_idx is not None and self._credit_idx is not None
+        debit = row[self._debit_idx]
+        credit = row[self._credit_idx]
+        if debit and credit:
+            raise ValueError("Both debit and credit are present")
+        return -self.parse_amount(debit) if debit else self.parse_amount(credit)
+
+
+def compile_date_parser(date_format: str, tz: ZoneInfo | None = None) -> DateParser:
+    """
+    Build a date parser for the given format, tz-aware if `tz` is given.
+
+    String cells go through a parser specialized for the format and are
+    memoized, as statements repeat the same timestamps many times; other
+    cell types (XLSX dates) fall back to `parse_date`.
+    """
+    parse_text = compile_date_format(date_format)
+
+    @lru_cache(maxsize=DATE_CACHE_SIZE)
+    def parse_str(value: str) -> datetime:
+        result = parse_text(value)
+        return result if tz is None else _localize(result, tz)
+
+    def parse(value: ValueType) -> datetime:
+        if value.__class__ is str:
+            return parse_str(value)
+        result = parse_date(value, date_format)
+        return result if tz is None else _localize(result, tz)
+
+    return parse
+
+
+@lru_cache(maxsize=32)
+def compile_date_format(date_format: str) -> Callable[[str], datetime]:
+    """
+    Compile a `strptime` format into a faster string parser.
+
+    Formats built only from numeric directives (`%d`, `%m`, `%Y`, `%y`, `%H`,
+    `%M`, `%S`) and literal separators are matched with a regex; anything
+    the regex doesn't accept is handed to `strptime`, so errors and corner
+    cases behave exactly as before.
+    """
+    strptime = datetime.strptime
+
+    def parse_strptime(value: str) -> datetime:
+        return strptime(value, date_format)
+
+    pattern = []
+    fields = []
+    for literal, directive in _DIRECTIVE_RE.findall(date_format):
+        if literal:
+            pattern.append(r"\s+" if literal.isspace() else re.escape(literal))
+        elif directive in _DIRECTIVES and directive not in fields:
+            pattern.append(_DIRECTIVES[directive])
+            fields.append(directive)
+        else:
+            return parse_strptime
+    if "%Y" in fields and "%y" in fields:
+        return parse_strptime
+    match = re.compile("".join(pattern), re.ASCII).fullmatch
+
+    def parse_fast(value: str) -> datetime:
+        m = match(value)
+        if m is None:
+            return parse_strptime(value)
+        parts = dict(zip(fields, map(int, m.groups())))
+        if "%y" in parts:
+            year = parts["%y"] + (2000 if parts["%y"] <= 68 else 1900)
+        else:
+            year = parts.get("%Y", 1900)
+        try:
+            return datetime(
+                year,
+                parts.get("%m", 1),
+                parts.get("%d", 1),
+                parts.get("%H", 0),
+                parts.get("%M", 0),
+                parts.get("%S", 0),
+            )
+        except ValueError:
+            # e.g. adjacent directives split differently than strptime does
+            return parse_strptime(value)
+
+    return parse_fast
+
+
+def compile_amount_parser(decimal_separator: str | None) -> AmountParser:
+    """Build an amount parser with a fast path for string cells."""
+
+    def parse_str_amount(value: ValueType) -> Money:
+        if value.__class__ is not str:
+            return parse_amount(value, decimal_separator)
+        text = value
+        if decimal_separator:
+            text = text.replace(decimal_separator, ".")
+        try:
+            return Money(text.replace(" ", ""))
+        except InvalidOperation as e:
+            raise ValueError(f"Invalid amount: {value}") from e
+
+    return parse_str_amount
+
+
+def parse_date(value: ValueType, date_format: str) -> datetime:
+    if isinstance(value, datetime):
+        result = value
+    elif isinstance(value, date):
+        result = datetime.combine(value, time.min)
+    elif isinstance(value, str):
+        result = datetime.strptime(value, date_format)
+    else:
+        raise ValueError(f"Invalid date: {value}")
+    return result
+
+
+def parse_amount(value: ValueType, decimal_separator: str | None) -> Money:
+    try:
+        if isinstance(value, int | float | Decimal):
+            return Money(Decimal(value).quantize(Decimal("0.01")))
+        if isinstance(value, str):
+            if decimal_separator:
+                value = value.replace(decimal_separator, ".")
+            return Money(value.replace(" ", ""))
+    except InvalidOperation as e:
+        raise ValueError(f"Invalid amount: {value}") from e
+
+    raise ValueError(f"Invalid amount: {value}")
+
+
+def _localize(value: datetime, tz: ZoneInfo) -> datetime:
+    return value if value.tzinfo is not None else value.replace(tzinfo=tz)
@@ -0,0 +1,120 @@
+"""Bounded executor for CPU-bound statement work."""
+
+import asyncio
+from collections.abc import Awaitable, Callable
+from concurrent.futures import Executor
+from typing import Any, TypeVar
+
+T = TypeVar("T")
+
+# How often to check whether the client is still waiting for the result.
+DISCONNECT_POLL_INTERVAL = 0.5
+
+
+class ExecutorBusyError(RuntimeError):
+    pass
+
+
+class ClientDisconnectedError(RuntimeError):
+    pass
+
+
+class BoundedExecutor:
+    """
+    Executor wrapper that refuses work beyond `max_pending` tasks.
+
+    At most `workers` tasks are handed to the executor at once, the rest wait
+    here, so the deadline of a task starts once a worker picks it up rather
+    than when it is submitted. Waiting work is dropped once nobody waits for
+    it anymore (deadline or client disconnect). Work already running in a
+    worker can't be interrupted, so it is abandoned and keeps its slot until
+    it finishes, which keeps the limit honest about the actual load.
+    """
+
+    def __init__(self, executor: Executor, workers: int, max_pending: int):
+        self._executor = executor
+        self._workers = asyncio.Semaphore(workers)
+        self._pending = asyncio.Semaphore(max_pending)
+
+    @property
+    def busy(self) -> bool:
+        """Whether work submitted without `wait` would be refused"""
+        return self._pending.locked()
+
+    async def run(
+        self,
+        fn: Callable[..., T],
+        *args: Any,
+        timeout: float | None = None,
+        is_disconnected: Callable[[], Awaitable[bool]] | None = None,
+        wait: bool = False,
+    ) -> T:
+        """
+        Run `fn(*args)` in the executor.
+
+        Raises `ExecutorBusyError` if `max_pending` tasks are pending, unless
+        `wait` is set, in which case the task waits for a slot.
+        """
+        if not wait and self.busy:
+            raise ExecutorBusyError("Too many statements are being processed")
+        await self._pending.acquire()
+        try:
+            await _acquire(self._workers, is_disconnected)
+        except BaseException:
+            self._pending.release()
+            raise
+        try:
+            future = self._executor.submit(fn, *args)
+        except BaseException:
+            self._release()
+            raise
+        loop = asyncio.get_running_loop()
+
+        def release(_: object) -> None:
+            # called from a worker thread
+            try:
+                loop.call_soon_threadsafe(self._release)
+            except RuntimeError:
+                pass  # the loop is closed on shutdown
+
+        future.add_done_callback(release)
+        try:
+            return await asyncio.wait_for(
+                _wait(asyncio.wrap_future(future), is_disconnected), timeout
+            )
+        finally:
+            future.cancel()
+
+    def _release(self) -> None:
+        self._workers.release()
+        self._pending.release()
+
+
+async def _acquire(
+    slots: asyncio.Semaphore,
+    is_disconnected: Callable[[], Awaitable[bool]] | None,
+) -> None:
+    if is_disconnected is None:
+        await slots.acquire()
+        return
+    while True:
+        try:
+            await asyncio.wait_for(slots.acquire(), DISCONNECT_POLL_INTERVAL)
+            return
+        except TimeoutError:
+            if await is_disconnected():
+                raise ClientDisconnectedError("Client disconnected") from None
+
+
+async def _wait(
+    result: "asyncio.Future[T]",
+    is_disconnected: Callable[[], Awaitable[bool]] | None,
+) -> T:
+    if is_disconnected is None:
+        return await result
+    while True:
+        done, _ = await asyncio.wait({result}, timeout=DISCONNECT_POLL_INTERVAL)
+        if done:
+            return result.result()
+        if await is_disconnected():
+            raise ClientDisconnectedError("Client disconnected")
@@ -1,6 +1,10 @@
+import asyncio
 import csv
-from contextlib import closing
+from collections.abc import AsyncIterable, AsyncIterator, Callable, Iterable, Iterator
+from functools import lru_cache
 from io import StringIO
+from typing import NamedTuple
+from zipfile import ZIP_DEFLATED, ZipFile
 
 from firemerge.model.account_settings import (
     ConstantExportField,
@@ -11,75 +15,318 @@ from firemerge.model.account_settings import (
 )
 from firemerge.model.firefly import Transaction, TransactionType
 
+# Characters of CSV buffered before a chunk is handed to the client.
+EXPORT_CHUNK_SIZE = 64 * 1024
 
-def export_field(
-    transaction: Transaction,
-    account_map: dict[int, str],
-    currency_map: dict[int, str],
-    field: ExportField,
+
+# Transactions fetched ahead for each statement of a bundle.
+EXPORT_PREFETCH_ROWS = 5000
+# Compiled plans kept, one per distinct export settings.
+EXPORT_PLAN_CACHE_SIZE = 32
+
+FieldGetter = Callable[[Transaction, dict[int, str], dict[int, str]], str]
+RowFormatter = Callable[[Transaction, dict[int, str], dict[int, str]], list[str]]
+
+
+def _amount(
+    tr: Transaction, accounts: dict[int, str], currencies: dict[int, str]
+) -> str:
+    return f"{tr.amount:.02f}"
+
+
+def _currency_code(
+    tr: Transaction, accounts: dict[int, str], currencies: dict[int, str]
+) -> str:
+    return currencies[tr.currency_id]
+
+
+def _foreign_amount(
+    tr: Transaction, accounts: dict[int, str], currencies: dict[int, str]
 ) -> str:
+    return f"{tr.foreign_amount:.02f}"
+
+
+def _foreign_currency_code(
+    tr: Transaction, accounts: dict[int, str], currencies: dict[int, str]
+) -> str:
+    assert tr.foreign_currency_id is not None
+    return currencies[tr.foreign_currency_id]
+
+
+def _source_account_name(
+    tr: Transaction, accounts: dict[int, str], currencies: dict[int, str]
+) -> str:
+    assert tr.source_id is not None
+    return accounts[tr.source_id]
+
+
+def _destination_account_name(
+    tr: Transaction, accounts: dict[int, str], currencies: dict[int, str]
+) -> str:
+    assert tr.destination_id is not None
+    return accounts[tr.destination_id]
+
+
+def _empty(
+    tr: Transaction, accounts: dict[int, str], currencies: dict[int, str]
+) -> str:
+    return ""
+
+
+def _exchange_rate(
+    tr: Transaction, accounts: dict[int, str], currencies: dict[int, str]
+) -> str:
+    assert tr.foreign_amount is not None
+    assert tr.amount != 0
+    exchange_rate = tr.foreign_amount / tr.amount
+    return f"{exchange_rate:.05f}"
+
+
+_FIELD_GETTERS: dict[ExportFieldType, FieldGetter] = {
+    ExportFieldType.AMOUNT: _amount,
+    ExportFieldType.CURRENCY_CODE: _currency_code,
+    ExportFieldType.FOREIGN_AMOUNT: _foreign_amount,
+    ExportFieldType.FOREIGN_CURRENCY_CODE: _foreign_currency_code,
+    ExportFieldType.SOURCE_ACCOUNT_NAME: _source_account_name,
+    ExportFieldType.DESTINATION_ACCOUNT_NAME: _destination_account_name,
+    ExportFieldType.EMPTY: _empty,
+    ExportFieldType.EXCHANGE_RATE: _exchange_rate,
+}
+
+
+def compile_field(field: ExportField) -> FieldGetter:
     if isinstance(field, DateExportField):
-        return transaction.date.strftime(field.format)
+        date_format = field.format
+
+        def get_date(
+            tr: Transaction, accounts: dict[int, str], currencies: dict[int, str]
+        ) -> str:
+            return tr.date.strftime(date_format)
+
+        return get_date
     if isinstance(field, ConstantExportField):
-        return field.value
-
-    if field.type == ExportFieldType.AMOUNT:
-        return f"{transaction.amount:.02f}"
-    if field.type == ExportFieldType.CURRENCY_CODE:
-        return currency_map[transaction.currency_id]
-    if field.type == ExportFieldType.FOREIGN_AMOUNT:
-        return f"{transaction.foreign_amount:.02f}"
-    if field.type == ExportFieldType.FOREIGN_CURRENCY_CODE:
-        assert transaction.foreign_currency_id is not None
-        return currency_map[transaction.foreign_currency_id]
-    if field.type == ExportFieldType.SOURCE_ACCOUNT_NAME:
-        assert transaction.source_id is not None
-        return account_map[transaction.source_id]
-    if field.type == ExportFieldType.DESTINATION_ACCOUNT_NAME:
-        assert transaction.destination_id is not None
-        return account_map[transaction.destination_id]
-    if field.type == ExportFieldType.EMPTY:
-        return ""
-    if field.type == ExportFieldType.EXCHANGE_RATE:
-        assert transaction.foreign_amount is not None
-        assert transaction.amount != 0
-        exchange_rate = transaction.foreign_amount / transaction.amount
-        return f"{exchange_rate:.05f}"
-    raise ValueError(f"Unknown field type: {field.type}")
-
-
-def export_transaction(
-    transaction: Transaction,
+        value = field.value
+
+        def get_constant(
+            tr: Transaction, accounts: dict[int, str], currencies: dict[int, str]
+        ) -> str:
+            return value
+
+        return get_constant
+    if (getter := _FIELD_GETTERS.get(field.type)) is None:
+        raise ValueError(f"Unknown field type: {field.type}")
+    return getter
+
+
+def compile_row(fields: list[ExportField]) -> RowFormatter:
+    getters = tuple(compile_field(field) for field in fields)
+
+    def format_row(
+        tr: Transaction, accounts: dict[int, str], currencies: dict[int, str]
+    ) -> list[str]:
+        return [get(tr, accounts, currencies) for get in getters]
+
+    return format_row
+
+
+class ExportPlan(NamedTuple):
+    """Row formatters of the exported transaction types"""
+
+    rows: dict[TransactionType, RowFormatter]
+
+    def format(
+        self,
+        transaction: Transaction,
+        account_map: dict[int, str],
+        currency_map: dict[int, str],
+    ) -> list[str] | None:
+        if (format_row := self.rows.get(transaction.type)) is None:
+            return None
+        return format_row(transaction, account_map, currency_map)
+
+
+def compile_export_settings(export_settings: ExportSettings) -> ExportPlan:
+    """
+    Compile export settings into row formatters.
+
+    Account settings are re-read from Firefly for every request, so plans are
+    cached by the serialized settings rather than by the settings object.
+    """
+    return _compile_export_settings(export_settings.model_dump_json())
+
+
+@lru_cache(maxsize=EXPORT_PLAN_CACHE_SIZE)
+def _compile_export_settings(settings_json: str) -> ExportPlan:
+    export_settings = ExportSettings.model_validate_json(settings_json)
+    fields_map = {
+        TransactionType.Deposit: export_settings.deposit,
+        TransactionType.Withdrawal: export_settings.withdrawal,
+        TransactionType.Transfer: export_settings.transfer,
+    }
+    return ExportPlan(
+        {
+            tr_type: compile_row(fields)
+            for tr_type, fields in fields_map.items()
+            if fields is not None
+        }
+    )
+
+
+class _CsvChunks:
+    """CSV writer handing out its output in chunks of about `chunk_size`"""
+
+    def __init__(self, chunk_size: int):
+        self.chunk_size = chunk_size
+        self._buffer = StringIO()
+        self._writer = csv.writer(self._buffer)
+
+    def write(self, row: list[str]) -> str | None:
+        self._writer.writerow(row)
+        if self._buffer.tell() < self.chunk_size:
+            return None
+        return self.flush()
+
+    def flush(self) -> str:
+        chunk = self._buffer.getvalue()
+        self._buffer.seek(0)
+        self._buffer.truncate()
+        return chunk
+
+
+def iter_statement(
+    transactions: Iterable[Transaction],
     account_map: dict[int, str],
     currency_map: dict[int, str],
-    fields: list[ExportField],
-) -> list[str]:
-    return [
-        export_field(transaction, account_map, currency_map, field) for field in fields
-    ]
+    export_settings: ExportSettings,
+    chunk_size: int = EXPORT_CHUNK_SIZE,
+) -> Iterator[str]:
+    """CSV content of the statement, in chunks"""
+    plan = compile_export_settings(export_settings)
+    chunks = _CsvChunks(chunk_size)
+    for tr in transactions:
+        if (row := plan.format(tr, account_map, currency_map)) is not None:
+            if (chunk := chunks.write(row)) is not None:
+                yield chunk
+    if chunk := chunks.flush():
+        yield chunk
+
+
+async def stream_statement(
+    transactions: AsyncIterable[Transaction],
+    account_map: dict[int, str],
+    currency_map: dict[int, str],
+    export_settings: ExportSettings,
+    chunk_size: int = EXPORT_CHUNK_SIZE,
+) -> AsyncIterator[str]:
+    """CSV content of the statement, in chunks, as transactions arrive"""
+    plan = compile_export_settings(export_settings)
+    chunks = _CsvChunks(chunk_size)
+    async for tr in transactions:
+        if (row := plan.format(tr, account_map, currency_map)) is not None:
+            if (chunk := chunks.write(row)) is not None:
+                yield chunk
+    if chunk := chunks.flush():
+        yield chunk
 
 
 def export_statement(
-    transactions: list[Transaction],
+    transactions: Iterable[Transaction],
     account_map: dict[int, str],
     currency_map: dict[int, str],
     export_settings: ExportSettings,
 ) -> str:
-    # Generate CSV content
-    fields_map = {
-        TransactionType.Deposit: export_settings.deposit,
-        TransactionType.Withdrawal: export_settings.withdrawal,
-        TransactionType.Transfer: export_settings.transfer,
-    }
+    return "".join(
+        iter_statement(transactions, account_map, currency_map, export_settings)
+    )
+
+
+class StatementExport(NamedTuple):
+    """A statement of an export bundle"""
+
+    filename: str
+    transactions: AsyncIterable[Transaction]
+    export_settings: ExportSettings
+
+
+class _ZipOutput:
+    """Unseekable file collecting what `ZipFile` writes until it's taken"""
+
+    def __init__(self) -> None:
+        self._chunks: list[bytes] = []
+
+    def write(self, data: bytes, /) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
 
-    output = StringIO()
-    with closing(output) as output:
-        writer = csv.writer(output)
+    def flush(self) -> None:
+        pass
 
-        for tr in transactions:
-            if (fields := fields_map.get(tr.type)) is not None:
-                writer.writerow(
-                    export_transaction(tr, account_map, currency_map, fields)
-                )
+    def close(self) -> None:
+        pass
 
-        return output.getvalue()
+    def take(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+async def _fill(
+    transactions: AsyncIterable[Transaction],
+    queue: "asyncio.Queue[Transaction | Exception | None]",
+) -> None:
+    try:
+        async for tr in transactions:
+            await queue.put(tr)
+    except Exception as e:
+        await queue.put(e)
+    else:
+        await queue.put(None)
+
+
+async def _drain(
+    queue: "asyncio.Queue[Transaction | Exception | None]",
+) -> AsyncIterator[Transaction]:
+    while (item := await queue.get()) is not None:
+        if isinstance(item, Exception):
+            raise item
+        yield item
+
+
+async def stream_statement_bundle(
+    statements: list[StatementExport],
+    account_map: dict[int, str],
+    currency_map: dict[int, str],
+    prefetch: int = EXPORT_PREFETCH_ROWS,
+) -> AsyncIterator[bytes]:
+    """
+    ZIP archive of statement CSVs, in chunks.
+
+    Transactions of all statements are fetched concurrently, each up to
+    `prefetch` rows ahead of the archive, which is written one statement
+    after another.
+    """
+    queues: list[asyncio.Queue[Transaction | Exception | None]] = [
+        asyncio.Queue(prefetch) for _ in statements
+    ]
+    tasks = [
+        asyncio.create_task(_fill(statement.transactions, queue))
+        for statement, queue in zip(statements, queues)
+    ]
+    output = _ZipOutput()
+    try:
+        with ZipFile(output, "w", ZIP_DEFLATED) as archive:
+            for statement, queue in zip(statements, queues):
+                with archive.open(statement.filename, "w") as entry:
+                    async for chunk in stream_statement(
+                        _drain(queue),
+                        account_map,
+                        currency_map,
+                        statement.export_settings,
+                    ):
+                        entry.write(chunk.encode())
+                        if data := output.take():
+                            yield data
+        yield output.take()
+    finally:
+        for task in tasks:
+            task.cancel()
@@ -0,0 +1,130 @@
+"""Streaming join of debit/credit statement rows by document number."""
+
+import pickle
+import sqlite3
+from collections import OrderedDict, deque
+from collections.abc import Callable, Hashable, Iterable, Iterator, Sequence
+
+from firemerge.statement.reader import ValueType
+
+Row = Sequence[ValueType]
+
+# Rows to read ahead of the emitted row when looking for its counterpart.
+JOIN_WINDOW = 1000
+# Rows buffered while waiting for a counterpart beyond the look-ahead window.
+JOIN_HOLD_ROWS = 10000
+# Counterpart rows kept in memory before older ones are spilled to disk.
+JOIN_MEMORY_ROWS = 10000
+
+
+class CounterpartIndex:
+    """
+    Counterpart rows by document number.
+
+    The most recent rows are kept in memory; once there are more than
+    `memory_rows` of them, the oldest are moved to a temporary on-disk
+    SQLite database, so memory use doesn't depend on statement size.
+    A later row with the same document number replaces the earlier one.
+    """
+
+    def __init__(self, memory_rows: int = JOIN_MEMORY_ROWS):
+        self.memory_rows = memory_rows
+        self._recent: OrderedDict[Hashable, Row] = OrderedDict()
+        self._db: sqlite3.Connection | None = None
+
+    def add(self, key: Hashable, row: Row) -> None:
+        self._recent[key] = row
+        self._recent.move_to_end(key)
+        if len(self._recent) > self.memory_rows:
+            self._spill(*self._recent.popitem(last=False))
+
+    def get(self, key: Hashable) -> Row | None:
+        if (row := self._recent.get(key)) is not None:
+            return row
+        if self._db is None:
+            return None
+        found = self._db.execute(
+            "SELECT row FROM counterparts WHERE key = ?", (pickle.dumps(key),)
+        ).fetchone()
+        return pickle.loads(found[0]) if found else None
+
+    def close(self) -> None:
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+    def _spill(self, key: Hashable, row: Row) -> None:
+        if self._db is None:
+            self._db = _temp_db(
+                "CREATE TABLE counterparts (key BLOB PRIMARY KEY, row BLOB)"
+            )
+        self._db.execute(
+            "INSERT OR REPLACE INTO counterparts VALUES (?, ?)",
+            (pickle.dumps(key), pickle.dumps(row)),
+        )
+
+
+def join_rows(
+    rows: Iterable[Row],
+    doc_idx: int,
+    is_counterpart: Callable[[Row], bool],
+    window: int = JOIN_WINDOW,
+    max_hold: int = JOIN_HOLD_ROWS,
+    memory_rows: int = JOIN_MEMORY_ROWS,
+) -> Iterator[tuple[Row, Row | None]]:
+    """
+    Pair rows with their counterparts by document number.
+
+    Yields every row in order, together with the counterpart row that has the
+    same document number (or None). Counterparts are looked up among all rows
+    read so far and up to `window` rows ahead. A row whose counterpart isn't
+    found by then is held back, along with the rows after it, until the
+    counterpart shows up or `max_hold` rows are buffered; it is then yielded
+    unjoined, so at most `max_hold` rows are ever held in memory.
+    """
+    index = CounterpartIndex(memory_rows)
+    queue: deque[Row] = deque()
+    # Document number of the held back row at the head of the queue
+    waiting: ValueType = None
+
+    def partner(row: Row) -> Row | None:
+        if is_counterpart(row) or not (doc_number := row[doc_idx]):
+            return None
+        return index.get(doc_number)
+
+    try:
+        for row in rows:
+            if (doc_number := row[doc_idx]) and is_counterpart(row):
+                index.add(doc_number, row)
+                if doc_number == waiting:
+                    waiting = None
+            queue.append(row)
+            if waiting is not None:
+                if len(queue) <= max_hold:
+                    continue
+                # give up on the counterpart of the head
+                waiting = None
+                yield queue.popleft(), None
+            while len(queue) > window:
+                head = queue[0]
+                if (
+                    (found := partner(head)) is None
+                    and head[doc_idx]
+                    and not is_counterpart(head)
+                    and len(queue) <= max_hold
+                ):
+                    waiting = head[doc_idx]
+                    break
+                yield queue.popleft(), found
+        while queue:
+            head = queue.popleft()
+            yield head, partner(head)
+    finally:
+        index.close()
+
+
+def _temp_db(schema: str) -> sqlite3.Connection:
+    # An empty name makes SQLite use a temporary file, deleted on close
+    db = sqlite3.connect("")
+    db.execute(schema)
+    return db
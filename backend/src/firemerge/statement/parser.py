@@ -1,15 +1,13 @@
 import logging
 from collections.abc import Iterable, Sequence
-from datetime import date, datetime, time
-from decimal import Decimal, InvalidOperation
+from datetime import date, datetime
 from io import BytesIO
 from itertools import chain, pairwise
 from math import copysign
 from string import digits
+from typing import NamedTuple
 from zoneinfo import ZoneInfo
 
-from hidateinfer import infer as infer_date
-
 from firemerge.model.account_settings import (
     AccountSettings,
     ColumnInfo,
@@ -20,13 +18,39 @@ from firemerge.model.account_settings import (
 )
 from firemerge.model.api import StatementTransaction
 from firemerge.model.common import Account, Currency, Money
+from firemerge.statement.batch import StatementBatch
+from firemerge.statement.blacklist import compile_blacklist
+from firemerge.statement.decoder import (
+    RowDecoder,
+    compile_date_parser,
+    parse_amount,
+)
+from firemerge.statement.join import join_rows
 from firemerge.statement.reader import (
+    GUESS_SAMPLE_ROWS,
     BaseStatementReader,
     ValueType,
 )
+from firemerge.util import ProgressCallback
 
 logger = logging.getLogger("uvicorn.error")
 
+# Share of valid dates in a column to consider it the date column.
+DATE_COLUMN_THRESHOLD = 0.5
+# Parsed rows between progress reports.
+PROGRESS_ROWS = 1000
+
+
+class ParsedRow(NamedTuple):
+    """Fields of a `StatementTransaction`, before a model or batch row is built."""
+
+    name: str
+    date: datetime
+    amount: Money
+    foreign_amount: Money | float | None
+    foreign_currency_code: str | None
+    notes: str | None
+
 
 class StatementParser:
     def __init__(
@@ -36,29 +60,32 @@ class StatementParser:
         tz: ZoneInfo,
         settings: AccountSettings,
         primary_currency: Currency,
+        progress: ProgressCallback | None = None,
     ):
         self.data = data
         self.account = account
         self.tz = tz
         self.settings = settings
         self.primary_currency = primary_currency
+        self.progress = progress
 
         if self.settings.parser_settings is None:
             raise ValueError("Parser settings are required to parse statement")
 
         self.parser_settings: StatementParserSettings = self.settings.parser_settings
 
-        self.header = [c.name for c in self.settings.parser_settings.columns]
-        self.role_cols = {
-            c.role: c for c in self.settings.parser_settings.columns if c.role
-        }
+        self.header = self.parser_settings.header
+        self.decoder = RowDecoder(self.parser_settings, tz)
+        self.blacklist = compile_blacklist(tuple(self.settings.blacklist))
+
+    def _create_reader(self) -> BaseStatementReader:
+        return BaseStatementReader.create(self.data, self.parser_settings.format)
 
     def _iter_rows(self) -> Iterable[Sequence[ValueType]]:
         found = False
-        assert self.settings.parser_settings is not None
-        for page in BaseStatementReader.create(
-            self.data, self.settings.parser_settings.format
-        ).iter_pages():
+        for page_num, page in enumerate(self._create_reader().iter_pages(), 1):
+            if self.progress is not None:
+                self.progress("pages_read", page_num)
             page_iter = iter(page)
             for row in page_iter:
                 # Allow for header to be in the middle of the page
@@ -70,176 +97,172 @@ class StatementParser:
             raise ValueError("No matching header found")
 
     def parse(self) -> Iterable[StatementTransaction]:
-        for transaction in self._parse_rows(self._iter_rows()):
-            if transaction.notes and any(
-                b.lower() in transaction.notes.lower() for b in self.settings.blacklist
-            ):
+        for row in self._filter_rows(self._parse_rows(self._iter_rows())):
+            yield StatementTransaction.model_validate(row._asdict())
+
+    def parse_batch(self) -> StatementBatch:
+        """Parse the statement into a batch, without building models."""
+        batch = StatementBatch()
+        append = batch.append
+        progress = self.progress
+        for row in self._filter_rows(self._parse_rows(self._iter_rows())):
+            append(*row)
+            if progress is not None and len(batch) % PROGRESS_ROWS == 0:
+                progress("rows_parsed", len(batch))
+        if progress is not None:
+            progress("rows_parsed", len(batch))
+        return batch
+
+    def _filter_rows(self, rows: Iterable[ParsedRow]) -> Iterable[ParsedRow]:
+        blacklist = self.blacklist
+        for row in rows:
+            if blacklist and row.notes and blacklist.matches(row.notes):
                 continue
-            if not transaction.amount:
+            if not row.amount:
                 continue
-            yield transaction
-
-    def _parse_date(self, value: ValueType) -> datetime:
-        result = _parse_date(value, self.parser_settings.date_format)
-        if result.tzinfo is None:
-            result = result.replace(tzinfo=self.tz)
-        return result
-
-    def _parse_amount(self, value: ValueType) -> Money:
-        return _parse_amount(value, self.parser_settings.decimal_separator)
-
-    def _parse_rows(
-        self, rows: Iterable[Sequence[ValueType]]
-    ) -> Iterable[StatementTransaction]:
-        iban_col = self.role_cols.get(ColumnRole.IBAN)
-        # prepare rows for join if doc number is present
-        if join_col := self.role_cols.get(ColumnRole.DOC_NUMBER):
-            assert iban_col is not None
-            rows = list(rows)
-            join_rows = {
-                row[join_col.index]: row
-                for row in rows
-                if row[join_col.index] and row[iban_col.index] != self.account.iban
-            }
+            yield row
+
+    def _parse_rows(self, rows: Iterable[Sequence[ValueType]]) -> Iterable[ParsedRow]:
+        decoder = self.decoder
+        iban_idx = decoder.iban_idx
+        balance_idx = decoder.balance_idx
+        # pair rows with their counterparts if doc number is present
+        joined: Iterable[tuple[Sequence[ValueType], Sequence[ValueType] | None]]
+        if (join_idx := decoder.doc_number_idx) is not None:
+            assert iban_idx is not None
+            joined = join_rows(
+                rows, join_idx, lambda row: row[iban_idx] != self.account.iban
+            )
         else:
-            join_rows = None
+            joined = ((row, None) for row in rows)
 
-        for row, next_row in pairwise(chain(rows, [None])):
+        # remaining balance of `row`, if it was already parsed as `next_row`
+        next_remaining_balance: Money | None = None
+        for (row, join_row), (next_row, _) in pairwise(chain(joined, [(None, None)])):
             assert row is not None  # only next_row can be None
-            if iban_col and row[iban_col.index] != self.account.iban:
+            remaining_balance, next_remaining_balance = next_remaining_balance, None
+            if iban_idx is not None and row[iban_idx] != self.account.iban:
                 continue
 
-            if (
-                join_col
-                and join_rows is not None
-                and (doc_number := row[join_col.index])
-                and (join_row := join_rows.get(doc_number))
-            ):
-                transaction = self._parse_row(row, join_row)
-            else:
-                transaction = self._parse_row(row)
+            parsed = self._parse_row(row, join_row)
 
-            if next_row and (
-                remaining_balance_col := self.role_cols.get(
-                    ColumnRole.REMAINING_BALANCE
-                )
-            ):
+            if next_row and balance_idx is not None:
                 # we assume that the rows are in reverse chronological order
-                next_remaining_balance = self._parse_amount(
-                    next_row[remaining_balance_col.index]
-                )
-                remaining_balance = self._parse_amount(row[remaining_balance_col.index])
-                transaction.amount = transaction.amount.copy_sign(
-                    remaining_balance - next_remaining_balance
+                if remaining_balance is None:
+                    remaining_balance = decoder.balance(row)
+                next_remaining_balance = decoder.balance(next_row)
+                parsed = parsed._replace(
+                    amount=parsed.amount.copy_sign(
+                        remaining_balance - next_remaining_balance
+                    )
                 )
 
-            yield transaction
-
-    def _get_amount(self, row: Sequence[ValueType]) -> Money:
-        if amount_col := self.role_cols.get(ColumnRole.AMOUNT):
-            result = self._parse_amount(row[amount_col.index])
-        else:
-            debit = row[self.role_cols[ColumnRole.AMOUNT_DEBIT].index]
-            credit = row[self.role_cols[ColumnRole.AMOUNT_CREDIT].index]
-            if debit and credit:
-                raise ValueError("Both debit and credit are present")
-            result = -self._parse_amount(debit) if debit else self._parse_amount(credit)
-        if commission_col := self.role_cols.get(ColumnRole.COMMISION):
-            # Probably not correct for debit/credit rows
-            try:
-                commission = self._parse_amount(row[commission_col.index])
-            except ValueError:
-                pass
-            else:
-                result += commission * (1 if result > 0 else -1)
-        return result
-
-    def _get_notes(self, row: Sequence[ValueType], suffix: str = "") -> list[str]:
-        return [
-            f"{col.notes_label}{suffix}: {value}"
-            for col in self.parser_settings.columns
-            if col.notes_label and (value := row[col.index])
-        ]
+            yield parsed
 
     def _parse_row(
         self, row: Sequence[ValueType], join_row: Sequence[ValueType] | None = None
-    ) -> StatementTransaction:
-        amount = self._get_amount(row)
+    ) -> ParsedRow:
+        decoder = self.decoder
+        amount = decoder.amount(row)
         foreign_amount = None
         foreign_currency_code = None
-        transaction_date = self._parse_date(row[self.role_cols[ColumnRole.DATE].index])
+        transaction_date = decoder.parse_date(row[decoder.date_idx])
         if join_row:
-            join_amount = self._get_amount(join_row)
+            join_amount = decoder.amount(join_row)
             if amount * join_amount >= 0:
                 raise ValueError("Same direction")
             debit_row, credit_row = (row, join_row) if amount < 0 else (join_row, row)
-            notes = self._get_notes(debit_row, " [D]") + self._get_notes(
-                credit_row, " [C]"
-            )
+            notes = decoder.notes(debit_row, " [D]") + decoder.notes(credit_row, " [C]")
             transaction_date = min(
-                transaction_date,
-                self._parse_date(join_row[self.role_cols[ColumnRole.DATE].index]),
+                transaction_date, decoder.parse_date(join_row[decoder.date_idx])
             )
-            if currency_col := self.role_cols.get(ColumnRole.CURRENCY_CODE):
+            if decoder.currency_idx is not None:
                 if (
-                    currency_code := join_row[currency_col.index]
+                    currency_code := join_row[decoder.currency_idx]
                 ) != self.primary_currency.code:
                     foreign_amount = join_amount * -1
                     foreign_currency_code = currency_code
         else:
-            notes = self._get_notes(row)
+            notes = decoder.notes(row)
 
-        if foreign_amount is None and (
-            foreign_currency_col := self.role_cols.get(ColumnRole.FOREIGN_CURRENCY_CODE)
-        ):
-            fc_code = row[foreign_currency_col.index]
+        if foreign_amount is None and decoder.foreign_currency_idx is not None:
+            fc_code = row[decoder.foreign_currency_idx]
             if fc_code and fc_code != self.primary_currency.code:
-                foreign_amount = self._parse_amount(
-                    row[self.role_cols[ColumnRole.FOREIGN_AMOUNT].index]
-                )
+                assert decoder.foreign_amount_idx is not None
+                foreign_amount = decoder.parse_amount(row[decoder.foreign_amount_idx])
                 foreign_currency_code = fc_code
-        return StatementTransaction(
-            name=row[self.role_cols[ColumnRole.NAME].index],
+        return ParsedRow(
+            name=_text(row[decoder.name_idx]),
             date=transaction_date,
             amount=amount,
             foreign_amount=foreign_amount and copysign(foreign_amount, amount),
-            foreign_currency_code=foreign_currency_code,
+            foreign_currency_code=None
+            if foreign_currency_code is None
+            else _text(foreign_currency_code),
             notes="\n".join(notes) if notes else None,
         )
 
 
+def _text(value: ValueType) -> str:
+    if not isinstance(value, str):
+        raise ValueError(f"Expected text, got {value!r}")
+    return value
+
+
+def parse_statement_content(
+    content: bytes,
+    account: Account,
+    tz: ZoneInfo,
+    settings: AccountSettings,
+    primary_currency: Currency,
+    progress: ProgressCallback | None = None,
+) -> StatementBatch:
+    """Parse a whole statement; an entry point for worker processes."""
+    parser = StatementParser(
+        BytesIO(content), account, tz, settings, primary_currency, progress
+    )
+    return parser.parse_batch()
+
+
 def guess_parser_settings(
-    data: BytesIO, format_settings: StatementFormatSettings
+    data: BytesIO,
+    format_settings: StatementFormatSettings,
+    sample_size: int = GUESS_SAMPLE_ROWS,
 ) -> GuessedStatementParserSettings:
+    # Imported on first use, only guessing settings needs it
+    from hidateinfer import infer as infer_date
+
     def date_info(idx: int) -> tuple[str | None, float]:
         """Return the date format and the percentage of valid dates in the column."""
         values = [row[idx] for row in rows if row is not None]
         if not values:
             return None, 0
+        # give up on columns that clearly fail before inferring their format
+        max_failures = int(len(values) * (1 - DATE_COLUMN_THRESHOLD))
+        if sum(1 for val in values if not _may_be_date(val)) > max_failures:
+            return None, 0
         str_values = [val for val in values if isinstance(val, str)]
         fmt = None if not str_values else infer_date(str_values)
-        num_dates = 0
+        parse = compile_date_parser(fmt or "%Y-%m-%d %H:%M:%S")
+        num_failures = 0
         for value in values:
             try:
-                _parse_date(value, fmt or "%Y-%m-%d %H:%M:%S")
+                parse(value)
             except ValueError:
-                pass
-            else:
-                num_dates += 1
-        return fmt, num_dates / len(values)
+                num_failures += 1
+                if num_failures > max_failures:
+                    return fmt, 0
+        return fmt, 1 - num_failures / len(values)
 
     def decimal_info() -> tuple[int | None, str | None]:
         for col_idx in range(len(header)):
             values = [row[col_idx] for row in rows]
-            chars = set()
-            for value in values:
-                if isinstance(value, str):
-                    chars |= set(value)
+            chars = set("".join(value for value in values if isinstance(value, str)))
             chars = chars - set(digits)
             decimal_separator = chars.pop() if chars else None
             for value in values:
                 try:
-                    _parse_amount(value, decimal_separator)
+                    parse_amount(value, decimal_separator)
                 except ValueError:
                     break
             else:
@@ -247,7 +270,7 @@ def guess_parser_settings(
         return None, None
 
     reader = BaseStatementReader.create(data, format_settings)
-    header, *rows = reader.guess_header()
+    header, *rows = reader.guess_header(sample_size)
 
     columns = [ColumnInfo(name=s, role=None, index=i) for i, s in enumerate(header)]
 
@@ -256,7 +279,7 @@ def guess_parser_settings(
     (date_col_fmt, date_col_pct), date_col_idx = max(
         ((date_info(i), i) for i in range(len(header))), key=lambda x: x[0][1]
     )
-    if date_col_pct > 0.5:
+    if date_col_pct > DATE_COLUMN_THRESHOLD:
         date_format = date_col_fmt
         columns[date_col_idx].role = ColumnRole.DATE
 
@@ -273,27 +296,7 @@ def guess_parser_settings(
     )
 
 
-def _parse_date(value: ValueType, date_format: str) -> datetime:
-    if isinstance(value, datetime):
-        result = value
-    elif isinstance(value, date):
-        result = datetime.combine(value, time.min)
-    elif isinstance(value, str):
-        result = datetime.strptime(value, date_format)
-    else:
-        raise ValueError(f"Invalid date: {value}")
-    return result
-
-
-def _parse_amount(value: ValueType, decimal_separator: str | None) -> Money:
-    try:
-        if isinstance(value, int | float | Decimal):
-            return Money(Decimal(value).quantize(Decimal("0.01")))
-        if isinstance(value, str):
-            if decimal_separator:
-                value = value.replace(decimal_separator, ".")
-            return Money(value.replace(" ", ""))
-    except InvalidOperation as e:
-        raise ValueError(f"Invalid amount: {value}") from e
-
-    raise ValueError(f"Invalid amount: {value}")
+def _may_be_date(value: ValueType) -> bool:
+    if isinstance(value, str):
+        return any(char in digits for char in value)
+    return isinstance(value, date)
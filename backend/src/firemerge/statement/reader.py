@@ -1,14 +1,17 @@
 import csv
+import gc
+import os
+import random
 from abc import ABC, abstractmethod
+from collections import deque
 from collections.abc import Iterable, Sequence
 from datetime import date, datetime
 from decimal import Decimal
 from io import BytesIO, TextIOWrapper
+from itertools import chain, islice
 from logging import getLogger
-
-import openpyxl
-import pdfplumber
-from openpyxl.worksheet.worksheet import Worksheet
+from time import perf_counter
+from typing import TYPE_CHECKING, NamedTuple
 
 from firemerge.model.account_settings import (
     StatementFormatSettings,
@@ -16,9 +19,23 @@ from firemerge.model.account_settings import (
     StatementFormatSettingsPDF,
     StatementFormatSettingsXLSX,
 )
+from firemerge.util import current_rss
+
+if TYPE_CHECKING:
+    # Imported on first use, most statements are neither PDF nor XLSX
+    import pdfplumber.table
+    from openpyxl.worksheet.worksheet import Worksheet
 
 ValueType = str | float | int | Decimal | datetime | date | bool | None
 
+# Process RSS (bytes) above which PDF reading is aborted; unlimited if unset.
+PDF_MAX_RSS = int(os.getenv("PDF_MAX_RSS_MB", "0")) * 2**20 or None
+
+# Rows at the start of a page to look for a header in.
+HEADER_SEARCH_ROWS = 100
+# Rows after the header to guess parser settings from.
+GUESS_SAMPLE_ROWS = 300
+
 logger = getLogger("uvicorn.error")
 
 
@@ -39,25 +56,37 @@ class BaseStatementReader(ABC):
         """
         pass
 
-    def guess_header(self) -> Sequence[Sequence[ValueType]]:
+    def guess_header(
+        self, sample_size: int = GUESS_SAMPLE_ROWS
+    ) -> Sequence[Sequence[ValueType]]:
         """
         Guess the header of the statement.
 
-        Returns a list of rows, first row is the header.
+        Returns a list of rows, first row is the header, followed by a sample
+        of at most `sample_size` rows after it. Pages after the one the header
+        is found on are not read.
         """
         for page in self.iter_pages():
-            rows = list(page)
+            page_iter = iter(page)
+            rows = list(islice(page_iter, HEADER_SEARCH_ROWS))
             if len(rows) >= 2:
                 max_length, _, max_row_id = max(
                     (len([cell for cell in row if cell]), -i, i)
                     for i, row in enumerate(rows)
                 )
                 if max_length >= 3:  # There are at least 3 required columns
-                    if max_row_id == len(rows) - 1:
+                    data_rows = sample_rows(
+                        chain(rows[max_row_id + 1 :], page_iter), sample_size
+                    )
+                    if not data_rows:
                         raise HeaderGuessError("Possible header is the last row")
-                    return rows[max_row_id:]
+                    return [rows[max_row_id], *data_rows]
         raise HeaderGuessError("No possible header found")
 
+    def head_rows(self, max_rows: int) -> list[Sequence[ValueType]]:
+        """Return the first rows of the statement, reading as little as possible."""
+        return list(islice(chain.from_iterable(self.iter_pages()), max_rows))
+
     @classmethod
     def create(
         cls, data: BytesIO, format_settings: StatementFormatSettings
@@ -92,15 +121,85 @@ class CSVStatementReader(BaseStatementReader):
             yield row
 
 
+class PDFPageStats(NamedTuple):
+    page_number: int
+    tables: int
+    rows: int
+    seconds: float
+    rss: int  # bytes, after the page cache was released
+
+
+class StatementTooLargeError(ValueError):
+    pass
+
+
 class PDFStatementReader(BaseStatementReader):
+    """
+    PDF statement reader.
+
+    Each page is extracted in full and its layout cache is released before
+    the rows are handed over, so memory doesn't grow with the page count.
+    If `max_rss` (bytes) is set and the process grows past it even after
+    that, reading is aborted with StatementTooLargeError.
+    """
+
+    def __init__(self, data: BytesIO, max_rss: int | None = PDF_MAX_RSS):
+        super().__init__(data)
+        self.max_rss = max_rss
+        self.page_stats: list[PDFPageStats] = []
+
     def iter_pages(self) -> Iterable[Iterable[Sequence[ValueType]]]:
+        import pdfplumber
+
+        self.page_stats = []
         with pdfplumber.open(self.data) as pdf:
             for page in pdf.pages:
-                for table in page.find_tables():
-                    yield self._extract_table(table)
+                started_at = perf_counter()
+                try:
+                    tables = [
+                        list(self._extract_table(table)) for table in page.find_tables()
+                    ]
+                finally:
+                    page.close()
+                rss = self._check_memory()
+                stats = PDFPageStats(
+                    page_number=page.page_number,
+                    tables=len(tables),
+                    rows=sum(len(table) for table in tables),
+                    seconds=perf_counter() - started_at,
+                    rss=rss,
+                )
+                self.page_stats.append(stats)
+                logger.debug(
+                    "PDF page %d: %d tables, %d rows in %.3fs, RSS %.1f MiB",
+                    stats.page_number,
+                    stats.tables,
+                    stats.rows,
+                    stats.seconds,
+                    stats.rss / 2**20,
+                )
+                yield from tables
+        if self.page_stats:
+            logger.info(
+                "PDF read: %d pages in %.2fs, peak RSS %.1f MiB",
+                len(self.page_stats),
+                sum(stats.seconds for stats in self.page_stats),
+                max(stats.rss for stats in self.page_stats) / 2**20,
+            )
+
+    def _check_memory(self) -> int:
+        rss = current_rss()
+        if self.max_rss is not None and rss > self.max_rss:
+            gc.collect()
+            rss = current_rss()
+            if rss > self.max_rss:
+                raise StatementTooLargeError(
+                    f"Statement needs more than {self.max_rss // 2**20} MiB of memory"
+                )
+        return rss
 
     def _extract_table(
-        self, table: pdfplumber.table.Table
+        self, table: "pdfplumber.table.Table"
     ) -> Iterable[Sequence[ValueType]]:
         for row in table.extract():
             yield [cell.replace("\n", " ") if cell else None for cell in row]
@@ -108,10 +207,38 @@ class PDFStatementReader(BaseStatementReader):
 
 class XSLXStatementReader(BaseStatementReader):
     def iter_pages(self) -> Iterable[Iterable[Sequence[ValueType]]]:
+        import openpyxl
+
         wb = openpyxl.load_workbook(self.data, data_only=True, read_only=True)
         for sheet in wb.worksheets:
             yield self._extract_sheet(sheet)
 
-    def _extract_sheet(self, sheet: Worksheet) -> Iterable[Sequence[ValueType]]:
+    def _extract_sheet(self, sheet: "Worksheet") -> Iterable[Sequence[ValueType]]:
         for row in sheet.iter_rows(values_only=True):
             yield [cell if isinstance(cell, ValueType) else str(cell) for cell in row]
+
+
+def sample_rows(
+    rows: Iterable[Sequence[ValueType]], size: int
+) -> list[Sequence[ValueType]]:
+    """
+    Sample at most `size` rows: a third each from the head, the tail and
+    (reservoir-sampled) the middle, keeping the original order.
+    """
+    rows_iter = iter(rows)
+    part_size = size // 3
+    head = list(islice(rows_iter, size - 2 * part_size))
+    tail: deque[tuple[int, Sequence[ValueType]]] = deque()
+    middle: list[tuple[int, Sequence[ValueType]]] = []
+    rnd = random.Random(0)  # deterministic guesses for the same file
+    for seen, row in enumerate(rows_iter):
+        tail.append((seen, row))
+        if len(tail) > part_size:
+            # the oldest tail row is offered to the middle reservoir
+            dropped = tail.popleft()
+            if len(middle) < part_size:
+                middle.append(dropped)
+            elif (pos := rnd.randrange(dropped[0] + 1)) < part_size:
+                middle[pos] = dropped
+    middle.sort(key=lambda x: x[0])
+    return head + [row for _, row in middle] + [row for _, row in tail]
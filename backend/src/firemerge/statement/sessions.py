@@ -0,0 +1,246 @@
+"""Server-side storage of parsed statements between requests."""
+
+import asyncio
+import logging
+import os
+import pickle
+import secrets
+import shutil
+import tempfile
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from math import ceil
+from pathlib import Path
+from time import monotonic
+from typing import TYPE_CHECKING, NamedTuple, Optional
+
+from pydantic import TypeAdapter
+
+from firemerge.model.api import StatementTransaction
+from firemerge.statement.batch import StatementBatch
+
+if TYPE_CHECKING:
+    # Imported only where REDIS_URL is set
+    from redis.asyncio import Redis
+
+logger = logging.getLogger("uvicorn.error")
+
+# Seconds a session lives after its last use.
+STATEMENT_SESSION_TTL = float(os.getenv("STATEMENT_SESSION_TTL", "3600"))
+# Sessions kept in memory; older ones are moved to disk.
+STATEMENT_SESSION_MEMORY = int(os.getenv("STATEMENT_SESSION_MEMORY_MB", "256")) * 2**20
+# Sessions kept on disk; older ones are dropped.
+STATEMENT_SESSION_DISK = int(os.getenv("STATEMENT_SESSION_DISK_MB", "1024")) * 2**20
+REDIS_KEY_PREFIX = "firemerge:session:"
+
+_REDIS_SESSION = TypeAdapter(tuple[int, list[StatementTransaction]])
+
+
+class StatementTooLargeForSessionError(ValueError):
+    pass
+
+
+class StatementSession(NamedTuple):
+    account_id: int
+    statement: StatementBatch
+
+
+class _Entry(NamedTuple):
+    account_id: int
+    expires_at: float
+    size: int
+    data: bytes | None  # in memory
+    path: Path | None  # on disk
+
+
+class StatementSessions(ABC):
+    """
+    Parsed statements by session id, so clients don't send them back.
+
+    Sessions expire `ttl` seconds after their last use.
+    """
+
+    # Whether all web workers see the same sessions
+    shared: bool
+
+    def __init__(self, ttl: float = STATEMENT_SESSION_TTL):
+        self.ttl = ttl
+
+    @abstractmethod
+    async def put(self, account_id: int, statement: StatementBatch) -> str:
+        """Store the statement, returns the new session id"""
+
+    @abstractmethod
+    async def get(self, session_id: str) -> Optional[StatementSession]: ...
+
+    @abstractmethod
+    async def delete(self, session_id: str) -> bool: ...
+
+    async def close(self) -> None:
+        pass
+
+
+class LocalStatementSessions(StatementSessions):
+    """
+    Sessions of one web worker, in its memory and on local disk.
+
+    Statements are kept pickled, which makes their size exact and moving them
+    to disk trivial. The least recently used sessions are moved to disk
+    once the memory budget is exceeded, and dropped once the disk budget is.
+    """
+
+    shared = False
+
+    def __init__(
+        self,
+        ttl: float = STATEMENT_SESSION_TTL,
+        max_memory: int = STATEMENT_SESSION_MEMORY,
+        max_disk: int = STATEMENT_SESSION_DISK,
+    ):
+        super().__init__(ttl)
+        self.max_memory = max_memory
+        self.max_disk = max_disk
+        self._directory: Path | None = None
+        self._entries: OrderedDict[str, _Entry] = OrderedDict()
+        self._memory = 0
+        self._disk = 0
+        self._lock = asyncio.Lock()
+
+    async def put(self, account_id: int, statement: StatementBatch) -> str:
+        data = pickle.dumps(statement, protocol=pickle.HIGHEST_PROTOCOL)
+        if len(data) > max(self.max_memory, self.max_disk):
+            raise StatementTooLargeForSessionError(
+                f"Statement of {len(data)} bytes does not fit the session storage"
+            )
+        async with self._lock:
+            await self._expire()
+            session_id = secrets.token_urlsafe(16)
+            self._entries[session_id] = _Entry(
+                account_id, monotonic() + self.ttl, len(data), data, None
+            )
+            self._memory += len(data)
+            await self._shrink()
+        return session_id
+
+    async def get(self, session_id: str) -> Optional[StatementSession]:
+        async with self._lock:
+            await self._expire()
+            if (entry := self._entries.get(session_id)) is None:
+                return None
+            if entry.data is not None:
+                data = entry.data
+            else:
+                assert entry.path is not None
+                data = await asyncio.to_thread(entry.path.read_bytes)
+            self._entries[session_id] = entry._replace(
+                expires_at=monotonic() + self.ttl
+            )
+            self._entries.move_to_end(session_id)
+        return StatementSession(entry.account_id, pickle.loads(data))
+
+    async def delete(self, session_id: str) -> bool:
+        async with self._lock:
+            if (entry := self._entries.pop(session_id, None)) is None:
+                return False
+            await self._release(entry)
+        return True
+
+    async def close(self) -> None:
+        async with self._lock:
+            self._entries.clear()
+            self._memory = self._disk = 0
+            if self._directory is not None:
+                await asyncio.to_thread(
+                    shutil.rmtree, self._directory, ignore_errors=True
+                )
+                self._directory = None
+
+    # The helpers below run with the lock held, so the file operations they
+    # leave to threads don't interleave with other changes of the entries
+
+    async def _expire(self) -> None:
+        now = monotonic()
+        expired = [sid for sid, e in self._entries.items() if e.expires_at <= now]
+        for session_id in expired:
+            await self._release(self._entries.pop(session_id))
+
+    async def _shrink(self) -> None:
+        for session_id, entry in list(self._entries.items()):
+            if self._memory <= self.max_memory:
+                break
+            if entry.data is None:
+                continue
+            self._memory -= entry.size
+            if entry.size > self.max_disk:
+                del self._entries[session_id]
+                continue
+            path = self._session_dir() / session_id
+            await asyncio.to_thread(path.write_bytes, entry.data)
+            self._disk += entry.size
+            self._entries[session_id] = entry._replace(data=None, path=path)
+
+        for session_id, entry in list(self._entries.items()):
+            if self._disk <= self.max_disk:
+                break
+            if entry.path is not None:
+                logger.info("Dropping statement session %s to free disk", session_id)
+                await self._release(self._entries.pop(session_id))
+
+    async def _release(self, entry: _Entry) -> None:
+        if entry.data is not None:
+            self._memory -= entry.size
+        if entry.path is not None:
+            self._disk -= entry.size
+            await asyncio.to_thread(entry.path.unlink, missing_ok=True)
+
+    def _session_dir(self) -> Path:
+        if self._directory is None:
+            self._directory = Path(tempfile.mkdtemp(prefix="firemerge-sessions-"))
+        return self._directory
+
+
+class RedisStatementSessions(StatementSessions):
+    """
+    Sessions shared by all web workers using the same Redis server.
+
+    Sessions are stored as JSON `[account_id, [transaction, ...]]` rather than
+    pickled, so whoever can write to Redis can't run code in the workers.
+    """
+
+    shared = True
+
+    def __init__(
+        self,
+        redis: "Redis",
+        ttl: float = STATEMENT_SESSION_TTL,
+        max_size: int = STATEMENT_SESSION_MEMORY,
+    ):
+        super().__init__(ttl)
+        self.max_size = max_size
+        self._redis = redis
+
+    async def put(self, account_id: int, statement: StatementBatch) -> str:
+        data = b"[%d,%s]" % (account_id, statement.dump_json())
+        if len(data) > self.max_size:
+            raise StatementTooLargeForSessionError(
+                f"Statement of {len(data)} bytes does not fit the session storage"
+            )
+        session_id = secrets.token_urlsafe(16)
+        await self._redis.set(REDIS_KEY_PREFIX + session_id, data, ex=ceil(self.ttl))
+        return session_id
+
+    async def get(self, session_id: str) -> Optional[StatementSession]:
+        data = await self._redis.getex(REDIS_KEY_PREFIX + session_id, ex=ceil(self.ttl))
+        if data is None:
+            return None
+        account_id, transactions = _REDIS_SESSION.validate_json(data)
+        return StatementSession(account_id, StatementBatch.from_models(transactions))
+
+    async def delete(self, session_id: str) -> bool:
+        return await self._redis.delete(REDIS_KEY_PREFIX + session_id) > 0
+
+
+def create_statement_sessions(redis: Optional["Redis"]) -> StatementSessions:
+    if redis is not None:
+        return RedisStatementSessions(redis)
+    return LocalStatementSessions()
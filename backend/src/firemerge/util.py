@@ -1,8 +1,14 @@
+import os
+import resource
+import sys
 from typing import Any, AsyncIterable, Callable, Coroutine, ParamSpec, TypeVar
 
 T = TypeVar("T")
 P = ParamSpec("P")
 
+# Reports progress of a long operation: a counter name and its value.
+ProgressCallback = Callable[[str, int], None]
+
 
 def async_collect(
     f: Callable[P, AsyncIterable[T]],
@@ -15,3 +21,18 @@ def async_collect(
         return [x async for x in f(*args, **kwargs)]
 
     return wrapper
+
+
+def current_rss() -> int:
+    """
+    Return the resident set size of the process in bytes.
+
+    Falls back to the peak RSS where /proc is not available.
+    """
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # kilobytes on Linux, bytes on macOS
+        return peak if sys.platform == "darwin" else peak * 1024
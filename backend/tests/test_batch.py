@@ -0,0 +1,92 @@
+import pickle
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from zoneinfo import ZoneInfo
+
+import pytest
+from pydantic import TypeAdapter
+
+from firemerge.model.api import StatementTransaction
+from firemerge.statement.batch import StatementBatch
+
+TRANSACTIONS = [
+    StatementTransaction(
+        name='Сільпо "1"\n\\',
+        date=datetime(2025, 1, 1, 10, 30, tzinfo=ZoneInfo("Europe/Kyiv")),
+        amount=Decimal("-100.5"),
+        foreign_amount=None,
+        foreign_currency_code=None,
+        notes="Category: Food",
+    ),
+    StatementTransaction(
+        name="Netflix",
+        date=datetime(2025, 7, 1, 0, 0, 0, 120000, tzinfo=ZoneInfo("Europe/Kyiv")),
+        amount=Decimal("-1.005"),
+        foreign_amount=-12.3,
+        foreign_currency_code="USD",
+        notes="Category: Food",
+        fee="0.10",
+    ),
+    StatementTransaction(
+        name="Salary",
+        date=datetime(2025, 1, 2, tzinfo=ZoneInfo("UTC")),
+        amount=Decimal("1000"),
+        foreign_amount=Decimal("25"),
+        foreign_currency_code="USD",
+    ),
+    StatementTransaction(
+        name="Naive",
+        date=datetime(2025, 1, 3, 12),
+        amount=Decimal("0.01"),
+        foreign_amount=None,
+        foreign_currency_code=None,
+    ),
+    StatementTransaction(
+        name="Offset",
+        date=datetime(2025, 1, 3, 12, tzinfo=timezone(timedelta(hours=-3.5))),
+        amount=Decimal("-0.99"),
+        foreign_amount=None,
+        foreign_currency_code=None,
+    ),
+]
+
+
+@pytest.fixture
+def batch():
+    return StatementBatch.from_models(TRANSACTIONS)
+
+
+def test_dump_json_matches_pydantic(batch):
+    expected = TypeAdapter(list[StatementTransaction]).dump_json(TRANSACTIONS)
+    assert batch.dump_json() == expected
+
+
+def test_row_hash_matches_model(batch):
+    assert [batch.row_hash(idx) for idx in range(len(batch))] == [
+        tr.row_hash() for tr in TRANSACTIONS
+    ]
+
+
+def test_round_trip(batch):
+    models = batch.to_models()
+    assert len(models) == len(TRANSACTIONS)
+    for model, original in zip(models, TRANSACTIONS):
+        assert model.date == original.date
+        assert model.date.utcoffset() == original.date.utcoffset()
+        assert model.model_dump_json() == original.model_dump_json()
+    # amounts are kept in cents, rounded as Money is serialized
+    assert models[1].amount == Decimal("-1.00")
+    assert models[1].foreign_amount == Decimal("-12.30")
+
+
+def test_strings_are_shared(batch):
+    assert batch.notes[0] is batch.notes[1]
+    assert batch.foreign_currency_codes[1] is batch.foreign_currency_codes[2]
+
+
+def test_take_and_pickle(batch):
+    taken = pickle.loads(pickle.dumps(batch.take([2, 0])))
+    assert [tr.name for tr in taken] == ["Salary", TRANSACTIONS[0].name]
+    assert taken.dump_json() == TypeAdapter(list[StatementTransaction]).dump_json(
+        [TRANSACTIONS[2], TRANSACTIONS[0]]
+    )
@@ -0,0 +1,175 @@
+import asyncio
+from datetime import datetime, timezone
+from decimal import Decimal
+
+import pytest
+
+from firemerge import cache as cache_module
+from firemerge.api import deps as deps_module
+from firemerge.cache import MemoryCache
+from firemerge.firefly_client import FireflyClient
+from firemerge.model.firefly import Transaction, TransactionType
+
+
+@pytest.mark.asyncio
+async def test_memory_cache(monkeypatch):
+    now = 100.0
+    monkeypatch.setattr(cache_module, "monotonic", lambda: now)
+    cache = MemoryCache(max_size=2)
+    await cache.set("a", b"1", 10)
+    await cache.set("b", b"2", 20)
+    assert await cache.get("a") == b"1"
+    # "b" is the least recently used one
+    await cache.set("c", b"3", 10)
+    assert await cache.get("b") is None
+    await cache.delete("c")
+    assert await cache.get("c") is None
+    now = 110.0
+    assert await cache.get("a") is None
+    # a zero TTL disables caching
+    await cache.set("d", b"4", 0)
+    assert await cache.get("d") is None
+
+
+class _Client(FireflyClient):
+    def __init__(self, cache, token="token"):
+        super().__init__(None, "https://firefly.example", token, cache)
+        self.requests: list[str] = []
+        self.uploads: list[str] = []
+
+    async def _json_request(self, path, params=None, method="GET", json=None):
+        self.requests.append(path)
+        if path == "v1/accounts":
+            attributes = {"type": "asset", "name": "Cash", "currency_id": 1}
+            return {"data": [{"id": "1", "attributes": attributes}]}
+        if path == "v1/transactions":
+            transaction = {
+                "foreign_amount": None,
+                "foreign_currency_id": None,
+                **json["transactions"][0],
+                "destination_id": 2,
+            }
+            return {"data": {"id": "3", "attributes": {"transactions": [transaction]}}}
+        if path.startswith("v1/accounts/"):
+            attributes = {"type": "asset", "name": "Cash", "currency_id": 1}
+            return {"data": {"id": "1", "attributes": attributes}}
+        return {
+            "data": [
+                {
+                    "id": "1",
+                    "attributes": {"code": "USD", "name": "US Dollar", "symbol": "$"},
+                }
+            ],
+            "meta": {"pagination": {"total_pages": 1}},
+        }
+
+    async def _download_account_file(self, account_id, filename):
+        self.requests.append(filename)
+        return b"{}"
+
+    async def _upload_account_file(self, account_id, filename, title, content):
+        self.uploads.append(filename)
+
+
+@pytest.mark.asyncio
+async def test_client_cache(currency_usd):
+    cache = MemoryCache()
+    client = _Client(cache)
+    assert await client.get_currencies() == [currency_usd]
+    assert await client.get_currencies() == [currency_usd]
+    assert client.requests == ["v1/currencies"]
+
+    # clients with other credentials don't share entries
+    other = _Client(cache, token="other")
+    await other.get_currencies()
+    assert other.requests == ["v1/currencies"]
+
+    settings = await client.get_account_settings(1)
+    assert await client.get_account_settings(1) == settings
+    await client.update_account_settings(1, settings)
+    await client.get_account_settings(1)
+    assert client.requests[1:] == ["firemerge-settings.json"] * 2
+
+
+@pytest.mark.asyncio
+async def test_store_invalidates_balances():
+    client = _Client(MemoryCache())
+    await client.get_accounts()
+    await client.get_account(1)
+    await client.get_account(2)
+    client.requests.clear()
+    await client.store_transaction(
+        Transaction(
+            id=None,
+            type=TransactionType.Withdrawal,
+            date=datetime(2024, 1, 1, tzinfo=timezone.utc),
+            amount=Decimal("-10"),
+            description="Coffee",
+            currency_id=1,
+            foreign_amount=None,
+            foreign_currency_id=None,
+            source_id=1,
+            destination_name="Cafe",
+        )
+    )
+    # both accounts and the list show balances fetched after the store
+    await client.get_accounts()
+    await client.get_account(1)
+    await client.get_account(2)
+    assert client.requests == [
+        "v1/transactions",
+        "v1/accounts",
+        "v1/accounts/1",
+        "v1/accounts/2",
+    ]
+
+
+@pytest.mark.asyncio
+async def test_refresh_cache(currency_usd):
+    client = _Client(MemoryCache())
+    await client.refresh_cache()
+    warmed = sorted(client.requests)
+    assert warmed == [
+        "firemerge-settings.json",
+        "v1/accounts",
+        "v1/accounts/1",
+        "v1/categories",
+        "v1/currencies",
+    ]
+
+    # everything a request needs is served from the cache now
+    client.requests.clear()
+    assert await client.get_currencies() == [currency_usd]
+    account = (await client.get_accounts())[0]
+    assert await client.get_account(account.id) == account
+    await client.get_account_settings(account.id)
+    await client.get_categories()
+    assert client.requests == []
+
+    # refreshing fetches again, unlike an expired entry there's no miss
+    await client.refresh_cache()
+    assert sorted(client.requests) == sorted(set(warmed) - {"v1/accounts/1"})
+
+
+@pytest.mark.asyncio
+async def test_keep_cache_warm(monkeypatch):
+    monkeypatch.setattr(deps_module, "CACHE_WARMUP", True)
+    monkeypatch.setattr(deps_module, "CACHE_REFRESH_INTERVAL", 0.01)
+    refreshed = asyncio.Event()
+
+    class Client:
+        calls = 0
+
+        async def refresh_cache(self):
+            self.calls += 1
+            if self.calls == 1:
+                assert not ready.is_set()
+                raise RuntimeError("Firefly III is down")
+            refreshed.set()
+
+    ready = asyncio.Event()
+    task = asyncio.create_task(deps_module.keep_cache_warm(Client(), ready))
+    # a failed warm-up doesn't keep the server from getting ready
+    await asyncio.wait_for(ready.wait(), 1)
+    await asyncio.wait_for(refreshed.wait(), 1)
+    task.cancel()
@@ -0,0 +1,32 @@
+from firemerge.statement.config_index import ConfigCandidate, ConfigIndex
+from firemerge.statement.config_repo import load_configs
+
+
+def _repo_index():
+    return ConfigIndex(
+        ConfigCandidate(label=config.label, account_id=None, parser_settings=config)
+        for config in load_configs()
+    )
+
+
+def test_match_exact_header():
+    aval = next(c for c in load_configs() if c.label == "Aval Business")
+    header = ";".join(c.name for c in aval.columns)
+    content = f"Statement for 2025\n\n{header}\n1;2;3\n".encode("cp1251")
+
+    matches = _repo_index().match(content)
+
+    assert [(m.label, m.score) for m in matches] == [("Aval Business", 1.0)]
+
+
+def test_match_partial_header():
+    content = "Дата операції;Дебет;Кредит;Примітка\n".encode("cp1251")
+
+    matches = _repo_index().match(content)
+
+    assert [m.label for m in matches] == ["Aval Business"]
+    assert 0 < matches[0].score < 1
+
+
+def test_match_unknown_format():
+    assert _repo_index().match(b"%PDF-1.4 not really a pdf") == []
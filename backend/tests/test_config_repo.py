@@ -0,0 +1,15 @@
+from unittest.mock import patch
+
+from firemerge.statement import config_repo
+
+
+def test_registry_reloads_on_change():
+    registry = config_repo.get_registry()
+    assert config_repo.get_registry() is registry
+    assert registry.configs["privat24.yaml"].header[0] == "Дата"
+
+    with patch.object(config_repo, "_directory_signature", return_value=()):
+        reloaded = config_repo.get_registry()
+
+    assert reloaded is not registry
+    assert reloaded.etag == registry.etag  # same content
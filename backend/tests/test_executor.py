@@ -0,0 +1,103 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from firemerge.statement import executor as executor_module
+from firemerge.statement.executor import (
+    BoundedExecutor,
+    ClientDisconnectedError,
+    ExecutorBusyError,
+)
+
+
+@pytest.fixture
+def pool():
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        yield pool
+
+
+@pytest.mark.asyncio
+async def test_run(pool):
+    executor = BoundedExecutor(pool, 1, 1)
+    assert await executor.run(sum, [1, 2, 3]) == 6
+    # the slot is released once the work is done
+    assert await executor.run(sum, [1, 2]) == 3
+
+
+@pytest.mark.asyncio
+async def test_busy(pool):
+    executor = BoundedExecutor(pool, 1, 1)
+    release = threading.Event()
+    running = asyncio.create_task(executor.run(release.wait, 5))
+    await asyncio.sleep(0)
+    with pytest.raises(ExecutorBusyError):
+        await executor.run(sum, [1])
+    release.set()
+    assert await running is True
+
+
+@pytest.mark.asyncio
+async def test_cancel_queued_work(pool):
+    executor = BoundedExecutor(pool, 1, 2)
+    release = threading.Event()
+    started = []
+    running = asyncio.create_task(executor.run(release.wait, 5))
+    await asyncio.sleep(0)
+    queued = asyncio.create_task(executor.run(started.append, 1, timeout=0.05))
+    await asyncio.sleep(0.1)
+    # the deadline starts once a worker picks the work up
+    assert not queued.done()
+    queued.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await queued
+    release.set()
+    await running
+    # queued work was cancelled and both slots are free again
+    assert await executor.run(sum, [1]) == 1
+    assert await executor.run(sum, [2]) == 2
+    assert started == []
+
+
+@pytest.mark.asyncio
+async def test_client_disconnect(pool, monkeypatch):
+    monkeypatch.setattr(executor_module, "DISCONNECT_POLL_INTERVAL", 0.01)
+    executor = BoundedExecutor(pool, 1, 1)
+    release = threading.Event()
+
+    async def is_disconnected():
+        return True
+
+    with pytest.raises(ClientDisconnectedError):
+        await executor.run(release.wait, 5, is_disconnected=is_disconnected)
+    # abandoned work keeps its slot until it finishes
+    with pytest.raises(ExecutorBusyError):
+        await executor.run(sum, [1])
+    release.set()
+    await asyncio.sleep(0.05)
+    assert await executor.run(sum, [1]) == 1
+
+
+@pytest.mark.asyncio
+async def test_wait_and_deadline_from_start(pool):
+    executor = BoundedExecutor(pool, 1, 1)
+    release = threading.Event()
+    running = asyncio.create_task(executor.run(release.wait, 5))
+    await asyncio.sleep(0)
+    waiting = asyncio.create_task(executor.run(sum, [1], timeout=0.05, wait=True))
+    # queued longer than its timeout, which only runs once a worker has it
+    await asyncio.sleep(0.1)
+    assert not waiting.done()
+    release.set()
+    assert await running is True
+    assert await waiting == 1
+
+
+@pytest.mark.asyncio
+async def test_timeout(pool):
+    executor = BoundedExecutor(pool, 1, 1)
+    release = threading.Event()
+    with pytest.raises(TimeoutError):
+        await executor.run(release.wait, 5, timeout=0.05)
+    release.set()
@@ -1,11 +1,21 @@
 from datetime import datetime
+from io import BytesIO
+from typing import AsyncIterator
+from zipfile import ZipFile
 
 import pytest
 
 from firemerge.model.account_settings import ExportFieldType, ExportSettings
 from firemerge.model.common import Money
 from firemerge.model.firefly import Transaction, TransactionType
-from firemerge.statement.export import export_statement
+from firemerge.statement.export import (
+    StatementExport,
+    compile_export_settings,
+    export_statement,
+    iter_statement,
+    stream_statement,
+    stream_statement_bundle,
+)
 
 
 @pytest.fixture
@@ -77,12 +87,9 @@ def export_settings():
     )
 
 
-def test_export_statement(
-    account_primary, account_secondary, currency_usd, currency_eur, export_settings
-):
-    account_map = {acct.id: acct.name for acct in [account_primary, account_secondary]}
-    currency_map = {c.id: c.code for c in [currency_usd, currency_eur]}
-    transactions = [
+@pytest.fixture
+def transactions(account_primary, account_secondary, currency_usd, currency_eur):
+    return [
         Transaction(
             id=1,
             type=TransactionType.Deposit,
@@ -120,10 +127,128 @@ def test_export_statement(
             destination_id=2048,
         ),
     ]
+
+
+@pytest.fixture
+def account_map(account_primary, account_secondary):
+    return {acct.id: acct.name for acct in [account_primary, account_secondary]}
+
+
+@pytest.fixture
+def currency_map(currency_usd, currency_eur):
+    return {c.id: c.code for c in [currency_usd, currency_eur]}
+
+
+def test_export_statement(transactions, account_map, currency_map, export_settings):
     content = export_statement(transactions, account_map, currency_map, export_settings)
     assert content == (
-        "TAX_CODE,2021-01-01,150.00,,USD Account,USD\r\n"(
-            "TAX_CODE,2021-01-02,100.00,Currency Exchange,"
-            "USD Account,USD,EUR Account,EUR,0.90000\r\n"
+        "TAX_CODE,2021-01-01,150.00,,USD Account,USD\r\n"
+        "TAX_CODE,2021-01-02,100.00,Currency Exchange,"
+        "USD Account,USD,EUR Account,EUR,0.90000\r\n"
+    )
+
+
+def test_export_full_precision(
+    transactions, account_map, currency_map, export_settings
+):
+    transfer = Transaction.model_validate(
+        {
+            **transactions[1].model_dump(),
+            "amount": "1.005",
+            "foreign_amount": "1.2345",
+        }
+    )
+    content = export_statement([transfer], account_map, currency_map, export_settings)
+    # the rate of Firefly III amounts, not of amounts rounded to cents
+    assert content.endswith(",1.22836\r\n")
+
+
+def test_iter_statement_chunks(
+    transactions, account_map, currency_map, export_settings
+):
+    expected = export_statement(
+        transactions, account_map, currency_map, export_settings
+    )
+    chunks = list(
+        iter_statement(
+            transactions * 10, account_map, currency_map, export_settings, 100
+        )
+    )
+    assert len(chunks) > 1
+    assert all(len(chunk) >= 100 for chunk in chunks[:-1])
+    assert "".join(chunks) == expected * 10
+
+
+async def _fetch(transactions) -> AsyncIterator:
+    for tr in transactions:
+        yield tr
+
+
+@pytest.mark.asyncio
+async def test_stream_statement(
+    transactions, account_map, currency_map, export_settings
+):
+    chunks = [
+        chunk
+        async for chunk in stream_statement(
+            _fetch(transactions), account_map, currency_map, export_settings
+        )
+    ]
+    assert chunks == [
+        export_statement(transactions, account_map, currency_map, export_settings)
+    ]
+
+
+def test_compile_export_settings(
+    transactions, account_map, currency_map, export_settings
+):
+    plan = compile_export_settings(export_settings)
+    # plans are cached by the settings content
+    assert compile_export_settings(export_settings.model_copy(deep=True)) is plan
+    assert plan.format(transactions[0], account_map, currency_map) == [
+        "TAX_CODE",
+        "2021-01-01",
+        "150.00",
+        "",
+        "USD Account",
+        "USD",
+    ]
+    # withdrawals have no fields in the settings
+    assert plan.format(transactions[2], account_map, currency_map) is None
+
+
+@pytest.mark.asyncio
+async def test_stream_statement_bundle(
+    transactions, account_map, currency_map, export_settings
+):
+    statements = [
+        StatementExport("first.csv", _fetch(transactions * 100), export_settings),
+        StatementExport("second.csv", _fetch(transactions[:1]), export_settings),
+    ]
+    chunks = [
+        chunk
+        async for chunk in stream_statement_bundle(
+            statements, account_map, currency_map, prefetch=10
         )
+    ]
+    expected = export_statement(
+        transactions, account_map, currency_map, export_settings
     )
+    with ZipFile(BytesIO(b"".join(chunks))) as archive:
+        assert archive.namelist() == ["first.csv", "second.csv"]
+        assert archive.read("first.csv").decode() == expected * 100
+        assert archive.read("second.csv").decode() == expected.splitlines(True)[0]
+
+
+@pytest.mark.asyncio
+async def test_stream_statement_bundle_error(
+    transactions, account_map, currency_map, export_settings
+):
+    async def failing() -> AsyncIterator:
+        yield transactions[0]
+        raise RuntimeError("Firefly is down")
+
+    statements = [StatementExport("failing.csv", failing(), export_settings)]
+    with pytest.raises(RuntimeError, match="Firefly is down"):
+        async for _ in stream_statement_bundle(statements, account_map, currency_map):
+            pass
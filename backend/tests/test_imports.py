@@ -0,0 +1,22 @@
+import subprocess
+import sys
+
+
+def test_lazy_imports():
+    # A fresh interpreter, the tests themselves import the readers. All API
+    # modules rather than firemerge.main, which needs the built frontend.
+    script = (
+        "import importlib, pkgutil, sys, firemerge.api\n"
+        "for module in pkgutil.iter_modules(firemerge.api.__path__):\n"
+        "    importlib.import_module('firemerge.api.' + module.name)\n"
+        "print(*sorted(sys.modules))"
+    )
+    out = subprocess.run(
+        [sys.executable, "-c", script],
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout.split()
+    loaded = {name.partition(".")[0] for name in out}
+    for module in ("hidateinfer", "openpyxl", "pdfplumber", "redis", "thefuzz"):
+        assert module not in loaded
@@ -0,0 +1,118 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from firemerge.jobs import runner as runner_module
+from firemerge.jobs.runner import JobManager, JobQueueFullError, JobResult
+from firemerge.jobs.store import MemoryJobStore
+from firemerge.model.api import JobStatus
+
+
+@pytest.fixture
+def manager(monkeypatch):
+    monkeypatch.setattr(runner_module, "PROGRESS_INTERVAL", 0.01)
+    return JobManager(MemoryJobStore(), workers=1, max_pending=2)
+
+
+async def _finished(manager: JobManager, job_id: str):
+    async for job in manager.store.watch(job_id):
+        if job is not None and job.status.finished:
+            return job
+    raise AssertionError("job expired")
+
+
+@pytest.mark.asyncio
+async def test_job_result(manager):
+    async def run(progress):
+        progress("rows_parsed", 10)
+        await asyncio.sleep(0.05)
+        progress("rows_parsed", 20)
+        return JobResult(b"a,b\r\n", "text/csv", "statement.csv")
+
+    job = await manager.submit("test", run)
+    assert job.status is JobStatus.Pending
+
+    seen = [job async for job in manager.store.watch(job.id) if job is not None]
+    statuses = [job.status for job in seen]
+    assert statuses[-1] is JobStatus.Done
+    assert JobStatus.Running in statuses
+    # progress is saved while the job runs
+    assert {"rows_parsed": 10} in [job.progress for job in seen]
+    assert seen[-1].progress == {"rows_parsed": 20}
+    assert seen[-1].filename == "statement.csv"
+    assert await manager.store.get_result(job.id) == b"a,b\r\n"
+
+
+@pytest.mark.asyncio
+async def test_job_failure(manager):
+    async def run(progress):
+        raise HTTPException(status_code=400, detail="Account settings not found")
+
+    job = await _finished(manager, (await manager.submit("test", run)).id)
+    assert job.status is JobStatus.Failed
+    assert job.error == "Account settings not found"
+    assert await manager.store.get_result(job.id) is None
+
+
+@pytest.mark.asyncio
+async def test_job_queue(manager):
+    release = asyncio.Event()
+
+    async def run(progress):
+        await release.wait()
+        return JobResult(b"", "text/plain")
+
+    first = await manager.submit("test", run)
+    second = await manager.submit("test", run)
+    with pytest.raises(JobQueueFullError):
+        await manager.submit("test", run)
+    await asyncio.sleep(0.01)
+    # one worker, so the second job waits for the first
+    assert (await manager.store.get(first.id)).status is JobStatus.Running
+    assert (await manager.store.get(second.id)).status is JobStatus.Pending
+
+    assert await manager.cancel(second.id)
+    assert (await manager.store.get(second.id)).status is JobStatus.Cancelled
+    release.set()
+    assert (await _finished(manager, first.id)).status is JobStatus.Done
+    assert not await manager.cancel(first.id)
+
+
+@pytest.mark.asyncio
+async def test_watch_heartbeat_and_expiry():
+    store = MemoryJobStore(ttl=0)
+    manager = JobManager(store)
+    release = asyncio.Event()
+
+    async def run(progress):
+        await release.wait()
+        return JobResult(b"", "text/plain")
+
+    job = await manager.submit("test", run)
+    events = store.watch(job.id, heartbeat=0.01)
+    assert (await anext(events)).status is JobStatus.Pending
+    assert (await anext(events)).status is JobStatus.Running
+    assert await anext(events) is None
+    release.set()
+    assert (await anext(events)).status is JobStatus.Done
+    with pytest.raises(StopAsyncIteration):
+        await anext(events)
+    # finished jobs expire after the TTL
+    assert await store.get(job.id) is None
+
+
+@pytest.mark.asyncio
+async def test_process_progress():
+    progress = runner_module.ProcessProgress()
+    counters: dict[str, int] = {}
+    try:
+        async with progress.forward(counters.__setitem__) as remote:
+            remote("pages_read", 3)
+            for _ in range(100):
+                if counters:
+                    break
+                await asyncio.sleep(0.01)
+    finally:
+        progress.close()
+    assert counters == {"pages_read": 3}
@@ -0,0 +1,66 @@
+import gzip
+
+import pytest
+from fastapi import FastAPI, Response
+from fastapi.responses import StreamingResponse
+from fastapi.testclient import TestClient
+
+from firemerge.api import responses
+from firemerge.api.responses import CompressionMiddleware, negotiate_encoding
+
+
+@pytest.fixture
+def client():
+    app = FastAPI()
+    app.add_middleware(CompressionMiddleware, minimum_size=100)
+
+    @app.get("/json")
+    def json_body(size: int):
+        return Response(b"1" * size, media_type="application/json")
+
+    @app.get("/csv")
+    def csv_body():
+        return StreamingResponse(
+            (f"row,{idx}\r\n" * 100 for idx in range(3)), media_type="text/csv"
+        )
+
+    @app.get("/zip")
+    def zip_body():
+        return Response(b"PK" * 100, media_type="application/zip")
+
+    return TestClient(app)
+
+
+def test_negotiate_encoding(monkeypatch):
+    monkeypatch.setattr(responses, "brotli", object())
+    assert negotiate_encoding("gzip, deflate, br") == "br"
+    assert negotiate_encoding("gzip, br;q=0") == "gzip"
+    assert negotiate_encoding("identity") is None
+    monkeypatch.setattr(responses, "brotli", None)
+    assert negotiate_encoding("gzip, deflate, br") == "gzip"
+
+
+def _get(client, path):
+    # raw content, not decoded by the client
+    with client.stream("GET", path, headers={"Accept-Encoding": "gzip"}) as resp:
+        return resp, b"".join(resp.iter_raw())
+
+
+def test_compression(client):
+    resp, content = _get(client, "/json?size=1000")
+    assert resp.headers["content-encoding"] == "gzip"
+    assert resp.headers["content-length"] == str(len(content))
+    assert gzip.decompress(content) == b"1" * 1000
+
+    resp, content = _get(client, "/json?size=10")
+    assert "content-encoding" not in resp.headers
+    assert content == b"1" * 10
+
+    resp, content = _get(client, "/csv")
+    assert resp.headers["content-encoding"] == "gzip"
+    assert gzip.decompress(content).decode() == "".join(
+        f"row,{idx}\r\n" * 100 for idx in range(3)
+    )
+
+    resp, content = _get(client, "/zip")
+    assert "content-encoding" not in resp.headers
@@ -0,0 +1,127 @@
+import pickle
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+
+import pytest
+
+from firemerge.statement import sessions as sessions_module
+from firemerge.statement.batch import StatementBatch
+from firemerge.statement.sessions import (
+    LocalStatementSessions,
+    RedisStatementSessions,
+    StatementTooLargeForSessionError,
+)
+
+
+def _batch(rows: int) -> StatementBatch:
+    batch = StatementBatch()
+    for idx in range(rows):
+        batch.append(f"row {idx}", datetime(2025, 1, 1), Decimal("-1.00"))
+    return batch
+
+
+def _size(batch: StatementBatch) -> int:
+    return len(pickle.dumps(batch, protocol=pickle.HIGHEST_PROTOCOL))
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr(sessions_module, "monotonic", lambda: now[0])
+    return now
+
+
+@pytest.mark.asyncio
+async def test_put_get_delete():
+    sessions = LocalStatementSessions()
+    batch = _batch(3)
+    session_id = await sessions.put(7, batch)
+
+    session = await sessions.get(session_id)
+    assert session is not None
+    assert session.account_id == 7
+    assert session.statement.dump_json() == batch.dump_json()
+
+    assert await sessions.delete(session_id)
+    assert await sessions.get(session_id) is None
+    assert not await sessions.delete(session_id)
+
+
+@pytest.mark.asyncio
+async def test_ttl_is_extended_on_use(clock):
+    sessions = LocalStatementSessions(ttl=10)
+    session_id = await sessions.put(1, _batch(1))
+    clock[0] = 9
+    assert await sessions.get(session_id) is not None
+    clock[0] = 18
+    assert await sessions.get(session_id) is not None
+    clock[0] = 28
+    assert await sessions.get(session_id) is None
+
+
+@pytest.mark.asyncio
+async def test_spill_to_disk_and_drop():
+    size = _size(_batch(100))
+    sessions = LocalStatementSessions(max_memory=size, max_disk=size)
+    first = await sessions.put(1, _batch(100))
+    second = await sessions.put(1, _batch(100))
+    # the least recently used session was moved to disk
+    session = await sessions.get(first)
+    assert session is not None
+    assert len(session.statement) == 100
+
+    # ...and now `second` is the least recently used one, so it goes
+    await sessions.put(1, _batch(100))
+    assert await sessions.get(second) is None
+    assert await sessions.get(first) is not None
+
+    directory = sessions._directory
+    assert directory is not None and any(directory.iterdir())
+    await sessions.close()
+    assert not directory.exists()
+
+
+@pytest.mark.asyncio
+async def test_too_large():
+    sessions = LocalStatementSessions(max_memory=10, max_disk=10)
+    with pytest.raises(StatementTooLargeForSessionError):
+        await sessions.put(1, _batch(10))
+
+
+class _Redis:
+    def __init__(self):
+        self.data: dict[str, bytes] = {}
+
+    async def set(self, key, value, ex):
+        self.data[key] = value
+
+    async def getex(self, key, ex):
+        return self.data.get(key)
+
+    async def delete(self, key):
+        return int(self.data.pop(key, None) is not None)
+
+
+@pytest.mark.asyncio
+async def test_redis_sessions_store_json():
+    redis = _Redis()
+    sessions = RedisStatementSessions(redis)
+    batch = _batch(2)
+    batch.append(
+        "foreign",
+        datetime(2025, 1, 2, tzinfo=timezone(timedelta(hours=2))),
+        Decimal("-1.50"),
+        Decimal("-1.40"),
+        "EUR",
+        "notes",
+    )
+    session_id = await sessions.put(7, batch)
+
+    [data] = redis.data.values()
+    assert data.startswith(b"[7,[{")
+    session = await sessions.get(session_id)
+    assert session is not None
+    assert session.account_id == 7
+    assert session.statement.dump_json() == batch.dump_json()
+    assert await sessions.delete(session_id)
+    assert await sessions.get(session_id) is None
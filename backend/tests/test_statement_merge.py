@@ -0,0 +1,137 @@
+from contextlib import asynccontextmanager
+from datetime import date, datetime, time, timedelta, timezone
+from decimal import Decimal
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from firemerge.api import statement as statement_module
+from firemerge.api.statement import MergePrefetch
+from firemerge.model.account_settings import AccountSettings
+from firemerge.model.firefly import Transaction, TransactionType
+from firemerge.statement.batch import StatementBatch
+
+TODAY = date.today()
+
+
+def _at(day: date) -> datetime:
+    return datetime.combine(day, time(12), tzinfo=timezone.utc)
+
+
+def _batch(*days: date) -> StatementBatch:
+    batch = StatementBatch()
+    for day in days:
+        batch.append("Coffee", _at(day), Decimal("-10.00"))
+    return batch
+
+
+class _Client:
+    """Firefly III with withdrawals at each end of every requested range"""
+
+    def __init__(self, account, currency):
+        self.account = account
+        self.currency = currency
+        self.ranges: list[tuple[date, date]] = []
+        # withdrawals on other days
+        self.days: list[date] = []
+
+    async def get_transactions(self, account_id, start, end, progress=None):
+        self.ranges.append((start, end))
+        return [
+            Transaction(
+                id=day.toordinal(),
+                type=TransactionType.Withdrawal,
+                date=_at(day),
+                amount=Decimal("10"),
+                description="Coffee",
+                currency_id=self.currency.id,
+                foreign_amount=None,
+                foreign_currency_id=None,
+                source_id=account_id,
+                destination_name="Cafe",
+            )
+            for day in (start, *self.days, end)
+            if start <= day <= end
+        ]
+
+    async def get_account(self, account_id):
+        return self.account
+
+    async def get_account_settings(self, account_id):
+        return AccountSettings()
+
+    async def get_currencies(self):
+        return [self.currency]
+
+    async def get_account_watermark(self, account_id):
+        return None
+
+    async def update_account_watermark(self, account_id, watermark):
+        pass
+
+
+@pytest.fixture
+def client(account_primary, currency_usd):
+    return _Client(account_primary, currency_usd)
+
+
+@pytest.mark.asyncio
+async def test_prefetch_extends_before_window(client):
+    prefetch = MergePrefetch.start(client, 1)
+    # a statement older than the prefetched window
+    old = TODAY - timedelta(days=3 * 365)
+    transactions = await prefetch.complete(client, 1, _batch(old))
+
+    assert client.ranges == [
+        (prefetch.start_date, prefetch.end_date),
+        (old - timedelta(days=365), prefetch.start_date - timedelta(days=1)),
+    ]
+    # only the range /transactions/ would merge the statement with
+    assert [tr.date.date() for tr in transactions] == [old - timedelta(days=365)]
+
+
+@pytest.mark.asyncio
+async def test_prefetch_extends_after_window(client):
+    prefetch = MergePrefetch.start(client, 1)
+    future = TODAY + timedelta(days=5)
+    transactions = await prefetch.complete(client, 1, _batch(future))
+
+    assert client.ranges == [
+        (prefetch.start_date, prefetch.end_date),
+        (prefetch.end_date + timedelta(days=1), future + timedelta(days=1)),
+    ]
+    assert sorted(tr.date.date() for tr in transactions) == [
+        prefetch.end_date,
+        prefetch.end_date + timedelta(days=1),
+        future + timedelta(days=1),
+    ]
+
+
+def test_merge_endpoint(client, monkeypatch):
+    old = TODAY - timedelta(days=3 * 365)
+    client.days.append(old)
+
+    async def parse(*args, **kwargs):
+        return _batch(old)
+
+    monkeypatch.setattr(statement_module, "parse_account_statement", parse)
+
+    @asynccontextmanager
+    async def lifespan(app):
+        yield {"firefly_client": client, "parse_executor": None}
+
+    app = FastAPI(lifespan=lifespan)
+    app.include_router(statement_module.router)
+    with TestClient(app) as http:
+        resp = http.post(
+            "/statement/merge",
+            params={"account_id": 1, "timezone": "UTC"},
+            files={"file": ("statement.csv", b"")},
+        )
+    assert resp.status_code == 200
+    # the statement row is matched with the transaction fetched for its range
+    [merged] = resp.json()
+    assert merged["id"] == str(old.toordinal())
+    assert merged["state"] == "matched"
+    assert len(client.ranges) == 2
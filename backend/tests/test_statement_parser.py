@@ -4,10 +4,13 @@ from unittest.mock import patch
 
 import pytest
 
-from firemerge.model.account_settings import AccountSettings
+from firemerge.model.account_settings import AccountSettings, StatementParserSettings
 from firemerge.model.api import StatementTransaction
 from firemerge.model.common import Money
+from firemerge.statement.blacklist import BlacklistMatcher
 from firemerge.statement.config_repo import load_config
+from firemerge.statement.decoder import compile_date_format
+from firemerge.statement.join import join_rows
 from firemerge.statement.parser import StatementParser
 from firemerge.statement.reader import BaseStatementReader, ValueType
 
@@ -88,6 +91,9 @@ def test_statement_aval(account_primary, utc, currency_usd):
         ),
     ]
 
+    with patch.object(parser, "_create_reader", return_value=reader):
+        assert parser.parse_batch().to_models() == transactions
+
 
 @pytest.fixture
 def aval_reader(iban_primary, iban_secondary):
@@ -329,3 +335,162 @@ def test_statement_privat(account_primary, utc, currency_usd):
             notes="Category: Reimbursement\nDescription: Uncle Joe",
         ),
     ]
+
+
+def test_statement_remaining_balance_sign(account_primary, utc, currency_usd):
+    reader = MockReader(
+        data=[
+            ["Date", "Description", "Amount", "Balance"],
+            ["19.08.2025 12:00", "WalMart", "100,00", "300,00"],
+            ["19.08.2025 10:00", "Uncle Joe", "200,00", "400,00"],
+            ["18.08.2025 10:00", "Opening", "0,00", "200,00"],
+        ]
+    )
+    settings = StatementParserSettings.model_validate(
+        {
+            "format": {"format": "pdf"},
+            "date_format": "%d.%m.%Y %H:%M",
+            "decimal_separator": ",",
+            "columns": [
+                {"name": "Date", "role": "date"},
+                {"name": "Description", "role": "name"},
+                {"name": "Amount", "role": "amount"},
+                {"name": "Balance", "role": "remaining_balance"},
+            ],
+        }
+    )
+    parser = StatementParser(
+        None,
+        account_primary,
+        utc,
+        AccountSettings(parser_settings=settings),
+        currency_usd,
+    )
+    with patch.object(parser, "_create_reader", return_value=reader):
+        transactions = list(parser.parse())
+
+    assert [(tr.name, tr.amount) for tr in transactions] == [
+        ("WalMart", Money("-100.00")),
+        ("Uncle Joe", Money("200.00")),
+    ]
+
+
+@pytest.mark.parametrize(
+    "date_format, value",
+    [
+        ("%d.%m.%Y %H:%M:%S", "19.08.2025 12:00:05"),
+        ("%d.%m.%Y %H:%M", "9.8.2025 7:05"),
+        ("%Y%m%d", "2025131"),  # strptime splits this as 2025-01-31
+        ("%d/%m/%y", "01/02/69"),
+        ("%d %b %Y", "19 Aug 2025"),  # unsupported directive, strptime only
+    ],
+)
+def test_compile_date_format(date_format, value):
+    assert compile_date_format(date_format)(value) == datetime.strptime(
+        value, date_format
+    )
+
+
+@pytest.mark.parametrize("value", ["32.08.2025 12:00", "19.08.2025", "garbage"])
+def test_compile_date_format_invalid(value):
+    with pytest.raises(ValueError):
+        compile_date_format("%d.%m.%Y %H:%M")(value)
+
+
+def test_join_rows_spill():
+    # counterparts are marked with "C", own rows with "O"
+    rows = [["C", f"doc{i}"] for i in range(10)] + [
+        ["O", "doc1"],
+        ["O", "doc8"],
+        ["O", ""],
+        ["O", "doc10"],
+        ["C", "doc10"],
+        ["O", "doc11"],
+        *(["C", f"x{i}"] for i in range(5)),
+        ["C", "doc11"],
+        ["O", "doc12"],
+        ["C", "y"],
+    ]
+    joined = list(
+        join_rows(
+            rows, 1, lambda row: row[0] == "C", window=1, max_hold=10, memory_rows=2
+        )
+    )
+
+    assert [row for row, _ in joined] == rows
+    assert [(row, partner) for row, partner in joined if row[0] == "O"] == [
+        (["O", "doc1"], ["C", "doc1"]),  # spilled to disk
+        (["O", "doc8"], ["C", "doc8"]),  # spilled to disk
+        (["O", ""], None),
+        (["O", "doc10"], ["C", "doc10"]),  # look-ahead
+        (["O", "doc11"], ["C", "doc11"]),  # held back beyond look-ahead window
+        (["O", "doc12"], None),  # no counterpart at all
+    ]
+
+
+def test_join_rows_bounded_hold():
+    # every own row has a doc number, only every 10th has a counterpart,
+    # some close behind it and one too far behind to be held for
+    rows: list[list[str]] = []
+    for i in range(5000):
+        rows.append(["O", f"doc{i}"])
+        if i % 10 == 5:
+            rows.append(["C", f"doc{i - 2}"])
+    rows.insert(rows.index(["O", "doc2000"]) + 100, ["C", "doc2000"])
+
+    read = 0
+    held = 0
+
+    def source():
+        nonlocal read
+        for row in rows:
+            read += 1
+            yield row
+
+    joined = []
+    for row, partner in join_rows(
+        source(), 1, lambda row: row[0] == "C", window=5, max_hold=20
+    ):
+        held = max(held, read - len(joined))
+        joined.append((row, partner))
+
+    assert held <= 21
+    assert [row for row, _ in joined] == rows
+    partners = {row[1]: partner for row, partner in joined if row[0] == "O"}
+    assert partners["doc3"] == ["C", "doc3"]  # held back beyond look-ahead window
+    assert partners["doc4"] is None
+    assert partners["doc2000"] is None  # counterpart beyond max_hold
+    assert sum(partner is not None for partner in partners.values()) == 500
+
+
+@pytest.mark.parametrize(
+    "blacklist, text, expected",
+    [
+        ([], "Anything", False),
+        (["netflix"], "Category: Entertainment\nDescription: NETFLIX.COM", True),
+        (["he", "she", "hers"], "usher", True),
+        (["abcd", "bc"], "xabcx", True),  # reached via failure link
+        (["abcd"], "abcabd", False),
+        ([""], "Anything", True),
+    ],
+)
+def test_blacklist_matcher(blacklist, text, expected):
+    assert BlacklistMatcher(blacklist).matches(text) is expected
+
+
+def test_guess_header_sample():
+    header = ["Date", "Description", "Amount"]
+    reader = MockReader(
+        data=[["Statement"], header]
+        + [["19.08.2025", f"Row {i}", str(i)] for i in range(1000)]
+    )
+
+    guessed_header, *rows = reader.guess_header(sample_size=9)
+
+    assert guessed_header == header
+    assert len(rows) == 9
+    assert [row[1] for row in rows[:3]] == ["Row 0", "Row 1", "Row 2"]
+    assert [row[1] for row in rows[-3:]] == ["Row 997", "Row 998", "Row 999"]
+    # middle rows are sampled in order
+    middle = [int(str(row[2])) for row in rows[3:6]]
+    assert middle == sorted(middle) and 3 <= middle[0] and middle[-1] < 997
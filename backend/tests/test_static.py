@@ -0,0 +1,72 @@
+import gzip
+import os
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from firemerge.api.static import (
+    IMMUTABLE_CACHE_CONTROL,
+    REVALIDATE_CACHE_CONTROL,
+    StaticAssets,
+)
+
+INDEX = b"<html>index</html>"
+BUNDLE = b"console.log('bundle');" * 10
+
+
+@pytest.fixture
+def dist(tmp_path):
+    (tmp_path / "assets").mkdir()
+    (tmp_path / "index.html").write_bytes(INDEX)
+    (tmp_path / "assets" / "index-abc123.js").write_bytes(BUNDLE)
+    (tmp_path / "assets" / "index-abc123.js.gz").write_bytes(gzip.compress(BUNDLE))
+    return tmp_path
+
+
+@pytest.fixture
+def client(dist):
+    app = FastAPI()
+    app.mount("/", StaticAssets(str(dist)))
+    return TestClient(app)
+
+
+def test_index(client):
+    resp = client.get("/")
+    assert resp.status_code == 200
+    assert resp.content == INDEX
+    assert resp.headers["content-type"].startswith("text/html")
+    assert resp.headers["cache-control"] == REVALIDATE_CACHE_CONTROL
+
+    resp = client.get("/", headers={"If-None-Match": resp.headers["etag"]})
+    assert resp.status_code == 304
+
+
+def test_precompressed(client):
+    resp = client.get("/assets/index-abc123.js", headers={"Accept-Encoding": "gzip"})
+    assert resp.status_code == 200
+    assert resp.headers["content-encoding"] == "gzip"
+    assert resp.headers["cache-control"] == IMMUTABLE_CACHE_CONTROL
+    assert resp.headers["vary"] == "Accept-Encoding"
+    assert resp.content == BUNDLE
+
+    resp = client.get("/assets/index-abc123.js", headers={"Accept-Encoding": "br"})
+    assert "content-encoding" not in resp.headers
+    assert resp.content == BUNDLE
+
+    # the variants are not assets of their own
+    assert client.get("/assets/index-abc123.js.gz").status_code == 404
+
+
+def test_not_found_and_rebuild(client, dist):
+    assert client.get("/assets/index-def456.js").status_code == 404
+    assert client.post("/").status_code == 405
+
+    # a rebuild replaces the bundles
+    (dist / "assets" / "index-def456.js").write_bytes(BUNDLE)
+    (dist / "index.html").unlink()
+    (dist / "index.html").write_bytes(INDEX * 2)
+    stat = os.stat(dist)
+    os.utime(dist, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1))
+    assert client.get("/assets/index-def456.js").content == BUNDLE
+    assert client.get("/").content == INDEX * 2
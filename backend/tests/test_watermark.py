@@ -0,0 +1,77 @@
+from datetime import datetime, timedelta
+
+from firemerge.merge import advance_watermark, skip_processed
+from firemerge.model.api import (
+    StatementTransaction,
+    StatementWatermark,
+    TransactionState,
+)
+from firemerge.model.common import Money
+from firemerge.statement.batch import StatementBatch
+
+
+def _row(name, day, hour=12):
+    return StatementTransaction(
+        name=name,
+        date=datetime(2025, 8, day, hour),
+        amount=Money("-10.00"),
+        foreign_amount=None,
+        foreign_currency_code=None,
+    )
+
+
+def test_advance_watermark():
+    statement = StatementBatch.from_models(
+        [_row("d", 19), _row("c", 18), _row("b", 17), _row("a", 10)]
+    )
+    states = [
+        TransactionState.New,
+        TransactionState.Matched,
+        TransactionState.Matched,
+        TransactionState.Matched,
+    ]
+
+    watermark = advance_watermark(None, statement, states)
+
+    assert watermark is not None
+    assert watermark.date == datetime(2025, 8, 18, 12)
+    assert set(watermark.row_hashes) == {
+        _row("c", 18).row_hash(),
+        _row("b", 17).row_hash(),
+    }
+    assert advance_watermark(watermark, statement, states) is None
+
+
+def test_advance_watermark_same_date():
+    statement = StatementBatch.from_models([_row("b", 18), _row("a", 18)])
+    states = [TransactionState.Matched, TransactionState.Annotated]
+
+    assert advance_watermark(None, statement, states) is None
+
+
+def test_watermark_is_processed():
+    watermark = StatementWatermark(
+        date=datetime(2025, 8, 18, 12),
+        overlap=timedelta(days=3),
+        row_hashes=[_row("c", 18).row_hash()],
+    )
+
+    assert watermark.is_processed(_row("a", 10))
+    assert watermark.is_processed(_row("c", 18))
+    # posted late by the bank, within the overlap
+    assert not watermark.is_processed(_row("late", 17))
+    assert not watermark.is_processed(_row("d", 19))
+
+
+def test_skip_processed():
+    watermark = StatementWatermark(
+        date=datetime(2025, 8, 18, 12),
+        overlap=timedelta(days=3),
+        row_hashes=[_row("c", 18).row_hash()],
+    )
+    statement = StatementBatch.from_models(
+        [_row("d", 19), _row("c", 18), _row("late", 17), _row("a", 10)]
+    )
+
+    assert [tr.name for tr in skip_processed(statement, watermark)] == ["d", "late"]
+    assert skip_processed(statement, None) is statement
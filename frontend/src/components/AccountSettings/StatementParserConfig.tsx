@@ -19,11 +19,15 @@ import type {
   StatementFormat,
   StatementFormatSettingsCSV,
   RepoStatementParserSettings,
+  StatementParserSettingsMatch,
 } from '../../types/backend';
 import { columnRoles, dateFormats, encodings, separators } from './utils/settingsUtils';
 import { useParserSettings } from './hooks/useParserSettings';
 import { useState } from 'react';
-import { guessStatementParserSettings } from '../../services/backend';
+import {
+  guessStatementParserSettings,
+  matchStatementParserSettings,
+} from '../../services/backend';
 import { useDropzone } from 'react-dropzone';
 
 interface StatementParserConfigProps {
@@ -58,11 +62,13 @@ export const StatementParserConfig = ({
 
   const [file, setFile] = useState<File | null>(null);
   const [guessError, setGuessError] = useState<string | null>(null);
+  const [matches, setMatches] = useState<StatementParserSettingsMatch[] | null>(null);
 
   const { getRootProps, getInputProps } = useDropzone({
     onDrop: (acceptedFiles) => {
       for (const file of acceptedFiles) {
         setFile(file);
+        setMatches(null);
       }
     },
   });
@@ -85,6 +91,25 @@ export const StatementParserConfig = ({
     }
   };
 
+  const matchParserSettings = async () => {
+    setGuessError(null);
+    if (!file) return;
+    try {
+      setMatches(await matchStatementParserSettings(file));
+    } catch (error) {
+      setGuessError(error instanceof Error ? error.message : String(error));
+    }
+  };
+
+  const applyMatch = (match: StatementParserSettingsMatch) => {
+    if (match.account_id === null) {
+      // Predefined configurations are also shown as selected above
+      onConfigSelect(match.label);
+    } else {
+      onUpdateParserSettings(() => match.parser_settings);
+    }
+  };
+
   return (
     <Accordion defaultExpanded>
       <AccordionSummary expandIcon={<ExpandMore />}>
@@ -203,11 +228,36 @@ export const StatementParserConfig = ({
               </Box>
             </FormControl>
             {file && (
-              <Button variant="outlined" onClick={guessParserSettings} size="small">
-                Guess Parser Settings
-              </Button>
+              <Box sx={{ display: 'flex', flexDirection: 'column', gap: 1 }}>
+                <Button variant="outlined" onClick={matchParserSettings} size="small">
+                  Find Matching Configurations
+                </Button>
+                <Button variant="outlined" onClick={guessParserSettings} size="small">
+                  Guess Parser Settings
+                </Button>
+              </Box>
             )}
           </Box>
+          {matches && (
+            <Box sx={{ mt: 2, display: 'flex', flexWrap: 'wrap', gap: 1 }}>
+              {matches.length === 0 && (
+                <Typography variant="body2" color="text.secondary">
+                  No configuration matches this file
+                </Typography>
+              )}
+              {matches.map((match) => (
+                <Button
+                  key={`${match.account_id ?? 'repo'}:${match.label}`}
+                  variant="text"
+                  size="small"
+                  onClick={() => applyMatch(match)}
+                >
+                  {match.account_id === null ? match.label : `Account: ${match.label}`}
+                  {` (${Math.round(match.score * 100)}%)`}
+                </Button>
+              ))}
+            </Box>
+          )}
           {guessError && <Alert severity="error">{guessError}</Alert>}
         </Box>
 
@@ -2,15 +2,18 @@ import {
   Alert,
   Box,
   Button,
+  Checkbox,
   Dialog,
   DialogActions,
   DialogContent,
   DialogTitle,
+  FormControlLabel,
   Typography,
   useMediaQuery,
   useTheme,
 } from '@mui/material';
 import { UploadOutlined } from '@mui/icons-material';
+import { useState } from 'react';
 import { useParseStatement } from '../hooks/backend';
 import type { StatementTransaction } from '../types/backend';
 import { useDropzone } from 'react-dropzone';
@@ -29,6 +32,8 @@ export function StatementUpload({
   replace: boolean;
   onClose?: () => void;
 }) {
+  // Rows merged by previous imports are skipped unless a full re-merge is asked for
+  const [full, setFull] = useState(false);
   const {
     mutate: processStatement,
     isPending: isProcessing,
@@ -45,31 +50,37 @@ export function StatementUpload({
   const { getRootProps, getInputProps } = useDropzone({
     onDrop: (acceptedFiles) => {
       for (const file of acceptedFiles) {
-        processStatement({ file, accountId });
+        processStatement({ file, accountId, full });
       }
     },
   });
 
   return (
-    <Box
-      {...getRootProps()}
-      sx={{
-        border: '2px dashed',
-        borderColor: 'primary.main',
-        borderRadius: 2,
-        p: 4,
-        textAlign: 'center',
-        cursor: 'pointer',
-      }}
-    >
-      <Loader open={isProcessing} />
-      <input {...getInputProps()} />
-      <UploadOutlined sx={{ fontSize: 40, mb: 1 }} />
-      <Typography variant="h6">Upload statement</Typography>
-      <Typography variant="body2" color="text.secondary">
-        or click to select
-      </Typography>
-      {processingError && <Alert severity="error">{processingError.message}</Alert>}
+    <Box>
+      <Box
+        {...getRootProps()}
+        sx={{
+          border: '2px dashed',
+          borderColor: 'primary.main',
+          borderRadius: 2,
+          p: 4,
+          textAlign: 'center',
+          cursor: 'pointer',
+        }}
+      >
+        <Loader open={isProcessing} />
+        <input {...getInputProps()} />
+        <UploadOutlined sx={{ fontSize: 40, mb: 1 }} />
+        <Typography variant="h6">Upload statement</Typography>
+        <Typography variant="body2" color="text.secondary">
+          or click to select
+        </Typography>
+        {processingError && <Alert severity="error">{processingError.message}</Alert>}
+      </Box>
+      <FormControlLabel
+        control={<Checkbox checked={full} onChange={(e) => setFull(e.target.checked)} />}
+        label="Full re-merge (include rows merged by previous imports)"
+      />
     </Box>
   );
 }
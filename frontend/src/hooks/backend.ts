@@ -82,12 +82,13 @@ export const useUpdateTransaction = (
 export interface ParseStatementParams {
   file: File;
   accountId: number;
+  full?: boolean;
 }
 
 export const useParseStatement = (onSuccess?: (data: StatementTransaction[]) => void) => {
   return useMutation({
-    mutationFn: ({ file, accountId }: ParseStatementParams) =>
-      parseStatement(file, accountId, Intl.DateTimeFormat().resolvedOptions().timeZone),
+    mutationFn: ({ file, accountId, full }: ParseStatementParams) =>
+      parseStatement(file, accountId, Intl.DateTimeFormat().resolvedOptions().timeZone, full),
     onSuccess: (data: StatementTransaction[]) => {
       onSuccess?.(data);
     },
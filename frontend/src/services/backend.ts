@@ -10,14 +10,33 @@ import type {
   RepoStatementParserSettings,
   StatementFormatSettings,
   StatementParserSettings,
+  StatementParserSettingsMatch,
 } from '../types/backend';
-import { PydanticError } from '../types/errors';
+import { ApiError, PydanticError } from '../types/errors';
+
+// Server-side session ids of statements returned by parseStatement, so merging
+// them doesn't send the rows back. Statements built any other way, e.g. by
+// joining several uploads, have none.
+const statementSessions = new WeakMap<StatementTransaction[], string>();
 
 async function apiFetch<T>(
   input: RequestInfo,
   queryParams?: Record<string, string>,
   init?: RequestInit,
 ): Promise<T | null> {
+  const res = await apiRequest(input, queryParams, init);
+  if (res.status === 204) {
+    return null;
+  }
+
+  return res.json();
+}
+
+async function apiRequest(
+  input: RequestInfo,
+  queryParams?: Record<string, string>,
+  init?: RequestInit,
+): Promise<Response> {
   if (queryParams) {
     input += '?' + new URLSearchParams(queryParams).toString();
   }
@@ -38,14 +57,10 @@ async function apiFetch<T>(
       console.error(e);
       // body not JSON
     }
-    throw new Error(message);
+    throw new ApiError(message, res.status);
   }
 
-  if (res.status === 204) {
-    return null;
-  }
-
-  return res.json();
+  return res;
 }
 
 export async function getAccount(accountId: number): Promise<Account | null> {
@@ -107,6 +122,25 @@ export async function getTransactions(
   accountId: number,
   statement: StatementTransaction[],
 ): Promise<Transaction[] | null> {
+  const sessionId = statementSessions.get(statement);
+  if (sessionId !== undefined) {
+    try {
+      return await apiFetch<Transaction[]>(
+        `/api/transactions/`,
+        {
+          account_id: accountId.toString(),
+          session_id: sessionId,
+        },
+        { method: 'POST' },
+      );
+    } catch (e) {
+      // The session expired, send the statement itself
+      if (!(e instanceof ApiError && e.status === 404)) {
+        throw e;
+      }
+      statementSessions.delete(statement);
+    }
+  }
   const data = await apiFetch<Transaction[]>(
     `/api/transactions/`,
     {
@@ -127,17 +161,24 @@ export async function parseStatement(
   file: File,
   accountId: number,
   timezone: string,
+  full: boolean = false,
 ): Promise<StatementTransaction[]> {
   const formData = new FormData();
   formData.append('file', file);
-  return (await apiFetch<StatementTransaction[]>(
+  const res = await apiRequest(
     `/api/statement/parse`,
-    { timezone, account_id: accountId.toString() },
+    { timezone, account_id: accountId.toString(), full: full.toString(), session: 'true' },
     {
       method: 'POST',
       body: formData,
     },
-  ))!;
+  );
+  const statement: StatementTransaction[] = await res.json();
+  const sessionId = res.headers.get('X-Statement-Session');
+  if (sessionId !== null) {
+    statementSessions.set(statement, sessionId);
+  }
+  return statement;
 }
 
 export async function searchDescriptions(
@@ -186,6 +227,21 @@ export async function guessStatementParserSettings(
   ))!;
 }
 
+export async function matchStatementParserSettings(
+  file: File,
+): Promise<StatementParserSettingsMatch[]> {
+  const formData = new FormData();
+  formData.append('file', file);
+  return (await apiFetch<StatementParserSettingsMatch[]>(
+    `/api/statement/match-configs`,
+    undefined,
+    {
+      method: 'POST',
+      body: formData,
+    },
+  ))!;
+}
+
 export async function getRepoStatementParserSettings(): Promise<RepoStatementParserSettings[]> {
   return (await apiFetch<RepoStatementParserSettings[]>('/api/statement/configs'))!;
 }
@@ -131,6 +131,13 @@ export type RepoStatementParserSettings = StatementParserSettings & {
   label: string;
 };
 
+export type StatementParserSettingsMatch = {
+  label: string;
+  account_id: number | null;
+  score: number;
+  parser_settings: StatementParserSettings;
+};
+
 export type Category = {
   id: number;
   name: string;
@@ -9,3 +9,13 @@ export class PydanticError extends Error {
     this.data = data;
   }
 }
+
+export class ApiError extends Error {
+  status: number;
+
+  constructor(message: string, status: number) {
+    super(message);
+    this.name = 'ApiError';
+    this.status = status;
+  }
+}